@@ -0,0 +1 @@
+# Синтетические составы и замеры горячих путей бота (см. bench/run.py)
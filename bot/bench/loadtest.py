@@ -0,0 +1,241 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+
+# Шаги анкеты в порядке ConversationHandler регистрации: (название, вид обновления, индекс ответа)
+STEPS = [
+    ("register", "command", None),
+    ("nickname", "text", 0),
+    ("alliance", "text", 1),
+    ("troop_type", "callback", 2),
+    ("troop_size", "text", 3),
+    ("tier", "text", 4),
+    ("capacity", "text", 5),
+    ("shift", "callback", 6),
+    ("captain", "callback", 7),
+    ("power", "text", 8),
+]
+# Сколько ждать ответа бота на один шаг, секунды
+STEP_TIMEOUT = 30
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(p / 100 * (len(ordered) - 1)))]
+
+class SimulatedUsers:
+    # Пользователи шлют обновления в update_queue настоящего Application, как это делает
+    # webhook, и ждут ответа бота (sendMessage в их чат) перед следующим шагом
+    def __init__(self, app, think=0.0, seed=1):
+        self.app = app
+        self.think = think
+        self.rnd = random.Random(seed)
+        self.latencies = {name: [] for name, _, _ in STEPS}
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self._waiters = {}
+        self._update_id = 0
+
+    def on_send(self, message):
+        future = self._waiters.pop(message["chat"]["id"], None)
+        if future is not None and not future.done():
+            future.set_result(message["text"])
+
+    def _user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}"}
+
+    def _message(self, user_id, text):
+        message = {
+            "message_id": self._update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self._user(user_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+        return message
+
+    def _update(self, user_id, kind, value):
+        from telegram import Update
+        self._update_id += 1
+        data = {"update_id": self._update_id}
+        if kind == "callback":
+            data["callback_query"] = {
+                "id": str(self._update_id),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": value,
+                "message": {
+                    "message_id": self._update_id,
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": {"id": 1, "is_bot": True, "first_name": "FakeBot"},
+                    "text": "?",
+                },
+            }
+        else:
+            data["message"] = self._message(user_id, value)
+        return Update.de_json(data, self.app.bot)
+
+    async def step(self, user_id, name, update):
+        future = asyncio.get_running_loop().create_future()
+        self._waiters[user_id] = future
+        started = time.perf_counter()
+        await self.app.update_queue.put(update)
+        try:
+            reply = await asyncio.wait_for(future, STEP_TIMEOUT)
+        except asyncio.TimeoutError:
+            self._waiters.pop(user_id, None)
+            self.timeouts += 1
+            return None
+        self.latencies[name].append(time.perf_counter() - started)
+        return reply
+
+    async def register(self, user_id, answers):
+        reply = None
+        for name, kind, index in STEPS:
+            if name == "power" and answers[7] != "да":
+                break
+            value = "/register" if index is None else answers[index]
+            if self.think:
+                await asyncio.sleep(self.rnd.uniform(0, self.think))
+            reply = await self.step(user_id, name, self._update(user_id, kind, value))
+            if reply is None:
+                self.failed += 1
+                return
+        if reply.startswith("✅"):
+            self.completed += 1
+        else:
+            self.failed += 1
+
+def report(users, elapsed, counters):
+    steps = {}
+    for name, values in users.latencies.items():
+        steps[name] = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": max(values, default=0.0),
+        }
+    updates = sum(s["count"] for s in steps.values())
+    return {
+        "elapsed": elapsed,
+        "completed": users.completed,
+        "failed": users.failed,
+        "timeouts": users.timeouts,
+        "registrations_per_sec": users.completed / elapsed if elapsed else 0.0,
+        "updates_per_sec": updates / elapsed if elapsed else 0.0,
+        "steps": steps,
+        **counters,
+    }
+
+def print_report(result):
+    print(f"\n{'шаг':<12} {'n':>7} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'max, мс':>9}")
+    for name, s in result["steps"].items():
+        print(f"{name:<12} {s['count']:>7} {s['p50'] * 1000:>9.1f} {s['p95'] * 1000:>9.1f} "
+              f"{s['p99'] * 1000:>9.1f} {s['max'] * 1000:>9.1f}")
+    print(f"\n⏱ {result['elapsed']:.2f} с: {result['registrations_per_sec']:.0f} регистраций/с, "
+          f"{result['updates_per_sec']:.0f} обновлений/с")
+    print(f"✅ завершено {result['completed']}, ❌ ошибок {result['failed']}, ⌛ таймаутов {result['timeouts']}")
+    print(f"💾 записей хранилища: {result['storage_commits']} (изменений {result['storage_mutations']}), "
+          f"версия реестра +{result['registry_writes']}, игроков {result['players']}")
+    if result["persistence_commits"] is not None:
+        print(f"💾 коммитов состояния диалогов: {result['persistence_commits']}")
+    print(f"📡 вызовы Bot API: {result['api_calls']}")
+
+async def run(users_count, concurrency, think=0.0, latency=0.0, seed=1):
+    # Импорт здесь: config читает окружение при импорте, а main() успевает его подготовить
+    from telegram.ext import ApplicationBuilder
+    from bench.roster_gen import generate_answers
+    from bot import build_application
+    from fake_bot import FakeRequest
+    from outbox import outbox
+    from storage import registry
+    from write_queue import write_queue
+
+    request = FakeRequest(latency=latency)
+    builder = ApplicationBuilder().token("0:fake").request(request).get_updates_request(FakeRequest())
+    app = build_application(builder, concurrency)
+    users = SimulatedUsers(app, think, seed)
+    request.on_send = users.on_send
+
+    version = registry.version
+    commits, mutations = write_queue.commits, write_queue.mutations
+    rows = generate_answers(users_count, seed)
+
+    await app.initialize()
+    # Ответы уходят через очередь отправки, как в боте (post_init здесь не вызывается:
+    # планировщику синхронизации и странице метрик в нагрузочном тесте делать нечего)
+    outbox.start(app.bot)
+    await app.start()
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(users.register(user_id, answers) for user_id, answers in rows))
+        await write_queue.drain()
+        elapsed = time.perf_counter() - started
+    finally:
+        await app.stop()
+        await app.post_stop(app)
+        await app.shutdown()
+
+    return report(users, elapsed, {
+        "users": users_count,
+        "concurrency": concurrency,
+        "storage_commits": write_queue.commits - commits,
+        "storage_mutations": write_queue.mutations - mutations,
+        "registry_writes": registry.version - version,
+        "players": len(registry.all()),
+        "persistence_commits": getattr(app.persistence, "commits", None),
+        "api_calls": dict(request.calls),
+    })
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Нагрузочный тест регистрации через настоящий Application")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64, help="одновременно обрабатываемых обновлений")
+    parser.add_argument("--think", type=float, default=0.0, help="пауза пользователя перед шагом, до N секунд")
+    parser.add_argument("--latency", type=float, default=0.0, help="задержка фиктивного Bot API, секунды")
+    parser.add_argument("--backend", default="json", help="STORAGE_BACKEND: json, journal или sqlite")
+    parser.add_argument("--no-persistence", action="store_true", help="не сохранять состояние диалогов")
+    parser.add_argument("--outbox-limits", action="store_true",
+                        help="ограничивать отправку как для настоящего Telegram (OUTBOX_*_RATE из окружения)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="сохранить результаты в JSON")
+    args = parser.parse_args(argv)
+
+    # Предупреждения PTB о per_message при сборке обработчиков здесь только мешают чтению отчёта
+    warnings.filterwarnings("ignore", message="If 'per_message=False'")
+    output = os.path.abspath(args.output) if args.output else None
+    cwd = os.getcwd()
+    # Все файлы бота (data.json, bot_state.db, ...) создаются во временном каталоге
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        os.environ["STORAGE_BACKEND"] = args.backend
+        if not args.outbox_limits:
+            # Фиктивный Bot API не ограничивает скорость: меряем обработчики, а не лимиты Telegram
+            os.environ["OUTBOX_GLOBAL_RATE"] = os.environ["OUTBOX_CHAT_RATE"] = "1000000"
+            os.environ["OUTBOX_CHAT_BURST"] = "1000"
+        os.environ["PERSISTENCE_PATH"] = "" if args.no_persistence else os.path.join(workdir, "bot_state.db")
+        print(f"👥 {args.users} пользователей, обработка до {args.concurrency} обновлений одновременно")
+        result = asyncio.run(run(args.users, args.concurrency, args.think, args.latency, args.seed))
+        os.chdir(cwd)
+
+    print_report(result)
+    if output:
+        with open(output, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        print(f"📄 Результаты: {output}")
+    return 0 if not result["failed"] and not result["timeouts"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,56 @@
+import json
+import random
+import sys
+from storage import make_record
+
+TIERS = {"T10": 0.35, "T11": 0.30, "T12": 0.20, "T13": 0.15}
+TROOP_TYPES = ["байкер", "боец", "стрелок"]
+SHIFTS = {"1": 0.40, "2": 0.35, "обе": 0.25}
+# Доля игроков, готовых быть капитаном (мощь у них всегда от 300 000 000)
+CAPTAIN_RATIO = 0.12
+ALLIANCES = ["VAR", "RIP", "TIG", "PIG", "ANZ", "CTW", "FNX", "DAF", "PIA", "KEK"]
+SCALES = [100, 1_000, 10_000, 100_000]
+
+def pick(rnd, weights):
+    return rnd.choices(list(weights), weights=list(weights.values()))[0]
+
+def generate_answers(count, seed=1):
+    # [(user_id, ответы анкеты в порядке вопросов регистрации), ...] — те же строки, что ввёл бы игрок
+    rnd = random.Random(seed)
+    rows = []
+    for i in range(count):
+        tier = pick(rnd, TIERS)
+        rank = int(tier[1:])
+        # Старшие тиры в среднем сильнее: отряд и группа растут с тиром
+        troop_size = rnd.randrange(200_000 + (rank - 10) * 60_000, 700_001, 500)
+        group_capacity = rnd.randrange(800_000 + (rank - 10) * 300_000, 3_500_001, 5_000)
+        captain = "да" if rnd.random() < CAPTAIN_RATIO else "нет"
+        power = str(rnd.randrange(300_000_000, 900_000_000, 1_000)) if captain == "да" else "0"
+        rows.append((100_000 + i, [
+            f"Player{i:06d}",
+            rnd.choice(ALLIANCES),
+            rnd.choice(TROOP_TYPES),
+            str(troop_size),
+            tier,
+            str(group_capacity),
+            pick(rnd, SHIFTS),
+            captain,
+            power,
+        ]))
+    return rows
+
+def generate_players(count, seed=1):
+    return [make_record(user_id, answers) for user_id, answers in generate_answers(count, seed)]
+
+def write_roster(path, count, seed=1):
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(generate_players(count, seed), file, ensure_ascii=False)
+    return path
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Использование: python -m bench.roster_gen <количество> <файл.json> [seed]")
+        sys.exit(1)
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    write_roster(sys.argv[2], int(sys.argv[1]), seed)
+    print(f"✅ {sys.argv[1]} игроков записано в {sys.argv[2]}")
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from bench.roster_gen import SCALES, generate_answers, write_roster
+from distribution import generate_distribution
+from roster_pages import render_pages
+from storage import PlayerRegistry, JournalRegistry, make_record
+from utils import split_text
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+# Замер считается регрессией, если медиана выросла больше чем в TOLERANCE раз
+# и при этом больше чем на NOISE_FLOOR секунд (короткие замеры слишком шумные)
+TOLERANCE = 1.5
+NOISE_FLOOR = 0.002
+
+class Bench:
+    def __init__(self, repeat=5):
+        self.repeat = repeat
+        self.results = {}
+
+    def measure(self, name, func, repeat=None):
+        times = []
+        for _ in range(repeat or self.repeat):
+            started = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - started)
+        self.results[name] = {"median": statistics.median(times), "min": min(times), "repeat": len(times)}
+        print(f"  {name:<32} {self.results[name]['median'] * 1000:10.2f} мс")
+
+def new_records(count, offset):
+    # Игроки, которых нет в сгенерированном составе (другие ники)
+    rows = generate_answers(offset + count, seed=99)[offset:]
+    return [make_record(900_000 + offset + i, [f"Extra{offset + i:06d}"] + answers[1:])
+            for i, (_, answers) in enumerate(rows)]
+
+def bench_distribution(bench, prefix, roster_path, engines):
+    texts = {}
+    for engine in engines:
+        if engine == "numpy":
+            try:
+                import numpy  # noqa: F401
+            except ImportError:
+                print("  (numpy не установлен — пропуск)")
+                continue
+        bench.measure(f"{prefix}distribution.{engine}", lambda: texts.setdefault(
+            engine, generate_distribution(roster_path, engine=engine)
+        ), repeat=3)
+    return next(iter(texts.values()), "")
+
+def bench_storage(bench, prefix, roster_path, workdir, count):
+    registry = PlayerRegistry(roster_path)
+    bench.measure(f"{prefix}storage.load", lambda: PlayerRegistry(roster_path).reload(), repeat=3)
+    registry.reload()
+    extra = iter(new_records(50, 0))
+    # Каждая одиночная запись в режиме json переписывает весь файл
+    bench.measure(f"{prefix}storage.upsert", lambda: registry.upsert(next(extra)), repeat=5)
+    nicknames = [r["nickname"] for r in registry.all()[:1000]]
+    bench.measure(f"{prefix}storage.get_x1000", lambda: [registry.get(n) for n in nicknames])
+    bench.measure(f"{prefix}storage.exists_x1000", lambda: [registry.exists(n) for n in nicknames])
+    victims = iter(nicknames)
+    bench.measure(f"{prefix}storage.update", lambda: registry.update(next(victims), "troop_size", "450000"), repeat=5)
+    bench.measure(f"{prefix}storage.delete", lambda: registry.delete(next(victims)), repeat=5)
+
+    batch = new_records(100, 50)
+
+    def batch_upsert():
+        with registry.batch():
+            for record in batch:
+                registry.upsert(record)
+
+    bench.measure(f"{prefix}storage.batch_upsert_x100", batch_upsert, repeat=3)
+    bench.measure(f"{prefix}storage.roster", registry.roster)
+    bench.measure(f"{prefix}storage.stats", registry.stats)
+
+    journal_path = os.path.join(workdir, f"journal-{count}.json")
+    with open(roster_path, "r", encoding="utf-8") as src, open(journal_path, "w", encoding="utf-8") as dst:
+        dst.write(src.read())
+    journal = JournalRegistry(journal_path, compact_threshold=10 ** 9)
+    journal.reload()
+    extra = iter(new_records(50, 150))
+    bench.measure(f"{prefix}storage.journal.upsert", lambda: journal.upsert(next(extra)), repeat=5)
+    return registry
+
+def bench_render(bench, prefix, registry, text):
+    records = registry.all()
+    counts = registry.alliance_counts()
+    roster_text = "\n".join(render_pages("full", records, counts, page_size=len(records) or 1))
+    bench.measure(f"{prefix}split_text.distribution", lambda: split_text(text))
+    bench.measure(f"{prefix}split_text.roster", lambda: split_text(roster_text))
+    for view in ("full", "public", "short"):
+        bench.measure(f"{prefix}render.{view}", lambda: render_pages(view, records, counts))
+
+def run(scales, engines, repeat=5):
+    bench = Bench(repeat)
+    with tempfile.TemporaryDirectory() as workdir:
+        for count in scales:
+            print(f"👥 {count} игроков")
+            prefix = f"n={count}/"
+            roster_path = write_roster(os.path.join(workdir, f"roster-{count}.json"), count)
+            text = bench_distribution(bench, prefix, roster_path, engines)
+            registry = bench_storage(bench, prefix, roster_path, workdir, count)
+            bench_render(bench, prefix, registry, text)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "scales": scales,
+            "engines": engines,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+        "results": bench.results,
+    }
+
+def compare(results, baseline, tolerance=TOLERANCE, noise_floor=NOISE_FLOOR):
+    # [(замер, было, стало), ...] для замеров, ставших заметно медленнее
+    regressions = []
+    for name, current in results["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if before is None:
+            continue
+        if current["median"] > before["median"] * tolerance and current["median"] - before["median"] > noise_floor:
+            regressions.append((name, before["median"], current["median"]))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Замеры распределения, хранилища и вывода списков")
+    parser.add_argument("--scales", default="100,1000,10000",
+                        help=f"размеры составов через запятую (доступно: {','.join(map(str, SCALES))})")
+    parser.add_argument("--engines", default="python,numpy")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--save-baseline", action="store_true", help="записать результаты как новый эталон")
+    args = parser.parse_args(argv)
+
+    results = run([int(s) for s in args.scales.split(",")], args.engines.split(","), args.repeat)
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(results, file, ensure_ascii=False, indent=2)
+    print(f"📄 Результаты: {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        print(f"📌 Эталон обновлён: {args.baseline}")
+        return 0
+
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+    except FileNotFoundError:
+        print("Эталона нет — сравнение пропущено (создать: --save-baseline)")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n❌ РЕГРЕССИИ ({len(regressions)}), допуск ×{args.tolerance}:")
+        for name, before, after in regressions:
+            print(f"  {name}: {before * 1000:.2f} мс → {after * 1000:.2f} мс (×{after / before:.2f})")
+        return 1
+    print("\n✅ Регрессий нет")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
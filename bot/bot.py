@@ -1,17 +1,28 @@
 from telegram import Update, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import (
-    ApplicationBuilder, CommandHandler, MessageHandler,
+    ApplicationBuilder, CommandHandler, MessageHandler, CallbackQueryHandler,
     ConversationHandler, ContextTypes, filters
 )
-from shared import user_lang
+from shared import set_lang
 from registration import get_registration_handler
 from handlers import get_edit_conversation_handler
-from distribution import generate_distribution
-from sheets_importer import sync_from_google
-from storage import load_players
-from config import ADMINS
+from distribution import ENGINES, plan_distribution, format_distribution
+from redistribution import publish, redistribute as redistribute_delta
+from scenarios import explore as explore_scenarios, format_breakdown, render_scenario
+from sync_job import sync_job
+from sync_engine import clear_state as clear_sync_state
+from result_cache import result_cache
+from roster_pages import roster_pages
+from outbox import outbox
+from notify import fan_out
+from storage import FILE_PATH, reset_players, registry
+from config import ADMINS, DISTRIBUTION_ENGINE, BOT_MODE, CONCURRENT_UPDATES, PERSISTENCE_PATH, METRICS_PORT
+from persistence import SqlitePersistence, expire_registrations
+from webhook import ChatOrderedProcessor, run_webhook
+from write_queue import write_queue
+from metrics import metrics, MetricsServer, instrument_handlers, format_perf
 from dotenv import load_dotenv
-from apscheduler.schedulers.background import BackgroundScheduler
+import asyncio
 import logging
 import os
 
@@ -27,29 +38,15 @@ main_keyboard_user = ReplyKeyboardMarkup(
 main_keyboard_admin = ReplyKeyboardMarkup(
     keyboard=[
         [KeyboardButton("📝 Регистрация"), KeyboardButton("📋 Список"), KeyboardButton("📋 Список (короткий)")],
-        [KeyboardButton("/finish"), KeyboardButton("/distribute")],
-        [KeyboardButton("/edit"), KeyboardButton("/reset"), KeyboardButton("/sync")]
+        [KeyboardButton("/finish"), KeyboardButton("/distribute"), KeyboardButton("/redistribute"), KeyboardButton("/notify"), KeyboardButton("/explore")],
+        [KeyboardButton("/edit"), KeyboardButton("/reset"), KeyboardButton("/sync"), KeyboardButton("/stats"), KeyboardButton("/perf")]
     ],
     resize_keyboard=True
 )
 
-def split_text(text, limit=4000):
-    lines = text.split('\n')
-    chunks = []
-    current = ""
-    for line in lines:
-        if len(current) + len(line) + 1 < limit:
-            current += line + "\n"
-        else:
-            chunks.append(current.strip())
-            current = line + "\n"
-    if current:
-        chunks.append(current.strip())
-    return chunks
-
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await update.message.reply_text(
-        "Выберите язык / Wähle Sprache / Choose language:",
+    reply(
+        update, "Выберите язык / Wähle Sprache / Choose language:",
         reply_markup=ReplyKeyboardMarkup(
             [["Русский 🇷🇺", "Deutsch 🇩🇪", "English 🇬🇧"]],
             one_time_keyboard=True,
@@ -59,24 +56,23 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return LANG_SELECT
 
 async def set_language(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
     user_id = update.effective_user.id
     text = update.message.text
 
     if "Русский" in text:
-        user_lang[chat_id] = "ru"
+        set_lang(context, "ru")
         reply_kb = main_keyboard_admin if user_id in ADMINS else main_keyboard_user
-        await update.message.reply_text("Язык установлен: Русский 🇷🇺", reply_markup=reply_kb)
+        reply(update, "Язык установлен: Русский 🇷🇺", reply_markup=reply_kb)
     elif "Deutsch" in text:
-        user_lang[chat_id] = "de"
+        set_lang(context, "de")
         reply_kb = main_keyboard_admin if user_id in ADMINS else main_keyboard_user
-        await update.message.reply_text("Sprache eingestellt: Deutsch 🇩🇪", reply_markup=reply_kb)
+        reply(update, "Sprache eingestellt: Deutsch 🇩🇪", reply_markup=reply_kb)
     elif "English" in text:
-        user_lang[chat_id] = "en"
+        set_lang(context, "en")
         reply_kb = main_keyboard_admin if user_id in ADMINS else main_keyboard_user
-        await update.message.reply_text("Language set: English 🇬🇧", reply_markup=reply_kb)
+        reply(update, "Language set: English 🇬🇧", reply_markup=reply_kb)
     else:
-        await update.message.reply_text("Пожалуйста, выберите язык с помощью кнопки.")
+        reply(update, "Пожалуйста, выберите язык с помощью кнопки.")
         return LANG_SELECT
 
     return ConversationHandler.END
@@ -91,100 +87,194 @@ async def handle_main_buttons(update: Update, context: ContextTypes.DEFAULT_TYPE
     elif "Список" in text:
         await show_full_list(update)
 
+def reply(update: Update, text: str, **kwargs):
+    # Ответ уходит через общую очередь отправки; длинный текст режется на части
+    outbox.reply(update, text, **kwargs)
+
 async def show_full_list(update: Update):
-    user_id = update.effective_user.id
-    is_admin = user_id in ADMINS
-    try:
-        data = load_players()
-    except FileNotFoundError:
-        await update.message.reply_text("Список пуст.")
-        return
-    if not data:
-        await update.message.reply_text("Список пуст.")
+    view = "full" if update.effective_user.id in ADMINS else "public"
+    await send_roster_page(update, view)
+
+async def show_short_list(update: Update):
+    await send_roster_page(update, "short")
+
+async def send_roster_page(update: Update, view: str):
+    if not len(registry):
+        reply(update, "Список пуст.")
         return
+    text, markup = roster_pages.page(view, 0)
+    reply(update, text, reply_markup=markup)
 
-    lines = [
-        f"{p['nickname']} | {p['alliance']} | {p['troop_type']} | {p['troop_size']} | tier {p['tier']} | shift {p['shift']} | cap: {p['captain']} | group: {p['group_capacity']}"
-        for p in data
-    ] if is_admin else [f"{p['nickname']} | {p['alliance']}" for p in data]
+async def roster_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Листание списка: ◀/▶ редактируют то же сообщение
+    query = update.callback_query
+    _, view, number = query.data.split("|")
+    if view == "full" and update.effective_user.id not in ADMINS:
+        view = "public"
+    text, markup = roster_pages.page(view, int(number))
+    await query.answer()
+    if text != query.message.text or markup != query.message.reply_markup:
+        await query.edit_message_text(text, reply_markup=markup)
 
-    result = "Участники:\n" + "\n".join(lines)
-    for chunk in split_text(result):
-        await update.message.reply_text(chunk)
+def format_stats(stats):
+    def fmt(number):
+        return f"{number:,}".replace(",", " ")
 
-async def show_short_list(update: Update):
-    try:
-        data = load_players()
-    except FileNotFoundError:
-        await update.message.reply_text("Список пуст.")
-        return
-    if not data:
-        await update.message.reply_text("Список пуст.")
-        return
+    def counts(title, counter):
+        return [title] + [f"  {key or '—'}: {count}" for key, count in sorted(counter.items(), key=lambda x: -x[1])]
 
-    lines = [f"{p['nickname']} | {p['alliance']}" for p in data]
-    alliance_count = {}
-    for p in data:
-        tag = p.get("alliance", "").upper()
-        alliance_count[tag] = alliance_count.get(tag, 0) + 1
+    lines = [f"📈 Участников: {stats['count']}"]
+    lines += counts("По альянсам:", stats["alliance"])
+    lines += counts("По сменам:", stats["shift"])
+    lines += counts("По типам войск:", stats["troop_type"])
+    lines += counts("По тирам:", stats["tier"])
+    lines.append("Войска / вместимость групп по сменам:")
+    for shift in sorted(set(stats["troops_by_shift"]) | set(stats["capacity_by_shift"])):
+        troops = stats["troops_by_shift"].get(shift, 0)
+        capacity = stats["capacity_by_shift"].get(shift, 0)
+        lines.append(f"  {shift}: {fmt(troops)} / {fmt(capacity)}")
+    return "\n".join(lines)
 
-    result = f"Участники ({len(data)}):\n" + "\n".join(lines) + "\n\nПо альянсам:"
-    for tag, count in sorted(alliance_count.items(), key=lambda x: -x[1]):
-        result += f"\n{tag}: {count}"
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMINS:
+        reply(update, "⛔ Нет прав.")
+        return
+    reply(update, format_stats(registry.stats()))
 
-    for chunk in split_text(result):
-        await update.message.reply_text(chunk)
+async def perf(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Где тратится время: обработчики, хранилище, Google Таблица, распределение
+    if update.effective_user.id not in ADMINS:
+        reply(update, "⛔ Нет прав.")
+        return
+    reply(update, format_perf())
 
 async def finish(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMINS:
-        await update.message.reply_text("⛔ Нет прав.")
+        reply(update, "⛔ Нет прав.")
         return
-    await update.message.reply_text("✅ Регистрация завершена.")
+    reply(update, "✅ Регистрация завершена.")
 
 async def reset(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMINS:
-        await update.message.reply_text("⛔ Нет прав.")
+        reply(update, "⛔ Нет прав.")
         return
-    if os.path.exists("data.json"):
-        os.remove("data.json")
-        await update.message.reply_text("🗑 Сброшено.")
+    # Синхронизация с таблицей после сброса должна загрузить всех заново
+    clear_sync_state()
+    # Через очередь записи: очистка с удалением файлов не выполняется в цикле событий
+    if await write_queue.submit(reset_players):
+        reply(update, "🗑 Сброшено.")
     else:
-        await update.message.reply_text("Файл пуст.")
+        reply(update, "Файл пуст.")
 
 async def distribute(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMINS:
-        await update.message.reply_text("⛔ Нет прав.")
+        reply(update, "⛔ Нет прав.")
+        return
+    # /distribute solver — оптимизирующий солвер вместо жадного распределения
+    engine = context.args[0].lower() if context.args else DISTRIBUTION_ENGINE
+    if engine not in ENGINES:
+        reply(update, f"❌ Неизвестный движок: {engine}. Доступны: {', '.join(ENGINES)}")
+        return
+    reply(update, "📊 Распределение:")
+    try:
+        # Пока состав не менялся, повторный /distribute берёт готовый план из кэша
+        plans = await result_cache.get("distribution", plan_distribution, FILE_PATH, engine)
+        # Сохраняем структуру, чтобы /redistribute пересчитывал только изменения
+        publish(plans)
+        with metrics.timer("distribution_phase_seconds", phase="format", engine=engine):
+            result = format_distribution(plans)
+        reply(update, result)
+    except Exception as e:
+        reply(update, f"❌ Ошибка при распределении: {e}")
+
+async def redistribute(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMINS:
+        reply(update, "⛔ Нет прав.")
+        return
+    try:
+        delta = redistribute_delta()
+        if delta is None:
+            reply(update, "Сначала выполните /distribute.")
+            return
+        moves, result = delta
+        summary = "\n".join(moves) if moves else "Изменений нет."
+        reply(update, f"🔁 Перемещения:\n{summary}\n\n📊 Распределение:\n{result}")
+    except Exception as e:
+        reply(update, f"❌ Ошибка при перераспределении: {e}")
+
+async def explore(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_user.id not in ADMINS:
+        reply(update, "⛔ Нет прав.")
         return
-    await update.message.reply_text("📊 Распределение:")
+    reply(update, "🔎 Сравниваю варианты распределения...")
     try:
-        result = generate_distribution()
-        for chunk in split_text(result):
-            await update.message.reply_text(chunk)
+        best = await result_cache.get("explore", explore_scenarios, FILE_PATH, 3)
+        if not best:
+            reply(update, "Список пуст.")
+            return
+        summary = "\n".join(f"{i}. {format_breakdown(s, b)}" for i, (s, b) in enumerate(best, start=1))
+        result = f"🏆 Лучшие варианты:\n{summary}\n\n📊 Лучший вариант:\n" + render_scenario(best[0][0])
+        reply(update, result)
     except Exception as e:
-        await update.message.reply_text(f"❌ Ошибка при распределении: {e}")
+        reply(update, f"❌ Ошибка при переборе вариантов: {e}")
 
 async def sync(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.effective_user.id not in ADMINS:
-        await update.message.reply_text("⛔ Нет прав.")
+        reply(update, "⛔ Нет прав.")
+        return
+    already_running = sync_job.running
+    # Статус редактируется по ходу синхронизации, поэтому нужен сам объект сообщения
+    status = await outbox.reply(
+        update, "🔄 Синхронизация уже идёт, слежу за ней..." if already_running else "🔄 Загружаю данные из Google Таблицы..."
+    )
+    sync_job.start(status_message=status, force="force" in (context.args or []))
+
+async def notify(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Личные сообщения игрокам с их местом в опубликованном распределении
+    if update.effective_user.id not in ADMINS:
+        reply(update, "⛔ Нет прав.")
+        return
+    if fan_out.running:
+        reply(update, "📨 Рассылка уже идёт.")
         return
-    await update.message.reply_text("🔄 Загружаю данные из Google Таблицы...")
-    count = sync_from_google()
-    await update.message.reply_text(f"✅ Загружено записей: {count}")
-
-def start_scheduler():
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(sync_from_google, 'interval', hours=1)
-    scheduler.start()
+    status = await outbox.reply(update, "📨 Готовлю рассылку...")
+    fan_out.start(status_message=status)
+
+async def start_scheduler(app):
+    outbox.start(app.bot)
+    asyncio.get_running_loop().create_task(sync_job.run_periodically())
+    if app.persistence:
+        asyncio.get_running_loop().create_task(expire_registrations(app))
+    if METRICS_PORT:
+        try:
+            await MetricsServer().start()
+        except OSError as e:
+            logging.warning("Страница метрик не запущена: %s", e)
     logging.info("⏰ Планировщик запущен: Google Sheets будут синхронизироваться каждый час.")
 
-if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
-    app = ApplicationBuilder().token(TOKEN).build()
+async def stop_scheduler(app):
+    # После остановки обработчиков (и в polling, и в webhook): дописываем принятые изменения
+    # и отправляем ответы, которые ещё стоят в очереди, пока Bot API не закрыт
+    await write_queue.drain()
+    await outbox.close()
+
+def build_application(builder=None, concurrency=CONCURRENT_UPDATES):
+    # Приложение со всеми обработчиками; builder можно подменить (например, фиктивным Bot API)
+    if builder is None:
+        builder = ApplicationBuilder().token(TOKEN)
+    # И в polling, и в webhook чаты обрабатываются параллельно: иначе каждое сохранение
+    # ждёт окно групповой записи (write_queue.COMMIT_WINDOW) в одиночку, а все остальные стоят
+    builder = builder.concurrent_updates(ChatOrderedProcessor(concurrency))
+    if PERSISTENCE_PATH:
+        builder = builder.persistence(SqlitePersistence(PERSISTENCE_PATH))
+    app = builder.post_init(start_scheduler).post_stop(stop_scheduler).build()
 
     app.add_handler(ConversationHandler(
         entry_points=[CommandHandler("start", start)],
         states={LANG_SELECT: [MessageHandler(filters.TEXT & ~filters.COMMAND, set_language)]},
         fallbacks=[],
+        name="language",
+        persistent=bool(PERSISTENCE_PATH)
     ))
 
     app.add_handler(get_registration_handler())
@@ -192,8 +282,30 @@ if __name__ == "__main__":
     app.add_handler(CommandHandler("finish", finish))
     app.add_handler(CommandHandler("reset", reset))
     app.add_handler(CommandHandler("distribute", distribute))
+    app.add_handler(CommandHandler("redistribute", redistribute))
+    app.add_handler(CommandHandler("notify", notify))
+    app.add_handler(CommandHandler("explore", explore))
     app.add_handler(CommandHandler("sync", sync))
+    app.add_handler(CommandHandler("stats", stats))
+    app.add_handler(CommandHandler("perf", perf))
+    app.add_handler(CallbackQueryHandler(roster_page_callback, pattern=r"^roster\|"))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_main_buttons))
 
-    start_scheduler()
-    app.run_polling()
+    instrument_handlers(app)
+    metrics.gauge("outbox_pending", outbox.pending)
+    metrics.gauge("outbox_sent_total", lambda: outbox.sent, kind="counter")
+    metrics.gauge("outbox_failed_total", lambda: outbox.failed, kind="counter")
+    metrics.gauge("write_queue_commits_total", lambda: write_queue.commits, kind="counter")
+    metrics.gauge("write_queue_mutations_total", lambda: write_queue.mutations, kind="counter")
+    metrics.gauge("result_cache_hits_total", lambda: result_cache.hits, kind="counter")
+    metrics.gauge("result_cache_misses_total", lambda: result_cache.misses, kind="counter")
+    metrics.gauge("roster_players", lambda: len(registry))
+    return app
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    app = build_application()
+    if BOT_MODE == "webhook":
+        asyncio.run(run_webhook(app))
+    else:
+        app.run_polling()
@@ -1,2 +1,57 @@
 # config.py
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
 ADMINS = [5281668146, 1739936136]
+
+# Хранилище участников: "json" — data.json целиком, "journal" — журнал операций + снимок,
+# "sqlite" — база SQLITE_PATH (перенос: python sqlite_storage.py migrate)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "json")
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data.db")
+# После скольких записей в журнале он сворачивается в снимок data.json
+JOURNAL_COMPACT_THRESHOLD = int(os.getenv("JOURNAL_COMPACT_THRESHOLD", "500"))
+
+# Движок распределения: "python" — списки и сортировки, "numpy" — столбцы NumPy для больших составов,
+# "solver" — совместная упаковка башен смены с локальным поиском
+DISTRIBUTION_ENGINE = os.getenv("DISTRIBUTION_ENGINE", "python")
+# Сколько секунд солвер может улучшать распределение одной смены
+SOLVER_TIME_BUDGET = float(os.getenv("SOLVER_TIME_BUDGET", "2"))
+
+# Ограничения исходящих сообщений (лимиты Telegram: ~30 сообщений в секунду всего и ~1 в секунду в один чат)
+OUTBOX_GLOBAL_RATE = float(os.getenv("OUTBOX_GLOBAL_RATE", "25"))
+OUTBOX_CHAT_RATE = float(os.getenv("OUTBOX_CHAT_RATE", "1"))
+# Сколько сообщений в один чат можно отправить подряд без паузы
+OUTBOX_CHAT_BURST = int(os.getenv("OUTBOX_CHAT_BURST", "3"))
+
+# Режим получения обновлений: "polling" или "webhook" (встроенный HTTP-сервер, см. webhook.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+# Публичный адрес, который регистрируется в Telegram; если пусто — setWebhook не вызывается (локальная проверка)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+# По умолчанию только локально (за reverse proxy); для 0.0.0.0 обязателен WEBHOOK_SECRET
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Telegram присылает его в заголовке X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+# Сколько обновлений обрабатывается одновременно (в одном чате — всегда по очереди)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "64"))
+
+# Состояние диалогов (язык, незаконченные анкеты, шаги ConversationHandler) переживает перезапуск;
+# пустой путь — хранить только в памяти
+PERSISTENCE_PATH = os.getenv("PERSISTENCE_PATH", "bot_state.db")
+# Как часто изменения состояния сохраняются на диск одной пачкой, секунды
+PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", "30"))
+# Через сколько секунд брошенная анкета регистрации считается устаревшей
+REGISTRATION_TTL = int(os.getenv("REGISTRATION_TTL", str(24 * 60 * 60)))
+
+# Локальная страница метрик в формате Prometheus: http://METRICS_LISTEN:METRICS_PORT/metrics; 0 — выключена
+METRICS_LISTEN = os.getenv("METRICS_LISTEN", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+# Профилирование медленных обновлений: порог в миллисекундах (0 — выключено).
+# Стеки пишутся в PROFILE_DIR в свёрнутом формате (flamegraph.pl, speedscope)
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# Период опроса стеков профилировщиком, секунды
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.005"))
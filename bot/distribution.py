@@ -1,160 +1,266 @@
-import json
-import re
-
-FILE_PATH = "data.json"
-
-def parse_capacity(value):
-    try:
-        value = str(value).replace(" ", "").replace(".", "").replace(",", "")
-        return int(value)
-    except (ValueError, TypeError):
-        return 0
-
-def tier_priority(tier):
-    tier = str(tier).upper().replace("Т", "T")
-    match = re.search(r"T(\d+)", tier)
-    return int(match.group(1)) if match else 0
-
-def load_players(filename=FILE_PATH):
-    try:
-        with open(filename, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        return []
+import bisect
+from config import DISTRIBUTION_ENGINE
+from metrics import metrics
+from models import Player, Assignment
+from storage import FILE_PATH, load_players, registry
+
+TOWER_TYPES = ["стрелок", "байкер", "боец"]
+CAPTAIN_MIN_POWER = 300_000_000
 
 def group_by_shift(players):
     shifts = {"1": [], "2": [], "обе": []}
     for p in players:
-        shift = str(p.get("shift", "1")).lower()
-        if shift in ["1", "2"]:
-            shifts[shift].append(p)
-        elif shift in ["both", "обе", "beide"]:
-            shifts["обе"].append(p)
+        if p.shift in shifts:
+            shifts[p.shift].append(p)
     return shifts
 
+def load_shifts(filename=FILE_PATH):
+    # Для основного хранилища смены выбираются по индексу (в SQLite — запросом)
+    if filename == FILE_PATH:
+        return {shift: registry.roster(shift) for shift in ("1", "2", "обе")}
+    return group_by_shift([Player.from_dict(p) for p in load_players(filename)])
+
+def is_captain_candidate(p):
+    return p.wants_captain and p.true_power >= CAPTAIN_MIN_POWER
+
+def _imbalance(diff):
+    return diff[0] * diff[0] + diff[1] * diff[1]
+
+def _shifted(diff, load, sign):
+    return (diff[0] + sign * load[0], diff[1] + sign * load[1])
+
+def _refine(loads, side, diff, passes=3):
+    # Доводка: переносы и обмены игроков между сменами, пока они уменьшают перекос.
+    # diff — (войска, вместимость) смены 1 минус смены 2, в долях от общего итога.
+    # Пара для обмена подбирается бинарным поиском по сумме долей, проход стоит O(n log n)
+    for _ in range(passes):
+        improved = False
+        for i in sorted(range(len(loads)), key=lambda i: -sum(loads[i])):
+            sign = -2 if side[i] == "1" else 2
+            new_diff = _shifted(diff, loads[i], sign)
+            if _imbalance(new_diff) < _imbalance(diff):
+                diff = new_diff
+                side[i] = "2" if side[i] == "1" else "1"
+                improved = True
+
+        ones = sorted((sum(loads[i]), i) for i in range(len(loads)) if side[i] == "1")
+        twos = sorted((sum(loads[i]), i) for i in range(len(loads)) if side[i] == "2")
+        used = set()
+        for w1, i in ones:
+            # Обмен i (смена 1) на j (смена 2) сдвигает перекос на 2 * (j - i); ищем j ≈ i - diff / 2
+            pos = bisect.bisect_left(twos, (w1 - sum(diff) / 2, -1))
+            for k in (pos - 1, pos):
+                if 0 <= k < len(twos) and twos[k][1] not in used and i not in used:
+                    j = twos[k][1]
+                    new_diff = _shifted(_shifted(diff, loads[i], -2), loads[j], 2)
+                    if _imbalance(new_diff) < _imbalance(diff):
+                        diff = new_diff
+                        side[i], side[j] = "2", "1"
+                        used.update((i, j))
+                        improved = True
+        if not improved:
+            break
+    return diff
+
 def balance_shifts(shifted):
+    # Игроки "обе" делятся так, чтобы смены были равны по суммарным войскам
+    # и вместимости групп, а кандидаты в капитаны распределялись поровну
     shift1 = shifted["1"]
     shift2 = shifted["2"]
     both = shifted["обе"]
-    for player in both:
-        if len(shift1) <= len(shift2):
-            shift1.append(player)
+
+    everyone = shift1 + shift2 + both
+    total_troops = sum(p.troop_size for p in everyone) or 1
+    total_capacity = sum(p.group_capacity for p in everyone) or 1
+
+    def load(p):
+        return (p.troop_size / total_troops, p.group_capacity / total_capacity)
+
+    side = {}
+
+    # Сначала капитаны: по убыванию мощи в смену, где их меньше
+    captains = {"1": sum(map(is_captain_candidate, shift1)), "2": sum(map(is_captain_candidate, shift2))}
+    power = {"1": 0, "2": 0}
+    for p in sorted((p for p in both if is_captain_candidate(p)), key=lambda p: -p.true_power):
+        target = min(("1", "2"), key=lambda s: (captains[s], power[s]))
+        side[p.key] = target
+        captains[target] += 1
+        power[target] += p.true_power
+
+    diff = (0.0, 0.0)
+    for p in everyone:
+        sign = {"1": 1, "2": -1}.get(side.get(p.key, p.shift), 0)
+        diff = _shifted(diff, load(p), sign)
+
+    # Остальные: жадно от самых "тяжёлых" в смену, где перекос после добавления меньше
+    flexible = sorted((p for p in both if p.key not in side), key=lambda p: -sum(load(p)))
+    flexible_sides = []
+    for p in flexible:
+        to_first, to_second = _shifted(diff, load(p), 1), _shifted(diff, load(p), -1)
+        if _imbalance(to_first) <= _imbalance(to_second):
+            flexible_sides.append("1")
+            diff = to_first
         else:
-            shift2.append(player)
-    return {"1": shift1, "2": shift2}
+            flexible_sides.append("2")
+            diff = to_second
+
+    _refine([load(p) for p in flexible], flexible_sides, diff)
+    for p, s in zip(flexible, flexible_sides):
+        side[p.key] = s
+
+    # Порядок внутри смены — как в файле, чтобы при равных ключах сортировка была стабильной
+    return {
+        "1": shift1 + [p for p in both if side[p.key] == "1"],
+        "2": shift2 + [p for p in both if side[p.key] == "2"],
+    }
 
 def sort_players(players):
-    return sorted(
-        players,
-        key=lambda p: (-tier_priority(p.get("tier", "")), -parse_capacity(p.get("group_capacity", "0")))
-    )
+    return sorted(players, key=lambda p: (-p.tier_rank, -p.group_capacity))
 
-def assign_captains(players):
-    candidates = [
-        p for p in players
-        if p.get("captain", "").lower() == "да"
-        and parse_capacity(p.get("true_power", "0")) >= 300_000_000
-    ]
+def assign_captains(players, limit=5):
+    candidates = [p for p in players if is_captain_candidate(p)]
     if len(candidates) < 5:
         candidates = players
 
-    def sort_key(p):
-        return (
-            -parse_capacity(p.get("true_power", "0")),
-            -tier_priority(p.get("tier", "")),
-            -parse_capacity(p.get("group_capacity", "0"))
-        )
-
-    sorted_candidates = sorted(candidates, key=sort_key)
+    sorted_candidates = sorted(candidates, key=lambda p: (-p.true_power, -p.tier_rank, -p.group_capacity))
     selected = []
     used = set()
     for p in sorted_candidates:
-        if p["nickname"] not in used:
+        if p.key not in used:
             selected.append(p)
-            used.add(p["nickname"])
-        if len(selected) == 5:
+            used.add(p.key)
+        if len(selected) == limit:
             break
     return selected
 
-def assign_to_tower(captain, players, allowed_type=None, assigned_nicks=None):
-    if assigned_nicks is None:
-        assigned_nicks = set()
-
-    group_capacity = parse_capacity(captain.get("group_capacity", "0"))
-    if group_capacity == 0:
-        return []
-
-    assigned = []
-    remaining = [p for p in players if p["nickname"] not in assigned_nicks and p["nickname"] != captain["nickname"]]
-
-    if allowed_type:
-        remaining = [p for p in remaining if allowed_type == p.get("troop_type", "").lower()]
-
-    remaining = sorted(
-        remaining,
-        key=lambda p: (-tier_priority(p.get("tier", "")), -parse_capacity(p.get("troop_size", "0")))
-    )
+# Очереди кандидатов в башни: игроки смены сортируются один раз и раскладываются
+# по типам войск; башня забирает игроков с начала очереди, а курсор очереди
+# сдвигается, так что каждый игрок просматривается не более одного раза на очередь
+class MemberPool:
+    def __init__(self, players, taken_keys=()):
+        ordered = sorted(players, key=lambda p: (-p.tier_rank, -p.troop_size))
+        self.taken = set(taken_keys)
+        self.queues = {None: ordered}
+        for p in ordered:
+            self.queues.setdefault(p.troop_type, []).append(p)
+        self.cursors = dict.fromkeys(self.queues, 0)
 
-    used = 0
-    for p in remaining:
-        if used >= group_capacity:
-            break
-        size = parse_capacity(p.get("troop_size", "0"))
-        fit_size = min(size, group_capacity - used)
-        p_copy = p.copy()
-        p_copy["assigned"] = fit_size
-        assigned.append(p_copy)
-        assigned_nicks.add(p["nickname"])
-        used += fit_size
+    def fill(self, captain, allowed_type=None):
+        self.taken.add(captain.key)
+        capacity = captain.group_capacity
+        if capacity == 0:
+            return []
 
-    assigned_nicks.add(captain["nickname"])
-    return assigned
+        queue_key = allowed_type or None
+        queue = self.queues.get(queue_key, [])
+        i = self.cursors.get(queue_key, 0)
+        assigned = []
+        used = 0
+        while i < len(queue) and used < capacity:
+            p = queue[i]
+            i += 1
+            if p.key in self.taken:
+                continue
+            fit_size = min(p.troop_size, capacity - used)
+            assigned.append(Assignment(p, fit_size))
+            self.taken.add(p.key)
+            used += fit_size
+        if queue_key in self.cursors:
+            self.cursors[queue_key] = i
+        return assigned
 
 def format_tower(title, captain, members):
-    alliance = captain.get("alliance", "").upper()
+    alliance = captain.alliance.upper()
     lines = [
         f"{title}",
-        f"Капитан: {captain['nickname']} [{alliance}] вместимость: {parse_capacity(captain['group_capacity']):,}".replace(",", " ")
+        f"Капитан: {captain.nickname} [{alliance}] вместимость: {captain.group_capacity:,}".replace(",", " ")
     ]
     for m in members:
-        if "assigned" in m:
-            lines.append(f"{m['nickname']} [{m.get('alliance', '').upper()}] — {int(m['assigned']):,}".replace(",", " "))
+        lines.append(f"{m.player.nickname} [{m.player.alliance.upper()}] — {m.assigned:,}".replace(",", " "))
     return "\n".join(lines)
 
-def generate_distribution(filename=FILE_PATH):
-    players = load_players(filename)
-    shifts = balance_shifts(group_by_shift(players))
-    result = []
+def tower_slots(captains, hub_type=None):
+    # (заголовок, капитан, разрешённый тип войск) в порядке заполнения
+    return (
+        [("🏠 Хаб (лучшие бойцы)", captains[0], hub_type or captains[0].troop_type)]
+        + [(f"🛡 Башня {troop_type}", captains[i], troop_type) for i, troop_type in enumerate(TOWER_TYPES, start=1)]
+        + [("⚔️ Башня микс", captains[4], None)]
+    )
 
-    for shift, shift_players in shifts.items():
-        result.append(f"\n🕐 Смена {shift}")
-        shift_players = sort_players(shift_players)
+def plan_shift(shift_players, captains=None, hub_type=None):
+    shift_players = sort_players(shift_players)
+    if captains is None:
         captains = assign_captains(shift_players)
 
-        if len(captains) < 5:
-            result.append("❗ Недостаточно капитанов!")
-            continue
+    if len(captains) < 5:
+        return None
+
+    pool = MemberPool(shift_players, taken_keys=(p.key for p in captains))
+    return [
+        (title, captain, pool.fill(captain, allowed_type))
+        for title, captain, allowed_type in tower_slots(captains, hub_type)
+    ]
+
+def format_shift(shift, towers):
+    lines = [f"\n🕐 Смена {shift}"]
+    if towers is None:
+        lines.append("❗ Недостаточно капитанов!")
+    else:
+        lines.extend(format_tower(title, captain, members) for title, captain, members in towers)
+    return lines
 
-        assigned_nicks = set(p["nickname"] for p in captains)
+ENGINES = ("python", "numpy", "solver")
 
-        # Хаб
-        hub_captain = captains[0]
-        hub_type = hub_captain.get("troop_type", "").lower()
-        hub_members = assign_to_tower(hub_captain, shift_players, allowed_type=hub_type, assigned_nicks=assigned_nicks)
-        result.append(format_tower("🏠 Хаб (лучшие бойцы)", hub_captain, hub_members))
+def get_planner(engine=DISTRIBUTION_ENGINE):
+    if engine not in ENGINES:
+        raise ValueError(f"Неизвестный движок распределения: {engine}. Доступны: {', '.join(ENGINES)}")
+    if engine == "numpy":
+        from distribution_np import plan_shift_np
+        return plan_shift_np
+    if engine == "solver":
+        from tower_solver import plan_shift_solver
+        return plan_shift_solver
+    return plan_shift
 
-        # Башни по типу
-        for i, troop_type in enumerate(["стрелок", "байкер", "боец"], start=1):
-            cap = captains[i]
-            members = assign_to_tower(cap, shift_players, allowed_type=troop_type, assigned_nicks=assigned_nicks)
-            result.append(format_tower(f"🛡 Башня {troop_type}", cap, members))
+def plan_distribution(filename=FILE_PATH, engine=DISTRIBUTION_ENGINE):
+    # [(смена, башни или None, примечание или None), ...]
+    # Движок проверяется до замеров: метка engine не должна принимать произвольные значения
+    plan = get_planner(engine)
+    with metrics.timer("distribution_phase_seconds", phase="load", engine=engine):
+        shifted = load_shifts(filename)
+    with metrics.timer("distribution_phase_seconds", phase="balance", engine=engine):
+        shifts = balance_shifts(shifted)
+    plans = []
+    with metrics.timer("distribution_phase_seconds", phase="plan", engine=engine):
+        if engine == "solver":
+            # Солвер дополнительно сообщает, насколько он улучшил жадный план
+            from tower_solver import solve_shift
+            for shift, shift_players in shifts.items():
+                towers, report = solve_shift(shift_players)
+                plans.append((shift, towers, report.summary() if report is not None else None))
+            return plans
 
-        # Микс
-        mix_captain = captains[4]
-        mix_members = assign_to_tower(mix_captain, shift_players, assigned_nicks=assigned_nicks)
-        result.append(format_tower("⚔️ Башня микс", mix_captain, mix_members))
+        for shift, shift_players in shifts.items():
+            plans.append((shift, plan(shift_players), None))
+    return plans
 
+def format_distribution(plans):
+    result = []
+    for shift, towers, note in plans:
+        result.extend(format_shift(shift, towers))
+        if note:
+            result.append(note)
     return "\n\n".join(result)
 
+def generate_distribution(filename=FILE_PATH, engine=DISTRIBUTION_ENGINE):
+    plans = plan_distribution(filename, engine)
+    with metrics.timer("distribution_phase_seconds", phase="format", engine=engine):
+        return format_distribution(plans)
+
 if __name__ == "__main__":
-    print(generate_distribution())
+    import sys
+    if sys.argv[1:2] == ["explore"]:
+        from scenarios import main as explore_main
+        explore_main(sys.argv[2:])
+    else:
+        print(generate_distribution())
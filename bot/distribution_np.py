@@ -0,0 +1,87 @@
+import sys
+import numpy as np
+from models import Assignment
+from distribution import FILE_PATH, CAPTAIN_MIN_POWER, tower_slots, generate_distribution
+
+# Столбцовое представление смены: по массиву на каждое числовое поле
+class ShiftColumns:
+    def __init__(self, players):
+        self.players = players
+        self.tier = np.fromiter((p.tier_rank for p in players), dtype=np.int64, count=len(players))
+        self.troop_size = np.fromiter((p.troop_size for p in players), dtype=np.int64, count=len(players))
+        self.group_capacity = np.fromiter((p.group_capacity for p in players), dtype=np.int64, count=len(players))
+        self.true_power = np.fromiter((p.true_power for p in players), dtype=np.int64, count=len(players))
+        self.wants_captain = np.fromiter((p.wants_captain for p in players), dtype=bool, count=len(players))
+        self.type_codes = {}
+        self.troop_type = np.fromiter(
+            (self.type_codes.setdefault(p.troop_type, len(self.type_codes)) for p in players),
+            dtype=np.int64, count=len(players)
+        )
+
+    def reorder(self, order):
+        self.players = [self.players[i] for i in order]
+        for name in ("tier", "troop_size", "group_capacity", "true_power", "wants_captain", "troop_type"):
+            setattr(self, name, getattr(self, name)[order])
+
+    def type_mask(self, troop_type):
+        code = self.type_codes.get(troop_type)
+        if code is None:
+            return np.zeros(len(self.players), dtype=bool)
+        return self.troop_type == code
+
+def _capacity_fill(sizes, capacity):
+    # Повторяет жадный цикл: игрок попадает в башню, пока занятое до него место
+    # меньше вместимости; последний получает только остаток
+    used_before = np.cumsum(sizes) - sizes
+    taken = used_before < capacity
+    return taken, np.minimum(sizes[taken], capacity - used_before[taken])
+
+def plan_shift_np(shift_players):
+    # Тот же результат, что distribution.plan_shift, но на масках и lexsort.
+    # np.lexsort устойчива, поэтому порядок при равных ключах совпадает с sorted()
+    if not shift_players:
+        return None
+    cols = ShiftColumns(shift_players)
+    cols.reorder(np.lexsort((-cols.group_capacity, -cols.tier)))
+    players = cols.players
+
+    candidates = np.flatnonzero(cols.wants_captain & (cols.true_power >= CAPTAIN_MIN_POWER))
+    if len(candidates) < 5:
+        candidates = np.arange(len(players))
+    by_power = candidates[np.lexsort((
+        -cols.group_capacity[candidates], -cols.tier[candidates], -cols.true_power[candidates]
+    ))]
+    captain_idx = by_power[:5]
+    if len(captain_idx) < 5:
+        return None
+    captains = [players[i] for i in captain_idx]
+
+    assigned = np.zeros(len(players), dtype=bool)
+    assigned[captain_idx] = True
+    # Порядок внутри любой башни — сортировка по (тир, размер отряда), ограниченная маской
+    member_order = np.lexsort((-cols.troop_size, -cols.tier))
+
+    towers = []
+    for title, captain, allowed_type in tower_slots(captains):
+        if captain.group_capacity == 0:
+            towers.append((title, captain, []))
+            continue
+        mask = ~assigned
+        if allowed_type:
+            mask &= cols.type_mask(allowed_type)
+        candidates = member_order[mask[member_order]]
+        taken, fit = _capacity_fill(cols.troop_size[candidates], captain.group_capacity)
+        chosen = candidates[taken]
+        assigned[chosen] = True
+        towers.append((title, captain, [Assignment(players[i], int(size)) for i, size in zip(chosen, fit)]))
+    return towers
+
+def check_parity(filename=FILE_PATH):
+    return generate_distribution(filename, engine="numpy") == generate_distribution(filename, engine="python")
+
+if __name__ == "__main__":
+    if "--check" in sys.argv:
+        ok = check_parity()
+        print("✅ Результаты совпадают с generate_distribution" if ok else "❌ Результаты расходятся")
+        sys.exit(0 if ok else 1)
+    print(generate_distribution(engine="numpy"))
@@ -0,0 +1,112 @@
+import asyncio
+import json
+import time
+from collections import Counter
+from telegram.error import RetryAfter
+from telegram.request import BaseRequest
+
+# Подмена Bot API для локальных проверок: ничего не отправляет в сеть,
+# запоминает сообщения и умеет имитировать задержку и флуд-контроль Telegram
+class FakeMessage:
+    def __init__(self, message_id, chat_id, text, reply_markup=None):
+        self.message_id = message_id
+        self.chat_id = chat_id
+        self.text = text
+        self.reply_markup = reply_markup
+
+class FakeBot:
+    def __init__(self, latency=0.0, chat_rate=None, global_rate=None, retry_after=1):
+        self.latency = latency
+        # Если заданы — превышение лимита (сообщений в секунду) отвечает RetryAfter, как Telegram
+        self.chat_rate = chat_rate
+        self.global_rate = global_rate
+        self.retry_after = retry_after
+        self.sent = []
+        self.flood_errors = 0
+        self._last_chat = {}
+        self._last_global = 0.0
+
+    def _check_flood(self, chat_id):
+        now = time.monotonic()
+        if self.chat_rate and now - self._last_chat.get(chat_id, -1e9) < 1 / self.chat_rate:
+            self.flood_errors += 1
+            raise RetryAfter(self.retry_after)
+        if self.global_rate and now - self._last_global < 1 / self.global_rate:
+            self.flood_errors += 1
+            raise RetryAfter(self.retry_after)
+        self._last_chat[chat_id] = now
+        self._last_global = now
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        self._check_flood(chat_id)
+        message = FakeMessage(len(self.sent) + 1, chat_id, text, reply_markup)
+        self.sent.append(message)
+        return message
+
+    def messages_to(self, chat_id):
+        return [m.text for m in self.sent if m.chat_id == chat_id]
+
+# Подмена транспорта Bot API для настоящего Application:
+# ApplicationBuilder().token("0:fake").request(FakeRequest()).get_updates_request(FakeRequest())
+class FakeRequest(BaseRequest):
+    BOT_USER = {"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"}
+
+    def __init__(self, latency=0.0, chat_rate=None, retry_after=1, on_send=None):
+        self.latency = latency
+        self.chat_rate = chat_rate
+        self.retry_after = retry_after
+        # Вызывается с каждым отправленным ботом сообщением (нагрузочный тест ждёт по нему ответа)
+        self.on_send = on_send
+        self.calls = Counter()
+        self.sent = []
+        self._last_chat = {}
+        self._message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, params):
+        self._message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        return {
+            "message_id": params.get("message_id", self._message_id),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": params.get("text", ""),
+        }
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        self.calls[endpoint] += 1
+
+        if endpoint == "sendMessage" and self.chat_rate:
+            chat_id = params.get("chat_id")
+            now = time.monotonic()
+            if now - self._last_chat.get(chat_id, -1e9) < 1 / self.chat_rate:
+                body = {"ok": False, "error_code": 429, "description": "Too Many Requests",
+                        "parameters": {"retry_after": self.retry_after}}
+                return 429, json.dumps(body).encode()
+            self._last_chat[chat_id] = now
+
+        if endpoint == "getMe":
+            result = self.BOT_USER
+        elif endpoint in ("sendMessage", "editMessageText"):
+            result = self._message(params)
+            if endpoint == "sendMessage":
+                self.sent.append(result)
+                if self.on_send is not None:
+                    self.on_send(result)
+        elif endpoint == "getUpdates":
+            result = []
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
@@ -3,8 +3,11 @@ from telegram.ext import (
     CommandHandler, MessageHandler, CallbackQueryHandler,
     ConversationHandler, ContextTypes, filters
 )
-from config import ADMINS
-from storage import load_players, update_player_by_nickname, delete_player_by_nickname
+from config import ADMINS, PERSISTENCE_PATH
+from storage import registry
+from player_search import nickname_index, page_of
+from outbox import outbox
+from write_queue import update_player, delete_player
 from utils import validate_troop_input, validate_tier, validate_shift, validate_power
 
 EDIT_SELECT_PLAYER, EDIT_SELECT_FIELD, EDIT_ENTER_VALUE, EDIT_CONFIRM_DELETE = range(9, 13)
@@ -12,18 +15,61 @@ EDIT_SELECT_PLAYER, EDIT_SELECT_FIELD, EDIT_ENTER_VALUE, EDIT_CONFIRM_DELETE = r
 def is_admin(user_id):
     return user_id in ADMINS
 
+def picker_markup(matches, number):
+    nicknames, number, total = page_of(matches, number)
+    buttons = [[InlineKeyboardButton(nickname, callback_data=f"edit_nick|{nickname}")] for nickname in nicknames]
+    if total > 1:
+        nav = []
+        if number > 0:
+            nav.append(InlineKeyboardButton("◀", callback_data=f"edit_page|{number - 1}"))
+        nav.append(InlineKeyboardButton(f"{number + 1}/{total}", callback_data=f"edit_page|{number}"))
+        if number < total - 1:
+            nav.append(InlineKeyboardButton("▶", callback_data=f"edit_page|{number + 1}"))
+        buttons.append(nav)
+    return InlineKeyboardMarkup(buttons)
+
+def picker_text(query, found):
+    if query:
+        return f"🔎 «{query}»: найдено {found}. Выберите участника или введите другую часть ника:"
+    return "Выберите участника или введите часть ника для поиска:"
+
 async def edit_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
-        await update.message.reply_text("⛔ У вас нет прав.")
+        outbox.reply(update, "⛔ У вас нет прав.")
+        return
+
+    if not len(registry):
+        outbox.reply(update, "Список пуст.")
         return
 
-    players = load_players()
-    if not players:
-        await update.message.reply_text("Список пуст.")
+    context.user_data["edit_query"] = ""
+    matches = nickname_index.search("")
+    outbox.reply(update, picker_text("", len(matches)), reply_markup=picker_markup(matches, 0))
+    return EDIT_SELECT_PLAYER
+
+async def edit_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
         return
+    query = update.message.text.strip()
+    matches = nickname_index.search(query)
+    if not matches:
+        outbox.reply(update, f"🔎 «{query}»: никого не найдено. Попробуйте другую часть ника:")
+        return EDIT_SELECT_PLAYER
+    context.user_data["edit_query"] = query
+    outbox.reply(update, picker_text(query, len(matches)), reply_markup=picker_markup(matches, 0))
+    return EDIT_SELECT_PLAYER
 
-    buttons = [[InlineKeyboardButton(p['nickname'], callback_data=f"edit_nick|{p['nickname']}")] for p in players]
-    await update.message.reply_text("Выберите участника:", reply_markup=InlineKeyboardMarkup(buttons))
+async def edit_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return
+    query = update.callback_query
+    await query.answer()
+    number = int(query.data.split("|")[1])
+    search = context.user_data.get("edit_query", "")
+    matches = nickname_index.search(search)
+    markup = picker_markup(matches, number)
+    if markup != query.message.reply_markup:
+        await query.edit_message_text(picker_text(search, len(matches)), reply_markup=markup)
     return EDIT_SELECT_PLAYER
 
 async def edit_player_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -56,30 +102,30 @@ async def apply_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     value = update.message.text.strip()
 
     if field == "troop_size" and not validate_troop_input(value):
-        await update.message.reply_text("❌ Отряд: число от 200000 до 700000.")
+        outbox.reply(update, "❌ Отряд: число от 200000 до 700000.")
         return EDIT_ENTER_VALUE
 
     if field == "tier" and not validate_tier(value):
-        await update.message.reply_text("❌ Тир должен быть от T10 до T13.")
+        outbox.reply(update, "❌ Тир должен быть от T10 до T13.")
         return EDIT_ENTER_VALUE
 
     if field == "group_capacity" and not validate_troop_input(value):
-        await update.message.reply_text("❌ Группа: число от 800000 до 3.500.000.")
+        outbox.reply(update, "❌ Группа: число от 800000 до 3.500.000.")
         return EDIT_ENTER_VALUE
 
     if field == "shift" and not validate_shift(value):
-        await update.message.reply_text("❌ Смена должна быть 1, 2 или обе.")
+        outbox.reply(update, "❌ Смена должна быть 1, 2 или обе.")
         return EDIT_ENTER_VALUE
 
     if field == "true_power":
         if not validate_power(value) or int(value) < 300_000_000:
-            await update.message.reply_text("❌ Личная мощь должна быть числом от 300.000.000.")
+            outbox.reply(update, "❌ Личная мощь должна быть числом от 300.000.000.")
             return EDIT_ENTER_VALUE
 
-    if update_player_by_nickname(nickname, field, value):
-        await update.message.reply_text(f"✅ Обновлено: {nickname}.{field} = {value}")
+    if await update_player(nickname, field, value):
+        outbox.reply(update, f"✅ Обновлено: {nickname}.{field} = {value}")
     else:
-        await update.message.reply_text("❌ Не удалось изменить.")
+        outbox.reply(update, "❌ Не удалось изменить.")
     return ConversationHandler.END
 
 async def confirm_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -97,7 +143,7 @@ async def delete_user_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE
         return
     await update.callback_query.answer()
     nickname = context.user_data["edit_nick"]
-    delete_player_by_nickname(nickname)
+    await delete_player(nickname)
     await update.callback_query.edit_message_text(f"🗑 Участник {nickname} удалён.")
     return ConversationHandler.END
 
@@ -113,7 +159,12 @@ def get_edit_conversation_handler():
             MessageHandler(filters.Regex("Список"), edit_command)
         ],
         states={
-            EDIT_SELECT_PLAYER: [CallbackQueryHandler(edit_player_callback, pattern="^edit_nick\\|")],
+            EDIT_SELECT_PLAYER: [
+                CallbackQueryHandler(edit_player_callback, pattern="^edit_nick\\|"),
+                CallbackQueryHandler(edit_page_callback, pattern="^edit_page\\|"),
+                # Кнопки главного меню не считаются поисковым запросом
+                MessageHandler(filters.TEXT & ~filters.COMMAND & ~filters.Regex("^(📋|📝)"), edit_search)
+            ],
             EDIT_SELECT_FIELD: [
                 CallbackQueryHandler(edit_field_callback, pattern="^edit_field\\|"),
                 CallbackQueryHandler(confirm_delete, pattern="^delete_user$")
@@ -124,5 +175,7 @@ def get_edit_conversation_handler():
                 CallbackQueryHandler(delete_user_cancel, pattern="^delete_cancel$")
             ]
         },
-        fallbacks=[]
+        fallbacks=[],
+        name="edit",
+        persistent=bool(PERSISTENCE_PATH)
     )
@@ -0,0 +1,400 @@
+import asyncio
+import functools
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+from config import METRICS_LISTEN, METRICS_PORT, PROFILE_SLOW_MS, PROFILE_DIR, PROFILE_INTERVAL
+
+PREFIX = "bot_"
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        # Оценка по корзинам, как histogram_quantile в Prometheus: внутри корзины — линейно
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            if seen + count >= rank and count:
+                if i == len(self.buckets):
+                    return self.max
+                lower = self.buckets[i - 1] if i else 0.0
+                upper = min(self.buckets[i], self.max)
+                return lower + (max(upper, lower) - lower) * (rank - seen) / count
+            seen += count
+        return self.max
+
+def _label_key(labels) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key, extra=()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (f'{k}="{_escape(v)}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+# Реестр метрик процесса: гистограммы длительностей и счётчики с метками.
+# Запись идёт и из рабочих потоков (хранилище, синхронизация), поэтому под замком
+class Metrics:
+    def __init__(self, prefix: str = PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self.histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self.counters: Dict[str, Dict[tuple, float]] = {}
+        self.gauges: Dict[str, Tuple[Callable[[], float], str]] = {}
+        self.descriptions: Dict[str, str] = {}
+
+    def describe(self, name: str, text: str) -> None:
+        self.descriptions[name] = text
+
+    def histogram(self, name: str, **labels) -> Histogram:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = Histogram()
+            return series[key]
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        series = self.histogram(name, **labels)
+        with self._lock:
+            series.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def gauge(self, name: str, func: Callable[[], float], kind: str = "gauge") -> None:
+        # Значение снимается в момент чтения метрик (длина очереди, счётчики других модулей)
+        self.gauges[name] = (func, kind)
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name: str, **labels):
+        # Декоратор для обычных функций; серия создаётся один раз, а не на каждый вызов
+        def decorator(func):
+            series = self.histogram(name, **labels)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    with self._lock:
+                        series.observe(elapsed)
+            return wrapper
+        return decorator
+
+    def series(self, name: str) -> List[Tuple[Dict[str, str], Histogram]]:
+        with self._lock:
+            return [(dict(key), h) for key, h in self.histograms.get(name, {}).items()]
+
+    def counter(self, name: str) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            return [(dict(key), value) for key, value in self.counters.get(name, {}).items()]
+
+    def render(self) -> str:
+        # Текстовый формат Prometheus (exposition format 0.0.4)
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.histograms.items()):
+                full = self.prefix + name
+                if name in self.descriptions:
+                    lines.append(f"# HELP {full} {self.descriptions[name]}")
+                lines.append(f"# TYPE {full} histogram")
+                for key, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets_of(h), h.counts):
+                        cumulative += count
+                        lines.append(f"{full}_bucket{_format_labels(key, [('le', bound)])} {cumulative}")
+                    lines.append(f"{full}_sum{_format_labels(key)} {_format_number(h.sum)}")
+                    lines.append(f"{full}_count{_format_labels(key)} {h.count}")
+            for name, series in sorted(self.counters.items()):
+                full = self.prefix + name
+                if name in self.descriptions:
+                    lines.append(f"# HELP {full} {self.descriptions[name]}")
+                lines.append(f"# TYPE {full} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{full}{_format_labels(key)} {_format_number(value)}")
+            gauges = sorted(self.gauges.items())
+        for name, (func, kind) in gauges:
+            full = self.prefix + name
+            try:
+                value = func()
+            except Exception:
+                logging.exception("Не удалось снять метрику %s", name)
+                continue
+            if name in self.descriptions:
+                lines.append(f"# HELP {full} {self.descriptions[name]}")
+            lines.append(f"# TYPE {full} {kind}")
+            lines.append(f"{full} {_format_number(value)}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def buckets_of(h: Histogram) -> List[str]:
+        return [_format_number(b) for b in h.buckets] + ["+Inf"]
+
+metrics = Metrics()
+metrics.describe("handler_seconds", "Время обработки обновления обработчиком")
+metrics.describe("handler_errors_total", "Исключения в обработчиках")
+metrics.describe("storage_op_seconds", "Операции реестра игроков")
+metrics.describe("storage_io_seconds", "Чтение и запись файлов хранилища")
+metrics.describe("storage_io_bytes_total", "Прочитано и записано байт хранилищем")
+metrics.describe("sheets_fetch_seconds", "Запросы к Google Таблице")
+metrics.describe("sheets_rows_total", "Строк получено из Google Таблицы")
+metrics.describe("distribution_phase_seconds", "Этапы расчёта распределения")
+metrics.describe("slow_updates_total", "Медленные обновления, для которых сохранены стеки")
+
+# --- профилирование медленных обновлений ---
+
+# Функции, в которых поток простаивает: такие стеки не попадают в профиль
+IDLE_FRAMES = {"select", "poll", "_worker", "wait", "_wait_for_tstate_lock"}
+
+def collapse_stack(frame, thread_name: str) -> Optional[str]:
+    if frame.f_code.co_name in IDLE_FRAMES:
+        return None
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    names.append(thread_name)
+    return ";".join(reversed(names))
+
+# Сэмплирующий профилировщик: пока обрабатывается хоть одно обновление, отдельный поток
+# раз в PROFILE_INTERVAL снимает стеки всех потоков. Если обработчик работал дольше
+# порога, стеки за время его работы сохраняются в свёрнутом формате ("a;b;c 12").
+# Обновления выполняются в одном цикле событий вперемешку, поэтому в профиль попадает
+# всё, что процесс делал за это время, — как раз то, что задержало ответ
+class SlowUpdateProfiler:
+    def __init__(self, threshold_ms: float = PROFILE_SLOW_MS, directory: str = PROFILE_DIR,
+                 interval: float = PROFILE_INTERVAL, max_samples: int = 50_000):
+        self.threshold = threshold_ms / 1000
+        self.directory = directory
+        self.interval = interval
+        self.samples = deque(maxlen=max_samples)
+        self.dumps = 0
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold > 0
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._sample_loop, name="slow-update-profiler", daemon=True)
+            self._thread.start()
+
+    def _sample_loop(self) -> None:
+        me = threading.get_ident()
+        while True:
+            self._wake.wait()
+            names = {t.ident: t.name for t in threading.enumerate()}
+            now = time.perf_counter()
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = collapse_stack(frame, names.get(ident, "thread"))
+                if stack is not None:
+                    self.samples.append((now, stack))
+            time.sleep(self.interval)
+
+    def begin(self) -> float:
+        if self.enabled:
+            with self._lock:
+                self._active += 1
+                self._ensure_thread()
+                self._wake.set()
+        return time.perf_counter()
+
+    def end(self, started: float, name: str, elapsed: float) -> Optional[str]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._active -= 1
+            if not self._active:
+                self._wake.clear()
+        if elapsed < self.threshold:
+            return None
+        finished = started + elapsed
+        stacks = Counter(stack for at, stack in list(self.samples) if started <= at <= finished)
+        if not stacks:
+            return None
+        return self.dump(name, elapsed, stacks)
+
+    def dump(self, name: str, elapsed: float, stacks: Counter) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        safe = re.sub(r"[^\w.-]", "_", name)
+        path = os.path.join(self.directory, f"{time.strftime('%Y%m%d-%H%M%S')}-{self.dumps + 1}-{safe}-{elapsed * 1000:.0f}ms.folded")
+        with open(path, "w", encoding="utf-8") as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        self.dumps += 1
+        metrics.inc("slow_updates_total", handler=name)
+        logging.warning("🐢 %s: %.0f мс, стеки сохранены в %s", name, elapsed * 1000, path)
+        return path
+
+profiler = SlowUpdateProfiler()
+
+# --- обработчики Telegram ---
+
+def instrument_callback(callback: Callable) -> Callable:
+    if getattr(callback, "_instrumented", False):
+        return callback
+    # При запуске "python bot.py" модуль называется __main__
+    module = "bot" if callback.__module__ == "__main__" else callback.__module__
+    name = f"{module}.{callback.__name__}"
+    series = metrics.histogram("handler_seconds", handler=name)
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        started = profiler.begin()
+        try:
+            return await callback(update, context)
+        except Exception:
+            metrics.inc("handler_errors_total", handler=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with metrics._lock:
+                series.observe(elapsed)
+            profiler.end(started, name, elapsed)
+
+    wrapper._instrumented = True
+    return wrapper
+
+def instrument_handlers(app) -> None:
+    # Оборачивает обработчики приложения (и шаги ConversationHandler) замером времени
+    from telegram.ext import ConversationHandler
+
+    def walk(handlers):
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                walk(handler.entry_points)
+                for state_handlers in handler.states.values():
+                    walk(state_handlers)
+                walk(handler.fallbacks)
+            elif asyncio.iscoroutinefunction(getattr(handler, "callback", None)):
+                handler.callback = instrument_callback(handler.callback)
+
+    for handlers in app.handlers.values():
+        walk(handlers)
+
+# --- страница метрик ---
+
+# Отдаёт GET /metrics для Prometheus; слушает только локальный адрес по умолчанию
+class MetricsServer:
+    def __init__(self, registry: Metrics = metrics, listen: str = METRICS_LISTEN, port: int = METRICS_PORT):
+        self.registry = registry
+        self.listen = listen
+        self.port = port
+        self._server = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.listen, self.port)
+        logging.info("📈 Метрики: http://%s:%s/metrics", self.listen, self.port)
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            request_line = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split(" ")
+            if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?", 1)[0] == "/metrics":
+                status, body = "200 OK", self.registry.render().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            else:
+                status, body, content_type = "404 Not Found", b"Not Found", "text/plain"
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: close\r\n\r\n".encode() + body
+            )
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+# --- сводка для /perf ---
+
+def format_histograms(name: str, title: str, limit: int = 15) -> List[str]:
+    rows = sorted(((labels, h) for labels, h in metrics.series(name) if h.count), key=lambda item: -item[1].sum)
+    if not rows:
+        return []
+    lines = [title]
+    for labels, h in rows[:limit]:
+        lines.append(
+            f"  {' '.join(v for _, v in sorted(labels.items())) or '—'}: {h.count}× p50 {h.quantile(0.5) * 1000:.1f} / "
+            f"p95 {h.quantile(0.95) * 1000:.1f} / max {h.max * 1000:.1f} мс"
+        )
+    if len(rows) > limit:
+        lines.append(f"  … ещё {len(rows) - limit}")
+    return lines
+
+def format_perf() -> str:
+    lines = []
+    lines += format_histograms("handler_seconds", "⏱ Обработчики (по суммарному времени):")
+    errors = metrics.counter("handler_errors_total")
+    if errors:
+        lines.append("❗ Ошибки: " + ", ".join(f"{labels['handler']} {int(value)}" for labels, value in errors))
+    lines += format_histograms("storage_op_seconds", "💾 Хранилище:")
+    io = {labels["op"]: value for labels, value in metrics.counter("storage_io_bytes_total")}
+    if io:
+        lines.append("  байт: " + ", ".join(f"{op} {int(v):,}".replace(",", " ") for op, v in sorted(io.items())))
+    lines += format_histograms("sheets_fetch_seconds", "📄 Google Таблица:")
+    lines += format_histograms("distribution_phase_seconds", "📊 Распределение:")
+    if not lines:
+        lines.append("Замеров пока нет.")
+    if profiler.enabled:
+        lines.append(f"🐢 Профилирование: порог {profiler.threshold * 1000:.0f} мс, сохранено {profiler.dumps}")
+    else:
+        lines.append("🐢 Профилирование медленных обновлений выключено (PROFILE_SLOW_MS)")
+    return "\n".join(lines)
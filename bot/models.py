@@ -0,0 +1,137 @@
+from utils import parse_capacity, tier_priority, normalize_tier, normalize_nickname, shift_key
+
+NUMERIC_FIELDS = ("troop_size", "group_capacity", "true_power")
+
+def normalize_field(field, value):
+    if field in NUMERIC_FIELDS:
+        return parse_capacity(value)
+    if field == "tier":
+        return normalize_tier(value)
+    if field in ("shift", "captain"):
+        return str(value).strip().lower()
+    return value.strip() if isinstance(value, str) else value
+
+def normalize_record(record):
+    # Числовые поля хранятся как int, тир — в виде "T11"
+    return {field: normalize_field(field, value) for field, value in record.items()}
+
+# Компактная запись игрока для распределения: все строки разобраны один раз,
+# сравнения в сортировках идут только по целым числам
+class Player:
+    __slots__ = (
+        "user_id", "nickname", "key", "alliance", "troop_type", "troop_size",
+        "tier", "tier_rank", "group_capacity", "shift", "captain", "true_power"
+    )
+
+    def __init__(self, user_id, nickname, alliance, troop_type, troop_size, tier,
+                 group_capacity, shift, captain, true_power=0):
+        self.user_id = user_id
+        self.nickname = nickname
+        self.key = normalize_nickname(nickname)
+        self.alliance = alliance
+        self.troop_type = str(troop_type).strip().lower()
+        self.troop_size = parse_capacity(troop_size)
+        self.tier = normalize_tier(tier)
+        self.tier_rank = tier_priority(self.tier)
+        self.group_capacity = parse_capacity(group_capacity)
+        self.shift = shift_key(shift)
+        self.captain = str(captain).strip().lower()
+        self.true_power = parse_capacity(true_power)
+
+    @classmethod
+    def from_dict(cls, record):
+        return cls(
+            record.get("user_id", 0),
+            record.get("nickname", ""),
+            record.get("alliance", ""),
+            record.get("troop_type", ""),
+            record.get("troop_size", 0),
+            record.get("tier", ""),
+            record.get("group_capacity", 0),
+            record.get("shift", "1"),
+            record.get("captain", ""),
+            record.get("true_power", 0),
+        )
+
+    def to_dict(self):
+        return {
+            "user_id": self.user_id,
+            "nickname": self.nickname,
+            "alliance": self.alliance,
+            "troop_type": self.troop_type,
+            "troop_size": self.troop_size,
+            "tier": self.tier,
+            "group_capacity": self.group_capacity,
+            "shift": self.shift,
+            "captain": self.captain,
+            "true_power": self.true_power,
+        }
+
+    @property
+    def wants_captain(self):
+        return self.captain == "да"
+
+    def __repr__(self):
+        return f"Player({self.nickname!r}, {self.tier}, {self.troop_type}, shift={self.shift})"
+
+# Игрок в башне и сколько его войск туда помещается
+class Assignment:
+    __slots__ = ("player", "assigned")
+
+    def __init__(self, player, assigned):
+        self.player = player
+        self.assigned = assigned
+
+    def __repr__(self):
+        return f"Assignment({self.player.nickname!r}, {self.assigned})"
+
+# Сводка по составу, которая пересчитывается на каждую запись, а не на каждый запрос:
+# добавление игрока прибавляет его вклад, удаление — вычитает
+class RosterStats:
+    GROUPS = ("alliance", "shift", "troop_type", "tier")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.counts = {group: {} for group in self.GROUPS}
+        self.troops_by_shift = {}
+        self.capacity_by_shift = {}
+
+    def _values(self, player):
+        return {
+            "alliance": player.alliance.upper(),
+            "shift": player.shift,
+            "troop_type": player.troop_type,
+            "tier": player.tier,
+        }
+
+    @staticmethod
+    def _bump(counter, key, delta):
+        value = counter.get(key, 0) + delta
+        if value:
+            counter[key] = value
+        else:
+            counter.pop(key, None)
+
+    def _apply(self, player, sign):
+        self.count += sign
+        for group, value in self._values(player).items():
+            self._bump(self.counts[group], value, sign)
+        self._bump(self.troops_by_shift, player.shift, sign * player.troop_size)
+        self._bump(self.capacity_by_shift, player.shift, sign * player.group_capacity)
+
+    def add(self, player):
+        self._apply(player, 1)
+
+    def remove(self, player):
+        self._apply(player, -1)
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            **{group: dict(counter) for group, counter in self.counts.items()},
+            "troops_by_shift": dict(self.troops_by_shift),
+            "capacity_by_shift": dict(self.capacity_by_shift),
+        }
@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Dict, Tuple
+from telegram.error import TelegramError
+from config import OUTBOX_GLOBAL_RATE
+from outbox import outbox
+from redistribution import load_state
+from storage import registry
+
+NOTIFY_STATE_PATH = "notify_state.json"
+# Сколько личных сообщений может одновременно ждать отправки в очереди
+FANOUT_CONCURRENCY = 20
+# Как часто сохраняется журнал доставки и обновляется статус, секунды
+PROGRESS_INTERVAL = 2
+
+def fmt(number):
+    return f"{number:,}".replace(",", " ")
+
+def digest(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+
+def personal_messages(state, roster) -> Dict[str, Tuple[int, str]]:
+    # {ключ игрока: (user_id, текст)} по опубликованному распределению
+    players = {p.key: p for p in roster}
+    messages = {}
+    for shift, towers in state.shifts.items():
+        for tower in towers or []:
+            captain = players.get(tower.captain)
+            if captain is None:
+                continue
+            used = sum(tower.members.values())
+            messages[captain.key] = (captain.user_id, (
+                f"👑 Вы капитан: {tower.title}, смена {shift}\n"
+                f"Участников: {len(tower.members)}, войск: {fmt(used)} из {fmt(captain.group_capacity)}"
+            ))
+            for key, assigned in tower.members.items():
+                player = players.get(key)
+                if player is None:
+                    continue
+                messages[key] = (player.user_id, (
+                    f"📍 Ваше место: {tower.title}, смена {shift}\n"
+                    f"Капитан: {captain.nickname} [{captain.alliance.upper()}]\n"
+                    f"Войска: {fmt(assigned)}"
+                ))
+    for key, player in players.items():
+        if key not in messages:
+            messages[key] = (player.user_id, "🪑 В этот раз вы в запасе.")
+    return messages
+
+class FanOutReport:
+    def __init__(self, total=0):
+        self.total = total
+        self.sent = 0
+        self.failed = 0
+        self.skipped = 0
+        self.already = 0
+        self.started = time.monotonic()
+
+    @property
+    def done(self):
+        return self.sent + self.failed
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        parts = [f"отправлено {self.sent}", f"ошибок {self.failed}"]
+        if self.already:
+            parts.append(f"уже доставлено ранее {self.already}")
+        if self.skipped:
+            parts.append(f"без user_id {self.skipped}")
+        return ", ".join(parts) + f" ({elapsed:.0f} с)"
+
+# Рассылка личных назначений. Журнал доставки хранит для каждого игрока отпечаток
+# отправленного текста: повторный запуск шлёт только тем, кому сообщение не дошло
+# или у кого после /redistribute изменилось место. Отправка идёт через outbox,
+# так что лимиты Telegram соблюдаются, а время рассылки предсказуемо
+class FanOut:
+    def __init__(self, path=NOTIFY_STATE_PATH, concurrency=FANOUT_CONCURRENCY):
+        self.path = path
+        self.concurrency = concurrency
+        self._task = None
+        self.last_report = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    def load_log(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_log(self, log):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(log, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def pending(self, messages, log):
+        return {
+            key: (user_id, text) for key, (user_id, text) in messages.items()
+            if log.get(key, {}).get("status") != "sent" or log[key].get("digest") != digest(text)
+        }
+
+    def start(self, status_message=None):
+        if self.running:
+            return False
+        self._task = asyncio.get_running_loop().create_task(self._run(status_message))
+        return True
+
+    async def _report(self, status_message, text):
+        if status_message is None:
+            return
+        try:
+            await status_message.edit_text(text)
+        except TelegramError:
+            pass
+
+    async def _run(self, status_message):
+        try:
+            state = load_state()
+            if state is None:
+                await self._report(status_message, "Сначала выполните /distribute.")
+                return None
+            report = await self.deliver(personal_messages(state, registry.roster()), status_message)
+            await self._report(status_message, f"✅ Рассылка: {report.summary()}")
+            return report
+        except Exception as e:
+            logging.exception("Ошибка рассылки назначений")
+            await self._report(status_message, f"❌ Ошибка рассылки: {e}")
+
+    async def deliver(self, messages, status_message=None):
+        log = self.load_log()
+        todo = self.pending(messages, log)
+        report = self.last_report = FanOutReport(len(todo))
+        report.already = len(messages) - len(todo)
+        eta = len(todo) / OUTBOX_GLOBAL_RATE
+        await self._report(status_message, f"📨 Рассылаю {len(todo)} сообщений, ~{eta:.0f} с...")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        last_progress = time.monotonic()
+
+        async def send(key, user_id, text):
+            nonlocal last_progress
+            entry = log.setdefault(key, {})
+            entry["attempts"] = entry.get("attempts", 0) + 1
+            try:
+                async with semaphore:
+                    await outbox.enqueue(user_id, text)
+            except Exception as e:
+                # Например, игрок не запускал бота или заблокировал его
+                entry.update(status="failed", error=str(e), digest=digest(text))
+                report.failed += 1
+            else:
+                entry.update(status="sent", error=None, digest=digest(text), user_id=user_id)
+                report.sent += 1
+            if time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.monotonic()
+                # Журнал сохраняется по ходу: после падения рассылка продолжится с того же места
+                self.save_log(log)
+                await self._report(status_message, f"📨 Рассылка: {report.done}/{report.total}")
+
+        jobs = []
+        for key, (user_id, text) in todo.items():
+            if not user_id:
+                report.skipped += 1
+                report.total -= 1
+                log[key] = {"status": "failed", "error": "нет user_id", "digest": digest(text)}
+                continue
+            jobs.append(send(key, user_id, text))
+        try:
+            await asyncio.gather(*jobs)
+        finally:
+            self.save_log(log)
+        return report
+
+fan_out = FanOut()
@@ -0,0 +1,234 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+from telegram.error import BadRequest, NetworkError, RetryAfter, TimedOut
+from config import OUTBOX_GLOBAL_RATE, OUTBOX_CHAT_RATE, OUTBOX_CHAT_BURST
+from utils import split_text
+
+MESSAGE_LIMIT = 4000
+# Сколько сообщений может быть в пути одновременно (в разные чаты)
+SEND_CONCURRENCY = 8
+# Повторы при сетевых ошибках; RetryAfter повторяется всегда
+MAX_ATTEMPTS = 5
+# Сколько ждать отправки оставшихся сообщений при остановке, секунды
+SHUTDOWN_TIMEOUT = 30
+# Пауза перед повтором: RETRY_BACKOFF ** номер попытки, секунды
+RETRY_BACKOFF = 2
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self) -> float:
+        # Через сколько секунд появится жетон (0 — можно отправлять сейчас)
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self._refill()
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        # Telegram попросил подождать: следующий жетон появится не раньше чем через seconds
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+class OutgoingMessage:
+    __slots__ = ("chat_id", "text", "kwargs", "future", "attempts")
+
+    def __init__(self, chat_id: int, text: str, kwargs: Dict[str, Any], future: asyncio.Future):
+        self.chat_id = chat_id
+        self.text = text
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+
+    def can_merge(self, text: str, kwargs: Dict[str, Any]) -> bool:
+        # Склеиваются только простые текстовые сообщения без клавиатуры и параметров
+        return not self.kwargs and not kwargs and len(self.text) + len(text) + 2 <= MESSAGE_LIMIT
+
+# Единая очередь исходящих сообщений. Обработчики кладут сообщения и сразу
+# возвращаются; отправка идёт в фоне с ограничением скорости на каждый чат и
+# на бота в целом. Порядок сообщений внутри чата сохраняется: в каждый чат
+# в пути не больше одного сообщения. Соседние короткие сообщения в один чат,
+# ещё не ушедшие в сеть, склеиваются в одно.
+class Outbox:
+    def __init__(self, bot=None, global_rate: float = OUTBOX_GLOBAL_RATE, chat_rate: float = OUTBOX_CHAT_RATE,
+                 chat_burst: int = OUTBOX_CHAT_BURST, concurrency: int = SEND_CONCURRENCY):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.concurrency = concurrency
+        self._global = TokenBucket(global_rate)
+        self._queues: Dict[int, Deque[OutgoingMessage]] = {}
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._busy = set()
+        self._in_flight = 0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._task = None
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+        self.coalesced = 0
+
+    def start(self, bot=None) -> None:
+        if bot is not None:
+            self.bot = bot
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._idle = asyncio.Event()
+            self._idle.set()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    # --- постановка в очередь ---
+
+    def enqueue(self, chat_id: int, text: str, **kwargs) -> asyncio.Future:
+        # Возвращает future с отправленным сообщением; ждать его не обязательно
+        self.start()
+        queue = self._queues.setdefault(chat_id, deque())
+        if queue and queue[-1].can_merge(text, kwargs):
+            queue[-1].text += "\n\n" + text
+            self.coalesced += 1
+            return queue[-1].future
+        message = OutgoingMessage(chat_id, text, kwargs, asyncio.get_running_loop().create_future())
+        queue.append(message)
+        self._idle.clear()
+        self._wakeup.set()
+        return message.future
+
+    def send_long(self, chat_id: int, text: str, **kwargs) -> List[asyncio.Future]:
+        # Длинный текст режется по строкам; клавиатура и прочие параметры — у последней части
+        chunks = split_text(text, MESSAGE_LIMIT) or [text]
+        futures = [self.enqueue(chat_id, chunk) for chunk in chunks[:-1]]
+        futures.append(self.enqueue(chat_id, chunks[-1], **kwargs))
+        return futures
+
+    def reply(self, update, text: str, **kwargs) -> asyncio.Future:
+        # Ответ в чат обновления; future последней части, её можно дождаться, чтобы получить Message
+        return self.send_long(update.effective_chat.id, text, **kwargs)[-1]
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values()) + self._in_flight
+
+    async def drain(self) -> None:
+        if self._idle is not None:
+            await self._idle.wait()
+
+    async def close(self, timeout: float = SHUTDOWN_TIMEOUT) -> None:
+        # Остановка бота: отправляем то, что уже в очереди, но ждём не дольше timeout
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except asyncio.TimeoutError:
+            logging.warning("Не отправлено сообщений при остановке: %s", self.pending())
+        await self.stop()
+
+    # --- отправка ---
+
+    def _bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = self._buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _next_ready(self):
+        # (чат, 0) — можно отправлять; (None, сколько ждать) — пока некуда
+        wait = None
+        for chat_id, queue in self._queues.items():
+            if not queue or chat_id in self._busy:
+                continue
+            delay = self._bucket(chat_id).delay()
+            if delay == 0:
+                return chat_id, 0.0
+            wait = delay if wait is None else min(wait, delay)
+        return None, wait
+
+    async def _run(self) -> None:
+        while True:
+            if self._in_flight >= self.concurrency:
+                chat_id, wait = None, None
+            else:
+                chat_id, wait = self._next_ready()
+            if chat_id is None:
+                if not self._in_flight and not any(self._queues.values()):
+                    self._queues = {c: q for c, q in self._queues.items() if q}
+                    self._idle.set()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delay = self._global.delay()
+            if delay:
+                await asyncio.sleep(delay)
+                continue
+
+            self._global.take()
+            self._bucket(chat_id).take()
+            message = self._queues[chat_id].popleft()
+            # Чат уходит в конец очереди обхода: остальные чаты не ждут, пока он выговорится
+            self._queues[chat_id] = self._queues.pop(chat_id)
+            self._busy.add(chat_id)
+            self._in_flight += 1
+            asyncio.get_running_loop().create_task(self._send(message))
+
+    async def _send(self, message: OutgoingMessage) -> None:
+        try:
+            result = await self.bot.send_message(message.chat_id, message.text, **message.kwargs)
+        except RetryAfter as e:
+            self.retries += 1
+            self._bucket(message.chat_id).pause(float(e.retry_after))
+            self._queues.setdefault(message.chat_id, deque()).appendleft(message)
+        except (BadRequest, TimedOut) as e:
+            # BadRequest повторять бессмысленно: запрос не изменится. TimedOut не повторяем,
+            # потому что сообщение могло уже дойти, и повтор отправил бы его дважды
+            self._fail(message, e)
+        except NetworkError as e:
+            message.attempts += 1
+            if message.attempts < MAX_ATTEMPTS:
+                self.retries += 1
+                self._bucket(message.chat_id).pause(RETRY_BACKOFF ** message.attempts)
+                self._queues.setdefault(message.chat_id, deque()).appendleft(message)
+            else:
+                self._fail(message, e)
+        except Exception as e:
+            self._fail(message, e)
+        else:
+            self.sent += 1
+            if not message.future.done():
+                message.future.set_result(result)
+        finally:
+            self._busy.discard(message.chat_id)
+            self._in_flight -= 1
+            self._wakeup.set()
+
+    def _fail(self, message: OutgoingMessage, error: Exception) -> None:
+        self.failed += 1
+        logging.warning("Не удалось отправить сообщение в чат %s: %s", message.chat_id, error)
+        if not message.future.done():
+            message.future.set_exception(error)
+            # Ошибку уже записали в лог; не ругаемся, если future никто не ждёт
+            message.future.exception()
+
+outbox = Outbox()
@@ -0,0 +1,168 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from telegram.ext import BasePersistence, PersistenceInput
+from config import PERSISTENCE_PATH, PERSISTENCE_INTERVAL, REGISTRATION_TTL
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    name TEXT NOT NULL,
+    key TEXT NOT NULL,
+    state TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (name, key)
+);
+CREATE TABLE IF NOT EXISTS chat_data (id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS user_data (id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated REAL NOT NULL);
+"""
+
+# Разговоры, которые истекают вместе с незаконченной анкетой
+EXPIRING_CONVERSATIONS = ("registration",)
+
+def registration_expired(chat_data: Dict[str, Any], now: Optional[float] = None) -> bool:
+    started = chat_data.get("answers_at")
+    return started is not None and (now or time.time()) - started > REGISTRATION_TTL
+
+def drop_expired_answers(chat_data: Dict[str, Any], now: Optional[float] = None) -> bool:
+    if not registration_expired(chat_data, now):
+        return False
+    chat_data.pop("answers", None)
+    chat_data.pop("answers_at", None)
+    return True
+
+# Хранилище состояния бота в SQLite: язык и незаконченные анкеты (chat_data),
+# данные редактирования (user_data) и шаги ConversationHandler.
+# Application сам собирает изменения и отдаёт их раз в update_interval секунд;
+# все записи одного такого прохода сохраняются одной транзакцией
+class SqlitePersistence(BasePersistence):
+    def __init__(self, path: str = PERSISTENCE_PATH, update_interval: float = PERSISTENCE_INTERVAL):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._pending = []
+        self._commit_scheduled = False
+        self.commits = 0
+
+    # --- запись пачками ---
+
+    def _write(self, sql: str, params: tuple) -> None:
+        self._pending.append((sql, params))
+        if not self._commit_scheduled:
+            self._commit_scheduled = True
+            # Все update_* одного прохода Application выполняются подряд: коммит — после них
+            asyncio.get_running_loop().call_soon(self._commit)
+
+    def _commit(self) -> None:
+        self._commit_scheduled = False
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        with self._lock, self._conn:
+            for sql, params in pending:
+                self._conn.execute(sql, params)
+        self.commits += 1
+
+    # --- чтение при запуске ---
+
+    def _load(self, table: str) -> Dict[int, Any]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, data FROM {table}").fetchall()
+        return {row[0]: json.loads(row[1]) for row in rows}
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        chats = self._load("chat_data")
+        now = time.time()
+        for data in chats.values():
+            # Брошенные анкеты не восстанавливаем
+            drop_expired_answers(data, now)
+        return chats
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        return self._load("user_data")
+
+    async def get_conversations(self, name: str) -> Dict[Any, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key, state, updated FROM conversations WHERE name = ?", (name,)
+            ).fetchall()
+        now = time.time()
+        return {
+            tuple(json.loads(key)): json.loads(state)
+            for key, state, updated in rows
+            if name not in EXPIRING_CONVERSATIONS or now - updated <= REGISTRATION_TTL
+        }
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    # --- сохранение изменений ---
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        if new_state is None:
+            self._write("DELETE FROM conversations WHERE name = ? AND key = ?", (name, json.dumps(list(key))))
+        else:
+            self._write(
+                "INSERT OR REPLACE INTO conversations (name, key, state, updated) VALUES (?, ?, ?, ?)",
+                (name, json.dumps(list(key)), json.dumps(new_state), time.time())
+            )
+
+    async def update_chat_data(self, chat_id: int, data: Dict[str, Any]) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO chat_data (id, data, updated) VALUES (?, ?, ?)",
+            (chat_id, json.dumps(data, ensure_ascii=False), time.time())
+        )
+
+    async def update_user_data(self, user_id: int, data: Dict[str, Any]) -> None:
+        self._write(
+            "INSERT OR REPLACE INTO user_data (id, data, updated) VALUES (?, ?, ?)",
+            (user_id, json.dumps(data, ensure_ascii=False), time.time())
+        )
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._write("DELETE FROM chat_data WHERE id = ?", (chat_id,))
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._write("DELETE FROM user_data WHERE id = ?", (user_id,))
+
+    async def update_bot_data(self, data) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_user_data(self, user_id: int, user_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        # Вызывается при остановке после последнего прохода Application
+        self._commit()
+        with self._lock:
+            self._conn.close()
+
+async def expire_registrations(app, interval: float = 600) -> None:
+    # Во время работы брошенные анкеты тоже не копятся в памяти: следующий ответ
+    # в такой анкете получит просьбу начать заново (см. registration.collect_answer)
+    while True:
+        await asyncio.sleep(interval)
+        now = time.time()
+        for chat_id, data in list(app.chat_data.items()):
+            if drop_expired_answers(data, now):
+                app.mark_data_for_update_persistence(chat_ids=chat_id)
@@ -0,0 +1,59 @@
+import bisect
+import threading
+from storage import registry
+from utils import normalize_nickname
+
+PAGE_SIZE = 8
+
+# Поиск игрока по части ника. Индекс — отсортированный массив всех суффиксов
+# нормализованных ников: подстрока запроса — это префикс какого-то суффикса,
+# поэтому совпадения находятся двумя бинарными поисками, без перебора списка.
+# Индекс перестраивается только после изменения состава
+class NicknameIndex:
+    def __init__(self, source=registry):
+        self.source = source
+        self._lock = threading.Lock()
+        self._version = None
+        self._suffixes = []
+        self._order = {}
+        self._nicknames = {}
+
+    def _rebuild(self):
+        records = self.source.all()
+        self._nicknames = {normalize_nickname(r["nickname"]): r["nickname"] for r in records}
+        # Порядок регистрации — для выдачи при равной релевантности
+        self._order = {key: i for i, key in enumerate(self._nicknames)}
+        self._suffixes = sorted(
+            (key[start:], start, key) for key in self._nicknames for start in range(len(key))
+        )
+
+    def _ensure_fresh(self):
+        with self._lock:
+            version = self.source.version
+            if version != self._version:
+                self._rebuild()
+                self._version = version
+            return self._suffixes, self._order, self._nicknames
+
+    def search(self, query):
+        # Ники, содержащие запрос: сначала начинающиеся с него, затем остальные
+        suffixes, order, nicknames = self._ensure_fresh()
+        query = normalize_nickname(query)
+        if not query:
+            return list(nicknames.values())
+        lo = bisect.bisect_left(suffixes, (query,))
+        hi = bisect.bisect_left(suffixes, (query + "\U0010ffff",), lo)
+        best = {}
+        for _, start, key in suffixes[lo:hi]:
+            if key not in best or start < best[key]:
+                best[key] = start
+        ranked = sorted(best, key=lambda key: (best[key] > 0, order[key]))
+        return [nicknames[key] for key in ranked]
+
+def page_of(matches, number, page_size=PAGE_SIZE):
+    # (ники страницы, номер страницы, всего страниц)
+    total = max(1, -(-len(matches) // page_size))
+    number = max(0, min(number, total - 1))
+    return matches[number * page_size:(number + 1) * page_size], number, total
+
+nickname_index = NicknameIndex()
@@ -0,0 +1,307 @@
+import json
+import os
+from distribution import TOWER_TYPES, is_captain_candidate, format_shift, format_tower
+from models import Assignment
+from storage import registry
+
+STATE_PATH = "distribution_state.json"
+
+def player_fingerprint(p):
+    # Ник (для сообщений об удалённых) и поля, от которых зависит место игрока;
+    # вместимость группы важна только капитану (см. placement_changed)
+    return [p.nickname, p.troop_type, p.troop_size, p.tier_rank, p.shift, p.group_capacity]
+
+def placement_changed(old, p, is_captain):
+    new = player_fingerprint(p)
+    return old[1:5] != new[1:5] or (is_captain and old[5] != new[5])
+
+def fmt(number):
+    return f"{number:,}".replace(",", " ")
+
+# Опубликованное распределение в виде структуры: кто в какой башне и сколько войск ставит
+class TowerState:
+    __slots__ = ("title", "captain", "allowed_type", "members")
+
+    def __init__(self, title, captain, allowed_type, members):
+        self.title = title
+        self.captain = captain
+        self.allowed_type = allowed_type
+        # {ключ игрока: выделенные войска} в порядке заполнения
+        self.members = members
+
+    def to_dict(self):
+        return {"title": self.title, "captain": self.captain, "allowed_type": self.allowed_type,
+                "members": [[key, assigned] for key, assigned in self.members.items()]}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["title"], data["captain"], data["allowed_type"], dict(data["members"]))
+
+class DistributionState:
+    def __init__(self, shifts=None, snapshot=None, epoch=None, version=0):
+        # {смена: [TowerState, ...] или None, если не хватило капитанов}
+        self.shifts = shifts or {}
+        # {ключ игрока: отпечаток} — состав на момент публикации
+        self.snapshot = snapshot or {}
+        # Версия реестра, которой соответствует snapshot (см. storage.ChangeLog)
+        self.epoch = epoch
+        self.version = version
+
+    @classmethod
+    def from_plans(cls, plans, roster, epoch=None, version=0):
+        shifts = {}
+        for shift, towers, _ in plans:
+            if towers is None:
+                shifts[shift] = None
+                continue
+            shifts[shift] = [
+                TowerState(
+                    title, captain.key,
+                    captain.troop_type if i == 0 else (TOWER_TYPES[i - 1] if i <= len(TOWER_TYPES) else None),
+                    {m.player.key: m.assigned for m in members}
+                )
+                for i, (title, captain, members) in enumerate(towers)
+            ]
+        return cls(shifts, {p.key: player_fingerprint(p) for p in roster}, epoch, version)
+
+    def to_dict(self):
+        return {
+            "shifts": {shift: None if towers is None else [t.to_dict() for t in towers]
+                       for shift, towers in self.shifts.items()},
+            "snapshot": self.snapshot,
+            "epoch": self.epoch,
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        shifts = {shift: None if towers is None else [TowerState.from_dict(t) for t in towers]
+                  for shift, towers in data.get("shifts", {}).items()}
+        return cls(shifts, data.get("snapshot", {}), data.get("epoch"), data.get("version", 0))
+
+def save_state(state, path=STATE_PATH):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(state.to_dict(), file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def load_state(path=STATE_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return DistributionState.from_dict(json.load(file))
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def publish(plans, path=STATE_PATH):
+    # Версия читается до состава: что изменится между ними, попадёт в журнал изменений
+    epoch, version = registry.changes.epoch, registry.version
+    state = DistributionState.from_plans(plans, registry.roster(), epoch, version)
+    save_state(state, path)
+    return state
+
+# Пересчёт только того, что затронули изменения состава после публикации:
+# удалённые и изменённые игроки снимаются со своих мест, освободившиеся места
+# и башни без капитана добираются со скамейки, новые игроки встают в подходящие
+# башни со свободным местом. Остальные игроки не двигаются
+class DeltaPlanner:
+    def __init__(self, state, roster, touched=None):
+        self.state = state
+        self.players = {p.key: p for p in roster}
+        # Ники, менявшиеся после публикации (из журнала реестра); None — сравнить всех
+        self.touched = touched
+        self.moves = []
+        self.location = {}
+        for shift, towers in state.shifts.items():
+            for tower in towers or []:
+                if tower.captain is not None:
+                    self.location[tower.captain] = (shift, tower)
+                for key in tower.members:
+                    self.location[key] = (shift, tower)
+        # Снятые из-за уменьшения вместимости — им ищется место, как новым игрокам
+        self.displaced = []
+        self._bench = None
+
+    def name(self, key):
+        player = self.players.get(key)
+        if player is not None:
+            return player.nickname
+        # Удалённый игрок — ник из отпечатка на момент публикации
+        return self.state.snapshot.get(key, [key])[0]
+
+    def free(self, tower):
+        captain = self.players.get(tower.captain)
+        capacity = captain.group_capacity if captain else 0
+        return capacity - sum(tower.members.values())
+
+    def is_changed(self, key):
+        old = self.state.snapshot.get(key)
+        player = self.players.get(key)
+        if old is None or player is None:
+            return (old is None) != (player is None)
+        location = self.location.get(key)
+        return placement_changed(old, player, location is not None and location[1].captain == key)
+
+    def changed_keys(self):
+        if self.touched is not None:
+            return [key for key in self.touched if self.is_changed(key)]
+        snapshot = self.state.snapshot
+        changed = [key for key in snapshot if self.is_changed(key)]
+        return changed + [key for key in self.players if key not in snapshot]
+
+    def bench(self, shift):
+        # Свободные игроки смены (и "обе") по убыванию тира и размера отряда; строится только при нужде
+        if self._bench is None:
+            self._bench = sorted(
+                (p for p in self.players.values() if p.key not in self.location),
+                key=lambda p: (-p.tier_rank, -p.troop_size)
+            )
+        return [p for p in self._bench if p.key not in self.location and p.shift in (shift, "обе")]
+
+    def take_off(self, key):
+        shift, tower = self.location.pop(key)
+        if tower.captain == key:
+            tower.captain = None
+            self.moves.append(f"🚫 {self.name(key)} больше не капитан: {tower.title} (смена {shift})")
+        else:
+            del tower.members[key]
+            self.moves.append(f"➖ {self.name(key)} снят(а): {tower.title} (смена {shift})")
+        return shift, tower
+
+    def place(self, player, shift, tower, amount):
+        tower.members[player.key] = amount
+        self.location[player.key] = (shift, tower)
+        self.moves.append(f"➕ {player.nickname} → {tower.title} (смена {shift}): {fmt(amount)}")
+
+    def trim(self, shift, tower):
+        # Вместимость уменьшилась: снимаем последних по порядку заполнения
+        while self.free(tower) < 0 and tower.members:
+            key, amount = next(reversed(tower.members.items()))
+            overflow = -self.free(tower)
+            if amount > overflow:
+                tower.members[key] = amount - overflow
+                self.moves.append(f"📏 {self.name(key)}: {fmt(amount)} → {fmt(amount - overflow)} ({tower.title}, смена {shift})")
+            else:
+                self.take_off(key)
+                self.displaced.append((key, shift))
+
+    def refill(self, shift, tower):
+        if tower.captain is None or self.free(tower) <= 0:
+            return
+        # Сначала доливаем игрока, поставленного не полностью
+        for key, amount in tower.members.items():
+            player = self.players[key]
+            if amount < player.troop_size and self.free(tower) > 0:
+                extra = min(player.troop_size - amount, self.free(tower))
+                tower.members[key] = amount + extra
+                self.moves.append(f"📏 {player.nickname}: {fmt(amount)} → {fmt(amount + extra)} ({tower.title}, смена {shift})")
+        for player in self.bench(shift):
+            free = self.free(tower)
+            if free <= 0:
+                break
+            if tower.allowed_type and player.troop_type != tower.allowed_type:
+                continue
+            self.place(player, shift, tower, min(player.troop_size, free))
+
+    def replace_captain(self, shift, tower):
+        candidates = [p for p in self.bench(shift) if is_captain_candidate(p)] or self.bench(shift)
+        if not candidates:
+            return
+        captain = max(candidates, key=lambda p: (p.true_power, p.tier_rank, p.group_capacity))
+        tower.captain = captain.key
+        self.location[captain.key] = (shift, tower)
+        self.moves.append(f"👑 {captain.nickname} — новый капитан: {tower.title} (смена {shift})")
+
+    def target_shift(self, player, previous_shift):
+        if player.shift in self.state.shifts:
+            return player.shift
+        if previous_shift in self.state.shifts:
+            return previous_shift
+        # "обе": туда, где в подходящих башнях больше свободного места
+        return max(
+            (shift for shift, towers in self.state.shifts.items() if towers),
+            key=lambda shift: sum(max(self.free(t), 0) for t in self.state.shifts[shift]
+                                  if not t.allowed_type or t.allowed_type == player.troop_type),
+            default=None
+        )
+
+    def run(self):
+        dirty = []
+        previous = {}
+        changed = self.changed_keys()
+        for key in changed:
+            if key in self.location:
+                shift, tower = self.location[key]
+                player = self.players.get(key)
+                if player is not None and tower.captain == key and player.shift in (shift, "обе"):
+                    # Капитан остался в своей смене: меняется только вместимость башни
+                    self.moves.append(f"✏️ {player.nickname}: данные капитана обновлены ({tower.title}, смена {shift})")
+                    self.trim(shift, tower)
+                else:
+                    previous[key] = self.take_off(key)[0]
+                dirty.append((shift, tower))
+
+        for shift, tower in dirty:
+            if tower.captain is None:
+                self.replace_captain(shift, tower)
+                if tower.captain is not None:
+                    # У нового капитана своя вместимость: лишних снимаем до добора
+                    self.trim(shift, tower)
+
+        # Новые, изменённые и снятые игроки — в первую подходящую башню со свободным местом
+        previous.update((key, shift) for key, shift in self.displaced)
+        for key in changed + [key for key, _ in self.displaced]:
+            player = self.players.get(key)
+            if player is None or key in self.location:
+                continue
+            shift = self.target_shift(player, previous.get(key))
+            for tower in self.state.shifts.get(shift) or []:
+                free = self.free(tower)
+                if tower.captain is not None and free > 0 and (not tower.allowed_type or tower.allowed_type == player.troop_type):
+                    self.place(player, shift, tower, min(player.troop_size, free))
+                    break
+            else:
+                if key in previous:
+                    self.moves.append(f"🪑 {player.nickname} остаётся в запасе")
+
+        for shift, tower in dirty:
+            self.refill(shift, tower)
+
+        # Отпечатки обновляются только у тех, кого могли затронуть изменения
+        for key in changed if self.touched is None else self.touched:
+            player = self.players.get(key)
+            if player is None:
+                self.state.snapshot.pop(key, None)
+            else:
+                self.state.snapshot[key] = player_fingerprint(player)
+        return self.moves
+
+def render_state(state, roster):
+    players = {p.key: p for p in roster}
+    result = []
+    for shift, towers in state.shifts.items():
+        if towers is None:
+            result.extend(format_shift(shift, None))
+            continue
+        result.append(f"\n🕐 Смена {shift}")
+        for t in towers:
+            if t.captain not in players:
+                # Замены капитану не нашлось — башня остаётся пустой до следующего /distribute
+                result.append(f"{t.title}\n❗ Нет капитана")
+                continue
+            members = [Assignment(players[k], a) for k, a in t.members.items() if k in players]
+            result.append(format_tower(t.title, players[t.captain], members))
+    return "\n\n".join(result)
+
+def redistribute(path=STATE_PATH):
+    # Возвращает (список перемещений, текст обновлённого распределения) или None,
+    # если распределение ещё не публиковалось
+    state = load_state(path)
+    if state is None:
+        return None
+    epoch, version = registry.changes.epoch, registry.version
+    touched = registry.changes.changed_since(state.epoch, state.version)
+    roster = registry.roster()
+    moves = DeltaPlanner(state, roster, touched).run()
+    state.epoch, state.version = epoch, version
+    save_state(state, path)
+    return moves, render_state(state, roster)
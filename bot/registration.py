@@ -3,15 +3,16 @@ from telegram.ext import (
     CommandHandler, MessageHandler, CallbackQueryHandler,
     ConversationHandler, ContextTypes, filters
 )
-from config import ADMINS
-from shared import user_lang
+from config import ADMINS, PERSISTENCE_PATH
+from shared import get_lang
 from languages import questions
-from storage import save_to_json, load_players
+from storage import player_exists
+from outbox import outbox
+from write_queue import save_player
 from utils import validate_troop_input, validate_tier, validate_power
 import re
 import random
-
-user_answers = {}
+import time
 (
     STEP_NICK, STEP_ALLIANCE, STEP_TYPE, STEP_SIZE,
     STEP_TIER, STEP_CAPACITY, STEP_SHIFT, STEP_CAPTAIN, STEP_POWER
@@ -27,54 +28,74 @@ tips = {
     ]
 }
 
+# Ответы анкеты лежат в chat_data: они сохраняются вместе с шагом разговора
+# и удаляются по завершении или по истечении REGISTRATION_TTL
+def get_answers(context):
+    return context.chat_data.get("answers")
+
+def add_answer(context, value):
+    context.chat_data["answers"].append(value)
+    context.chat_data["answers_at"] = time.time()
+
+def finish_answers(context):
+    context.chat_data.pop("answers_at", None)
+    return context.chat_data.pop("answers", [])
+
+async def registration_expired(update: Update):
+    outbox.reply(update, "⌛ Анкета устарела. Начните регистрацию заново.")
+    return ConversationHandler.END
+
 async def registration_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    chat_id = update.effective_chat.id
-    lang = user_lang.get(chat_id, "ru")
-    user_answers[chat_id] = []
-    await (update.callback_query.message if update.callback_query else update.message).reply_text(questions[lang][0])
+    lang = get_lang(context)
+    context.chat_data["answers"] = []
+    context.chat_data["answers_at"] = time.time()
+    outbox.reply(update, questions[lang][0])
     return STEP_NICK
 
 async def collect_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    lang = user_lang.get(chat_id, "ru")
+    lang = get_lang(context)
     text = update.message.text.strip()
-    step = len(user_answers.get(chat_id, []))
+    answers = get_answers(context)
+    if answers is None:
+        return await registration_expired(update)
+    step = len(answers)
 
     if not text:
-        await update.message.reply_text("Поле обязательно.")
+        outbox.reply(update, "Поле обязательно.")
         return step
 
     if step == STEP_NICK:
-        if any(p["nickname"].strip().lower() == text.lower() for p in load_players()):
-            await update.message.reply_text("⛔ Такой ник уже зарегистрирован.")
+        if player_exists(text):
+            outbox.reply(update, "⛔ Такой ник уже зарегистрирован.")
             return STEP_NICK
 
     if step == STEP_ALLIANCE and (re.search(r"[А-Яа-яЁё]", text) or len(text) != 3):
-        await update.message.reply_text("Альянс: латиница, 3 буквы.")
+        outbox.reply(update, "Альянс: латиница, 3 буквы.")
         return STEP_ALLIANCE
 
     if step == STEP_SIZE and not validate_troop_input(text):
-        await update.message.reply_text("Отряд: число от 200000 до 700000.")
+        outbox.reply(update, "Отряд: число от 200000 до 700000.")
         return STEP_SIZE
 
     if step == STEP_TIER and not validate_tier(text):
-        await update.message.reply_text("Тир должен быть от T10 до T13.")
+        outbox.reply(update, "Тир должен быть от T10 до T13.")
         return STEP_TIER
 
     if step == STEP_CAPACITY and not validate_troop_input(text):
-        await update.message.reply_text("Группа: число от 800000 до 3.500.000.")
+        outbox.reply(update, "Группа: число от 800000 до 3.500.000.")
         return STEP_CAPACITY
 
     if step == STEP_POWER:
         if not validate_power(text) or int(text) < 300_000_000:
-            await update.message.reply_text("Укажи свою **личную мощь** числом от 300.000.000 и выше:")
+            outbox.reply(update, "Укажи свою **личную мощь** числом от 300.000.000 и выше:")
             return STEP_POWER
-        user_answers[chat_id].append(text)
-        save_to_json(chat_id, user_answers[chat_id])
-        await update.message.reply_text("✅ Готово!\n" + random.choice(tips[lang]))
+        add_answer(context, text)
+        await save_player(chat_id, finish_answers(context))
+        outbox.reply(update, "✅ Готово!\n" + random.choice(tips[lang]))
         return ConversationHandler.END
 
-    user_answers[chat_id].append(text)
+    add_answer(context, text)
     step += 1
 
     if step == STEP_TYPE:
@@ -84,39 +105,42 @@ async def collect_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     elif step == STEP_CAPTAIN:
         return await send_captain_buttons(update, lang)
     elif step < len(questions[lang]):
-        await update.message.reply_text(questions[lang][step])
+        outbox.reply(update, questions[lang][step])
         return step
 
-    save_to_json(chat_id, user_answers[chat_id])
-    await update.message.reply_text("✅ Готово!\n" + random.choice(tips[lang]))
+    await save_player(chat_id, finish_answers(context))
+    outbox.reply(update, "✅ Готово!\n" + random.choice(tips[lang]))
     return ConversationHandler.END
 
 async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     chat_id = query.message.chat_id
-    lang = user_lang.get(chat_id, "ru")
-    step = len(user_answers.get(chat_id, []))
+    lang = get_lang(context)
+    answers = get_answers(context)
+    if answers is None:
+        return await registration_expired(update)
+    step = len(answers)
     data = query.data
 
     if step == STEP_TYPE:
-        user_answers[chat_id].append(data)
-        await query.message.reply_text(questions[lang][STEP_SIZE])
+        add_answer(context, data)
+        outbox.reply(update, questions[lang][STEP_SIZE])
         return STEP_SIZE
 
     elif step == STEP_SHIFT:
-        user_answers[chat_id].append(data)
+        add_answer(context, data)
         return await send_captain_buttons(update, lang)
 
     elif step == STEP_CAPTAIN:
-        user_answers[chat_id].append(data)
+        add_answer(context, data)
         if data.lower() == "да":
-            await query.message.reply_text("Укажи свою **личную мощь** (от 300.000.000):")
+            outbox.reply(update, "Укажи свою **личную мощь** (от 300.000.000):")
             return STEP_POWER
         else:
-            user_answers[chat_id].append("0")
-            save_to_json(chat_id, user_answers[chat_id])
-            await query.message.reply_text("✅ Готово!\n" + random.choice(tips[lang]))
+            add_answer(context, "0")
+            await save_player(chat_id, finish_answers(context))
+            outbox.reply(update, "✅ Готово!\n" + random.choice(tips[lang]))
             return ConversationHandler.END
 
     return ConversationHandler.END
@@ -124,22 +148,22 @@ async def handle_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def send_troop_type_buttons(update, lang):
     options = {"ru": ["байкер", "боец", "стрелок"]}
     buttons = [[InlineKeyboardButton(opt, callback_data=opt)] for opt in options[lang]]
-    await update.message.reply_text(questions[lang][STEP_TYPE], reply_markup=InlineKeyboardMarkup(buttons))
+    outbox.reply(update, questions[lang][STEP_TYPE], reply_markup=InlineKeyboardMarkup(buttons))
     return STEP_TYPE
 
 async def send_shift_buttons(update, lang):
     options = {"ru": ["1", "2", "обе"]}
     buttons = [[InlineKeyboardButton(opt, callback_data=opt)] for opt in options[lang]]
-    await (update.callback_query.message if update.callback_query else update.message).reply_text(
-        questions[lang][STEP_SHIFT], reply_markup=InlineKeyboardMarkup(buttons)
+    outbox.reply(
+        update, questions[lang][STEP_SHIFT], reply_markup=InlineKeyboardMarkup(buttons)
     )
     return STEP_SHIFT
 
 async def send_captain_buttons(update, lang):
     options = {"ru": ["да", "нет"]}
     buttons = [[InlineKeyboardButton(opt, callback_data=opt)] for opt in options[lang]]
-    await (update.callback_query.message if update.callback_query else update.message).reply_text(
-        questions[lang][STEP_CAPTAIN], reply_markup=InlineKeyboardMarkup(buttons)
+    outbox.reply(
+        update, questions[lang][STEP_CAPTAIN], reply_markup=InlineKeyboardMarkup(buttons)
     )
     return STEP_CAPTAIN
 
@@ -160,5 +184,7 @@ def get_registration_handler():
             STEP_CAPTAIN: [CallbackQueryHandler(handle_button)],
             STEP_POWER: [MessageHandler(filters.TEXT & ~filters.COMMAND, collect_answer)],
         },
-        fallbacks=[]
+        fallbacks=[],
+        name="registration",
+        persistent=bool(PERSISTENCE_PATH)
     )
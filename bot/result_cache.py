@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, Callable, Dict, Tuple
+from storage import registry
+
+# Кэш тяжёлых расчётов по составу (распределение, перебор вариантов).
+# Ключ — версия состава, имя расчёта и его параметры: любая запись в хранилище
+# повышает версию, и старые результаты перестают совпадать с ключом.
+# Одновременные запросы одного ключа ждут один и тот же расчёт
+class ResultCache:
+    def __init__(self, source=registry):
+        self.source = source
+        self._results: Dict[Tuple, Any] = {}
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, name: str, func: Callable, *args) -> Any:
+        version = self.source.version
+        key = (version, name, args)
+        if key in self._results:
+            self.hits += 1
+            return self._results[key]
+        if key in self._inflight:
+            self.hits += 1
+            # shield: отмена одного ожидающего не должна отменять расчёт для остальных
+            return await asyncio.shield(self._inflight[key])
+
+        self.misses += 1
+        future = asyncio.ensure_future(asyncio.to_thread(func, *args))
+        self._inflight[key] = future
+        try:
+            result = await asyncio.shield(future)
+        finally:
+            self._inflight.pop(key, None)
+
+        # Пока шёл расчёт, состав мог измениться: такой результат не кэшируем
+        if self.source.version == version:
+            self._evict(version)
+            self._results[key] = result
+        return result
+
+    def _evict(self, version: int) -> None:
+        for key in [k for k in self._results if k[0] != version]:
+            del self._results[key]
+
+    def clear(self) -> None:
+        self._results.clear()
+
+result_cache = ResultCache()
@@ -0,0 +1,70 @@
+import threading
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from storage import registry
+
+PAGE_SIZE = 30
+# full — полный список для админа, public — ники и альянсы, short — короткий список со сводкой
+VIEWS = ("full", "public", "short")
+
+def full_line(p):
+    return (
+        f"{p['nickname']} | {p['alliance']} | {p['troop_type']} | {p['troop_size']} | tier {p['tier']} | "
+        f"shift {p['shift']} | cap: {p['captain']} | group: {p['group_capacity']}"
+    )
+
+def short_line(p):
+    return f"{p['nickname']} | {p['alliance']}"
+
+def render_pages(view, players, alliance_counts, page_size=PAGE_SIZE):
+    render = full_line if view == "full" else short_line
+    title = "Участники" if view != "short" else f"Участники ({len(players)})"
+    chunks = [players[i:i + page_size] for i in range(0, len(players), page_size)] or [[]]
+    pages = []
+    for number, chunk in enumerate(chunks, start=1):
+        header = f"{title}:" if len(chunks) == 1 else f"{title}, стр. {number}/{len(chunks)}:"
+        pages.append(header + "\n" + "\n".join(render(p) for p in chunk))
+    if view == "short":
+        summary = "\n".join(f"{tag}: {count}" for tag, count in sorted(alliance_counts.items(), key=lambda x: -x[1]))
+        pages[-1] += "\n\nПо альянсам:\n" + summary
+    return pages
+
+# Готовые страницы списков: все страницы вида рендерятся один раз на версию состава,
+# а листание только достаёт готовый текст
+class RosterPages:
+    def __init__(self, source=registry, page_size=PAGE_SIZE):
+        self.source = source
+        self.page_size = page_size
+        self._lock = threading.Lock()
+        self._version = None
+        self._pages = {}
+
+    def pages(self, view):
+        with self._lock:
+            version = self.source.version
+            if version != self._version:
+                self._version = version
+                self._pages = {}
+            if view not in self._pages:
+                self._pages[view] = render_pages(
+                    view, self.source.all(), self.source.alliance_counts(), self.page_size
+                )
+            return self._pages[view]
+
+    def page(self, view, number):
+        # (текст, клавиатура) страницы; номер за пределами списка прижимается к краю
+        pages = self.pages(view)
+        number = max(0, min(number, len(pages) - 1))
+        return pages[number], page_markup(view, number, len(pages))
+
+def page_markup(view, number, total):
+    if total <= 1:
+        return None
+    buttons = []
+    if number > 0:
+        buttons.append(InlineKeyboardButton("◀", callback_data=f"roster|{view}|{number - 1}"))
+    buttons.append(InlineKeyboardButton(f"{number + 1}/{total}", callback_data=f"roster|{view}|{number}"))
+    if number < total - 1:
+        buttons.append(InlineKeyboardButton("▶", callback_data=f"roster|{view}|{number + 1}"))
+    return InlineKeyboardMarkup([buttons])
+
+roster_pages = RosterPages()
@@ -0,0 +1,172 @@
+import argparse
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+from distribution import (
+    FILE_PATH, TOWER_TYPES, group_by_shift, balance_shifts, sort_players,
+    assign_captains, plan_shift, format_shift
+)
+from models import Player
+from storage import load_players
+from tower_solver import score as tier_weighted_troops, value as tier_weighted_value
+
+# Варианты деления игроков "обе": по нагрузке, по численности и случайные возмущения нагрузочного
+SPLITS = ["load", "headcount"] + [f"shuffle-{seed}" for seed in range(1, 5)]
+# Сколько лучших кандидатов в капитаны рассматривается для замен
+CAPTAIN_BENCH = 8
+# Веса итоговой оценки: доля войск состава в башнях, их сила с учётом тира, равенство смен.
+# Доли считаются от всего состава, а не от вместимости башен: когда игроков больше, чем мест,
+# все башни заполнены до предела, и сравнение с вместимостью у всех вариантов дало бы 100%
+SCORE_WEIGHTS = {"fill": 0.4, "strength": 0.4, "balance": 0.2}
+
+class Scenario:
+    __slots__ = ("split", "captain_swap", "hub_type")
+
+    def __init__(self, split="load", captain_swap=None, hub_type=None):
+        self.split = split
+        # (место капитана 0..4, номер запасного кандидата) или None
+        self.captain_swap = captain_swap
+        self.hub_type = hub_type
+
+    def __getstate__(self):
+        return (self.split, self.captain_swap, self.hub_type)
+
+    def __setstate__(self, state):
+        self.split, self.captain_swap, self.hub_type = state
+
+    def describe(self):
+        parts = [f"смены: {self.split}"]
+        if self.captain_swap:
+            position, rank = self.captain_swap
+            parts.append(f"капитан №{position + 1} → кандидат №{rank + 1}")
+        parts.append(f"хаб: {self.hub_type or 'тип капитана'}")
+        return ", ".join(parts)
+
+def generate_scenarios():
+    swaps = [None] + [(position, rank) for position in range(5) for rank in range(5, CAPTAIN_BENCH)]
+    hub_types = [None] + TOWER_TYPES
+    return [Scenario(split, swap, hub) for split in SPLITS for swap in swaps for hub in hub_types]
+
+def split_by_headcount(shifted):
+    shift1, shift2 = list(shifted["1"]), list(shifted["2"])
+    for player in shifted["обе"]:
+        (shift1 if len(shift1) <= len(shift2) else shift2).append(player)
+    return {"1": shift1, "2": shift2}
+
+def split_shuffled(shifted, seed):
+    # Нагрузочное деление, в котором случайные пары игроков "обе" меняются сменами
+    shifts = balance_shifts(shifted)
+    flexible = {p.key for p in shifted["обе"]}
+    ones = [p for p in shifts["1"] if p.key in flexible]
+    twos = [p for p in shifts["2"] if p.key in flexible]
+    rnd = random.Random(seed)
+    for _ in range(min(len(ones), len(twos), max(1, len(flexible) // 10))):
+        a, b = rnd.choice(ones), rnd.choice(twos)
+        ones.remove(a)
+        twos.remove(b)
+        ones.append(b)
+        twos.append(a)
+    moved_to_first = {p.key for p in ones}
+    fixed1 = [p for p in shifts["1"] if p.key not in flexible]
+    fixed2 = [p for p in shifts["2"] if p.key not in flexible]
+    return {
+        "1": fixed1 + [p for p in shifted["обе"] if p.key in moved_to_first],
+        "2": fixed2 + [p for p in shifted["обе"] if p.key not in moved_to_first],
+    }
+
+def split_shifts(shifted, split):
+    shifted = {shift: list(players) for shift, players in shifted.items()}
+    if split == "headcount":
+        return split_by_headcount(shifted)
+    if split.startswith("shuffle-"):
+        return split_shuffled(shifted, int(split.split("-", 1)[1]))
+    return balance_shifts(shifted)
+
+def build_plan(shifted, scenario):
+    plans = {}
+    for shift, players in split_shifts(shifted, scenario.split).items():
+        players = sort_players(players)
+        ranked = assign_captains(players, limit=CAPTAIN_BENCH)
+        captains = ranked[:5]
+        if scenario.captain_swap:
+            position, rank = scenario.captain_swap
+            if rank < len(ranked) and position < len(captains):
+                captains[position] = ranked[rank]
+        plans[shift] = plan_shift(players, captains=captains, hub_type=scenario.hub_type)
+    return plans
+
+def score_plans(plans, players):
+    if any(towers is None for towers in plans.values()):
+        return {"fill": 0.0, "strength": 0.0, "balance": 0.0, "total": 0.0}
+
+    troops = sum(p.troop_size for p in players) or 1
+    value = sum(tier_weighted_value(p) for p in players) or 1
+    filled = {shift: sum(m.assigned for _, _, members in towers for m in members) for shift, towers in plans.items()}
+    total_filled = sum(filled.values())
+    strength = sum(tier_weighted_troops(towers) for towers in plans.values())
+
+    breakdown = {
+        "fill": total_filled / troops,
+        "strength": strength / value,
+        "balance": 1 - abs(filled["1"] - filled["2"]) / total_filled if total_filled else 0.0,
+    }
+    breakdown["total"] = sum(SCORE_WEIGHTS[name] * breakdown[name] for name in SCORE_WEIGHTS)
+    return breakdown
+
+_shifted = None
+
+_players = None
+
+def _init_worker(records):
+    global _shifted, _players
+    _players = [Player.from_dict(r) for r in records]
+    _shifted = group_by_shift(_players)
+
+def _evaluate(scenario):
+    return scenario, score_plans(build_plan(_shifted, scenario), _players)
+
+def explore(filename=FILE_PATH, top=5, workers=None):
+    # Перебор вариантов распределения в пуле процессов; возвращает лучшие top
+    # в виде [(Scenario, {"fill", "strength", "balance", "total"}), ...]
+    records = load_players(filename)
+    scenarios = generate_scenarios()
+    if workers == 1:
+        _init_worker(records)
+        results = [_evaluate(s) for s in scenarios]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(records,)) as pool:
+            results = list(pool.map(_evaluate, scenarios, chunksize=16))
+    results.sort(key=lambda item: -item[1]["total"])
+    return results[:top]
+
+def format_breakdown(scenario, breakdown):
+    return (
+        f"{breakdown['total']:.3f} — {scenario.describe()}\n"
+        f"   в башнях {breakdown['fill']:.1%} войск, сила {breakdown['strength']:.1%}, баланс смен {breakdown['balance']:.1%}"
+    )
+
+def render_scenario(scenario, filename=FILE_PATH):
+    shifted = group_by_shift([Player.from_dict(r) for r in load_players(filename)])
+    result = []
+    for shift, towers in build_plan(shifted, scenario).items():
+        result.extend(format_shift(shift, towers))
+    return "\n\n".join(result)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Перебор вариантов распределения по башням")
+    parser.add_argument("--file", default=FILE_PATH)
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    best = explore(args.file, top=args.top, workers=args.workers)
+    for i, (scenario, breakdown) in enumerate(best, start=1):
+        print(f"{i}. {format_breakdown(scenario, breakdown)}")
+    if best:
+        print("\nЛучший вариант:")
+        print(render_scenario(best[0][0], args.file))
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,9 @@
 # shared.py
 
-# Словарь для хранения выбранного языка пользователя
-# Формат: {chat_id: "ru" / "de" / "en"}
-user_lang = {}
\ No newline at end of file
+# Выбранный язык хранится в chat_data чата (и сохраняется вместе с ним, см. persistence.py)
+# Значения: "ru" / "de" / "en"
+def get_lang(context):
+    return context.chat_data.get("lang", "ru")
+
+def set_lang(context, lang):
+    context.chat_data["lang"] = lang
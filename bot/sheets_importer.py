@@ -1,6 +1,4 @@
-import gspread
-from oauth2client.service_account import ServiceAccountCredentials
-from storage import save_to_json, load_players
+from sync_engine import GspreadSource, SheetSync
 
 SCOPES = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
 CREDENTIALS_FILE = 'creds.json'
@@ -9,39 +7,11 @@ SPREADSHEET_ID = "1Cm1i7fScmBEPbn8tN8i12gbb2-aIwfv83Sh2SwTW8g4"
 REQUIRED_FIELDS = ['nickname', 'alliance', 'troop_type', 'troop_size', 'tier', 'group_capacity', 'shift', 'captain']
 
 
-def sync_from_google():
-    creds = ServiceAccountCredentials.from_json_keyfile_name(CREDENTIALS_FILE, SCOPES)
-    client = gspread.authorize(creds)
-    sheet = client.open_by_key(SPREADSHEET_ID).sheet1
-    data = sheet.get_all_records()
+def get_sync(source=None):
+    # source можно подменить (например, FixtureSource) — тогда gspread не нужен
+    if source is None:
+        source = GspreadSource(CREDENTIALS_FILE, SPREADSHEET_ID, SCOPES)
+    return SheetSync(source, REQUIRED_FIELDS)
 
-    existing = load_players()
-    existing_nicks = {p['nickname'].strip().lower() for p in existing}
-
-    added = 0
-    for row in data:
-        nick = row.get('nickname', '').strip()
-        if not nick or nick.lower() in existing_nicks:
-            continue
-
-        if not all(field in row for field in REQUIRED_FIELDS):
-            print(f"⚠️ Пропущены обязательные поля в строке: {row}")
-            continue
-
-        try:
-            record = [
-                row['nickname'].strip(),
-                row['alliance'].strip(),
-                row['troop_type'].strip(),
-                str(row['troop_size']),
-                row['tier'].strip().upper().replace("Т", "T"),
-                str(row['group_capacity']),
-                row['shift'].strip().lower(),
-                row['captain'].strip().lower()
-            ]
-            save_to_json(row.get('user_id', 0), record)
-            added += 1
-        except Exception as e:
-            print(f"❌ Ошибка импорта строки {row}: {e}")
-
-    print(f"✅ Импорт завершён. Добавлено участников: {added}")
+def sync_from_google(source=None, force=False, progress=None):
+    return get_sync(source).run(force=force, progress=progress)
@@ -0,0 +1,259 @@
+import json
+import sqlite3
+import sys
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+from config import SQLITE_PATH
+from metrics import metrics
+from models import Player, RosterStats, normalize_field, normalize_record
+from storage import FILE_PATH, ChangeLog, read_players_file
+from utils import normalize_nickname, shift_key
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    seq INTEGER PRIMARY KEY,
+    nick_key TEXT NOT NULL,
+    alliance_key TEXT NOT NULL,
+    shift_key TEXT NOT NULL,
+    troop_type TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_players_nick ON players(nick_key);
+CREATE INDEX IF NOT EXISTS idx_players_alliance ON players(alliance_key);
+CREATE INDEX IF NOT EXISTS idx_players_shift ON players(shift_key);
+CREATE INDEX IF NOT EXISTS idx_players_troop_type ON players(troop_type);
+"""
+
+def _columns(record: Dict[str, Any]) -> tuple:
+    return (
+        normalize_nickname(record["nickname"]),
+        str(record.get("alliance", "")).upper(),
+        shift_key(record.get("shift", "1")),
+        str(record.get("troop_type", "")).strip().lower(),
+        json.dumps(record, ensure_ascii=False),
+    )
+
+# Хранилище в SQLite с тем же интерфейсом, что и PlayerRegistry в storage.py.
+# Фильтры по смене, альянсу и типу войск выполняются запросами по индексам.
+class SqliteRegistry:
+    def __init__(self, path: str = SQLITE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._batch_depth = 0
+        # Версия состава для кэша расчётов; учитывает только записи этого процесса
+        self.version = 0
+        self.changes = ChangeLog()
+        # Сводка держится в памяти и обновляется на каждую запись, как в PlayerRegistry
+        self._stats = RosterStats()
+        self._rebuild_stats()
+        # Разобранные Player по сменам для текущей версии: roster() вызывается часто
+        # (распределение, страницы списка, поиск), а JSON разбирается только после записи
+        self._roster_version = None
+        self._rosters: Dict[Optional[str], List[Player]] = {}
+
+    def _rebuild_stats(self) -> None:
+        with self._lock:
+            self._stats.reset()
+            for record in self._select():
+                self._stats.add(Player.from_dict(record))
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            if self._batch_depth:
+                # Уже внутри batch(): всё попадёт в его транзакцию
+                yield
+                return
+            try:
+                with self._conn:
+                    self._conn.execute("BEGIN IMMEDIATE")
+                    yield
+            except Exception:
+                # Транзакция откатилась — сводку пересчитываем по тому, что осталось в базе,
+                # а версию сдвигаем, чтобы не остались кэши с откаченными изменениями
+                self._rebuild_stats()
+                self.version += 1
+                raise
+
+    def _select(self, where: str = "", params: tuple = ()) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT data FROM players {where} ORDER BY seq", params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _insert(self, record: Dict[str, Any]) -> None:
+        record = normalize_record(record)
+        columns = _columns(record)
+        old = self._conn.execute("SELECT data FROM players WHERE nick_key = ?", (columns[0],)).fetchone()
+        # Как и в data.json, повторная регистрация переносит игрока в конец списка
+        self._conn.execute("DELETE FROM players WHERE nick_key = ?", (columns[0],))
+        self._conn.execute(
+            "INSERT INTO players (nick_key, alliance_key, shift_key, troop_type, data) VALUES (?, ?, ?, ?, ?)",
+            columns
+        )
+        if old is not None:
+            self._stats.remove(Player.from_dict(json.loads(old[0])))
+        self._stats.add(Player.from_dict(record))
+
+    # --- чтение ---
+
+    @metrics.timed("storage_op_seconds", op="all")
+    def all(self) -> List[Dict[str, Any]]:
+        return self._select()
+
+    @metrics.timed("storage_op_seconds", op="get")
+    def get(self, nickname: str) -> Optional[Dict[str, Any]]:
+        found = self._select("WHERE nick_key = ?", (normalize_nickname(nickname),))
+        return found[0] if found else None
+
+    @metrics.timed("storage_op_seconds", op="exists")
+    def exists(self, nickname: str) -> bool:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM players WHERE nick_key = ?", (normalize_nickname(nickname),)
+            ).fetchone()
+        return row is not None
+
+    @metrics.timed("storage_op_seconds", op="by_alliance")
+    def by_alliance(self, alliance: str) -> List[Dict[str, Any]]:
+        return self._select("WHERE alliance_key = ?", (str(alliance).strip().upper(),))
+
+    @metrics.timed("storage_op_seconds", op="by_shift")
+    def by_shift(self, shift: str) -> List[Dict[str, Any]]:
+        return self._select("WHERE shift_key = ?", (shift_key(shift),))
+
+    @metrics.timed("storage_op_seconds", op="by_troop_type")
+    def by_troop_type(self, troop_type: str, shift: Optional[str] = None) -> List[Dict[str, Any]]:
+        if shift is None:
+            return self._select("WHERE troop_type = ?", (str(troop_type).strip().lower(),))
+        return self._select(
+            "WHERE troop_type = ? AND shift_key = ?", (str(troop_type).strip().lower(), shift_key(shift))
+        )
+
+    @metrics.timed("storage_op_seconds", op="roster")
+    def roster(self, shift: Optional[str] = None) -> List[Player]:
+        key = None if shift is None else shift_key(shift)
+        with self._lock:
+            if self._roster_version != self.version:
+                self._roster_version = self.version
+                self._rosters = {}
+            if key not in self._rosters:
+                records = self.all() if key is None else self.by_shift(key)
+                self._rosters[key] = [Player.from_dict(record) for record in records]
+            return list(self._rosters[key])
+
+    @metrics.timed("storage_op_seconds", op="alliance_counts")
+    def alliance_counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats.counts["alliance"])
+
+    @metrics.timed("storage_op_seconds", op="stats")
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._stats.snapshot()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+    # --- запись ---
+
+    @contextmanager
+    def batch(self):
+        with self._transaction():
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+
+    @metrics.timed("storage_op_seconds", op="upsert")
+    def upsert(self, record: Dict[str, Any]) -> None:
+        with self._transaction():
+            self._insert(record)
+            self.version += 1
+            self.changes.record(self.version, normalize_nickname(record["nickname"]))
+
+    @metrics.timed("storage_op_seconds", op="update")
+    def update(self, nickname: str, field: str, value: Any) -> bool:
+        key = normalize_nickname(nickname)
+        with self._lock:
+            row = self._conn.execute("SELECT seq, data FROM players WHERE nick_key = ?", (key,)).fetchone()
+            if row is None:
+                return False
+            old = json.loads(row[1])
+            record = dict(old)
+            record[field] = normalize_field(field, value)
+            if not normalize_nickname(record.get("nickname", "")):
+                return False
+            try:
+                with self._transaction():
+                    self._conn.execute(
+                        "UPDATE players SET nick_key = ?, alliance_key = ?, shift_key = ?, troop_type = ?, data = ? "
+                        "WHERE seq = ?",
+                        _columns(record) + (row[0],)
+                    )
+            except sqlite3.IntegrityError:
+                # Новый ник уже занят другим игроком
+                return False
+            self._stats.remove(Player.from_dict(old))
+            self._stats.add(Player.from_dict(record))
+            self.version += 1
+            self.changes.record(self.version, key, normalize_nickname(record["nickname"]))
+            return True
+
+    @metrics.timed("storage_op_seconds", op="delete")
+    def delete(self, nickname: str) -> bool:
+        with self._transaction():
+            key = normalize_nickname(nickname)
+            old = self._conn.execute("SELECT data FROM players WHERE nick_key = ?", (key,)).fetchone()
+            if old is None:
+                return False
+            self._conn.execute("DELETE FROM players WHERE nick_key = ?", (key,))
+            self._stats.remove(Player.from_dict(json.loads(old[0])))
+            self.version += 1
+            self.changes.record(self.version, key)
+            return True
+
+    @metrics.timed("storage_op_seconds", op="clear")
+    def clear(self) -> bool:
+        with self._transaction():
+            self.version += 1
+            self.changes.reset(self.version)
+            self._stats.reset()
+            return self._conn.execute("DELETE FROM players").rowcount > 0
+
+    @metrics.timed("storage_op_seconds", op="reload")
+    def reload(self) -> None:
+        # Данные могли измениться извне: прежние расчёты больше не годятся
+        with self._lock:
+            self._rebuild_stats()
+            self.version += 1
+            self.changes.reset(self.version)
+
+    @metrics.timed("storage_op_seconds", op="import_players")
+    def import_players(self, players: List[Dict[str, Any]]) -> int:
+        count = 0
+        with self._transaction():
+            for record in players:
+                if record.get("nickname"):
+                    self._insert(record)
+                    count += 1
+            self.version += 1
+            self.changes.reset(self.version)
+        return count
+
+def migrate(json_path: str = FILE_PATH, db_path: str = SQLITE_PATH) -> int:
+    return SqliteRegistry(db_path).import_players(read_players_file(json_path))
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Использование: python sqlite_storage.py migrate [data.json] [data.db]")
+        sys.exit(1)
+    source = sys.argv[2] if len(sys.argv) > 2 else FILE_PATH
+    target = sys.argv[3] if len(sys.argv) > 3 else SQLITE_PATH
+    print(f"✅ Перенесено участников из {source} в {target}: {migrate(source, target)}")
@@ -1,20 +1,560 @@
 import json
-from typing import List, Dict, Any
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_right
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Tuple
+from config import STORAGE_BACKEND, JOURNAL_COMPACT_THRESHOLD, SQLITE_PATH
+from metrics import metrics
+from models import Player, RosterStats, normalize_field, normalize_record
+from utils import normalize_nickname, shift_key
 
 FILE_PATH = "data.json"
 
-def load_players(filename: str = FILE_PATH) -> List[Dict[str, Any]]:
+def read_json_file(filename: str) -> Any:
+    started = time.perf_counter()
     try:
         with open(filename, "r", encoding="utf-8") as file:
-            return json.load(file)
+            data = json.load(file)
+            size = os.fstat(file.fileno()).st_size
     except (FileNotFoundError, json.JSONDecodeError):
-        return []
+        return None
+    metrics.observe("storage_io_seconds", time.perf_counter() - started, op="read")
+    metrics.inc("storage_io_bytes_total", size, op="read")
+    return data
 
-def save_to_json(chat_id: int, data: List[str]) -> bool:
+def read_players_file(filename: str) -> List[Dict[str, Any]]:
+    data = read_json_file(filename)
+    if isinstance(data, dict):
+        # Снимок режима журнала: {"journal_seq": N, "players": [...]} (см. JournalRegistry.compact)
+        data = data.get("players")
+    return data or []
+
+def write_players_file(filename: str, players: Any) -> None:
+    # Пишем во временный файл и подменяем: падение посреди записи не обрежет data.json
+    started = time.perf_counter()
+    tmp_path = filename + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(players, file, ensure_ascii=False, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+        size = os.fstat(file.fileno()).st_size
+    os.replace(tmp_path, filename)
+    metrics.observe("storage_io_seconds", time.perf_counter() - started, op="write")
+    metrics.inc("storage_io_bytes_total", size, op="write")
+
+# Какие игроки менялись после данной версии реестра: /redistribute пересчитывает только их.
+# Журнал живёт в памяти процесса (epoch отличает запуски) и ограничен по длине;
+# если нужная версия в него не попадает, changed_since() возвращает None — сравнивать придётся всех
+class ChangeLog:
+    def __init__(self, limit: int = 10_000):
+        self.epoch = uuid.uuid4().hex
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._versions: List[int] = []
+        self._keys: List[str] = []
+        # Изменения после этой версии записаны полностью
+        self._since = 0
+
+    def record(self, version: int, *keys: str) -> None:
+        with self._lock:
+            for key in keys:
+                self._versions.append(version)
+                self._keys.append(key)
+            if len(self._keys) > 2 * self.limit:
+                cut = len(self._keys) - self.limit
+                self._since = self._versions[cut - 1]
+                del self._versions[:cut], self._keys[:cut]
+
+    def reset(self, version: int) -> None:
+        # Очистка или перечитывание файла: список изменённых ников неизвестен
+        with self._lock:
+            self._versions.clear()
+            self._keys.clear()
+            self._since = version
+
+    def changed_since(self, epoch: Optional[str], version: int) -> Optional[List[str]]:
+        # Ники в порядке первого изменения
+        with self._lock:
+            if epoch != self.epoch or version < self._since:
+                return None
+            return list(dict.fromkeys(self._keys[bisect_right(self._versions, version):]))
+
+# Реестр игроков в памяти: файл читается один раз, каждая запись сразу пишется на диск
+class PlayerRegistry:
+    def __init__(self, path: str = FILE_PATH):
+        self.path = path
+        self._lock = threading.RLock()
+        # Запись на диск идёт под _io_lock, но уже без _lock: чтения (списки, /stats,
+        # распределение) не ждут fsync. Писатели берут сначала _io_lock, потом _lock
+        self._io_lock = threading.RLock()
+        self._loaded = False
+        self._by_nick: Dict[str, Dict[str, Any]] = {}
+        self._by_alliance: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._by_shift: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._roster: Dict[str, Player] = {}
+        self._stats = RosterStats()
+        # Порядковый номер регистрации: по нему восстанавливается порядок внутри индексов
+        self._seq: Dict[str, int] = {}
+        self._next_seq = 0
+        self._batch_depth = 0
+        self._dirty = False
+        # Версия состава: растёт при каждом изменении, по ней кэшируются расчёты
+        self.version = 0
+        self.changes = ChangeLog()
+
+    # --- загрузка и индексы ---
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def _load(self) -> None:
+        self._reset_indexes()
+        for record in self._read_snapshot():
+            if record.get("nickname"):
+                self._insert(record)
+
+    def _read_snapshot(self) -> List[Dict[str, Any]]:
+        return read_players_file(self.path)
+
+    def _reset_indexes(self) -> None:
+        self._by_nick.clear()
+        self._by_alliance.clear()
+        self._by_shift.clear()
+        self._roster.clear()
+        self._stats.reset()
+        self._seq.clear()
+
+    def _index_values(self, record: Dict[str, Any]):
+        return (
+            (self._by_alliance, str(record.get("alliance", "")).upper()),
+            (self._by_shift, shift_key(record.get("shift", "1"))),
+        )
+
+    def _bucket_add(self, index, value: str, key: str, record: Dict[str, Any]) -> None:
+        bucket = index.setdefault(value, {})
+        last = next(reversed(bucket), None)
+        bucket[key] = record
+        if last is not None and self._seq[last] > self._seq[key]:
+            # Игрок сменил группу: восстанавливаем порядок регистрации внутри группы
+            index[value] = dict(sorted(bucket.items(), key=lambda item: self._seq[item[0]]))
+
+    def _bucket_remove(self, index, value: str, key: str) -> None:
+        bucket = index.get(value)
+        if bucket is not None:
+            bucket.pop(key, None)
+            if not bucket:
+                del index[value]
+
+    def _insert(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        record = normalize_record(record)
+        key = normalize_nickname(record["nickname"])
+        self._remove(key)
+        self._next_seq += 1
+        self._seq[key] = self._next_seq
+        self._by_nick[key] = record
+        self._roster[key] = player = Player.from_dict(record)
+        self._stats.add(player)
+        for index, value in self._index_values(record):
+            self._bucket_add(index, value, key, record)
+        return record
+
+    def _remove(self, key: str) -> Optional[Dict[str, Any]]:
+        record = self._by_nick.pop(key, None)
+        if record is not None:
+            for index, value in self._index_values(record):
+                self._bucket_remove(index, value, key)
+            self._stats.remove(self._roster.pop(key))
+            self._seq.pop(key, None)
+        return record
+
+    def _apply_update(self, key: str, field: str, value: Any) -> bool:
+        old = self._by_nick.get(key)
+        if old is None:
+            return False
+
+        record = dict(old)
+        record[field] = normalize_field(field, value)
+        new_key = normalize_nickname(record.get("nickname", ""))
+        if not new_key or (new_key != key and new_key in self._by_nick):
+            return False
+
+        if new_key == key:
+            self._by_nick[key] = record
+        else:
+            # Переименование: сохраняем позицию игрока в списке
+            self._by_nick = {
+                (new_key if k == key else k): (record if k == key else v)
+                for k, v in self._by_nick.items()
+            }
+            self._seq[new_key] = self._seq.pop(key)
+        self._stats.remove(self._roster.pop(key))
+        self._roster[new_key] = player = Player.from_dict(record)
+        self._stats.add(player)
+
+        for (index, old_value), (_, new_value) in zip(self._index_values(old), self._index_values(record)):
+            if new_key == key and old_value == new_value:
+                index[old_value][key] = record
+            else:
+                self._bucket_remove(index, old_value, key)
+                self._bucket_add(index, new_value, new_key, record)
+        return True
+
+    # --- сохранение на диск (переопределяется в других режимах хранения) ---
+
+    def _flush(self) -> None:
+        self._dirty = True
+
+    def _take_pending(self) -> Any:
+        # Вызывается под _lock: снимок того, что нужно записать (записи не меняются на месте,
+        # поэтому достаточно списка ссылок)
+        if not self._dirty:
+            return None
+        self._dirty = False
+        return list(self._by_nick.values())
+
+    def _write_pending(self, players: Any) -> None:
+        # Вызывается под _io_lock, без _lock
+        write_players_file(self.path, players)
+
+    @contextmanager
+    def _writing(self):
+        # Изменение применяется в памяти под _lock, а на диск уходит после его освобождения
+        # (вложенные изменения внутри batch() пишет внешний блок)
+        pending = None
+        with self._io_lock:
+            try:
+                with self._lock:
+                    try:
+                        yield
+                    finally:
+                        if not self._batch_depth:
+                            pending = self._take_pending()
+            finally:
+                if pending is not None:
+                    self._write_pending(pending)
+
+    def _persist_upsert(self, record: Dict[str, Any]) -> None:
+        self._flush()
+
+    def _persist_update(self, key: str, field: str, value: Any) -> None:
+        self._flush()
+
+    def _persist_delete(self, key: str) -> None:
+        self._flush()
+
+    def _persist_clear(self) -> None:
+        self._dirty = False
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    # --- чтение ---
+    # Записи отдаются копиями: правка результата не должна ломать индексы реестра
+
+    @metrics.timed("storage_op_seconds", op="all")
+    def all(self) -> List[Dict[str, Any]]:
+        self._ensure_loaded()
+        with self._lock:
+            return [dict(record) for record in self._by_nick.values()]
+
+    @metrics.timed("storage_op_seconds", op="get")
+    def get(self, nickname: str) -> Optional[Dict[str, Any]]:
+        self._ensure_loaded()
+        record = self._by_nick.get(normalize_nickname(nickname))
+        return dict(record) if record is not None else None
+
+    @metrics.timed("storage_op_seconds", op="exists")
+    def exists(self, nickname: str) -> bool:
+        self._ensure_loaded()
+        return normalize_nickname(nickname) in self._by_nick
+
+    @metrics.timed("storage_op_seconds", op="by_alliance")
+    def by_alliance(self, alliance: str) -> List[Dict[str, Any]]:
+        self._ensure_loaded()
+        with self._lock:
+            return [dict(record) for record in self._by_alliance.get(str(alliance).strip().upper(), {}).values()]
+
+    @metrics.timed("storage_op_seconds", op="by_shift")
+    def by_shift(self, shift: str) -> List[Dict[str, Any]]:
+        self._ensure_loaded()
+        with self._lock:
+            return [dict(record) for record in self._by_shift.get(shift_key(shift), {}).values()]
+
+    @metrics.timed("storage_op_seconds", op="roster")
+    def roster(self, shift: Optional[str] = None) -> List[Player]:
+        # Разобранные записи Player в порядке регистрации, при необходимости — одной смены
+        self._ensure_loaded()
+        with self._lock:
+            keys = self._by_nick if shift is None else self._by_shift.get(shift_key(shift), {})
+            return [self._roster[key] for key in keys]
+
+    @metrics.timed("storage_op_seconds", op="alliance_counts")
+    def alliance_counts(self) -> Dict[str, int]:
+        self._ensure_loaded()
+        with self._lock:
+            return dict(self._stats.counts["alliance"])
+
+    @metrics.timed("storage_op_seconds", op="stats")
+    def stats(self) -> Dict[str, Any]:
+        # Численность по альянсам, сменам, типам войск и тирам, войска и вместимость по сменам
+        self._ensure_loaded()
+        with self._lock:
+            return self._stats.snapshot()
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._by_nick)
+
+    # --- запись ---
+
+    @contextmanager
+    def batch(self):
+        # Все изменения внутри блока сохраняются на диск одной записью при выходе
+        self._ensure_loaded()
+        with self._writing():
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+
+    @metrics.timed("storage_op_seconds", op="upsert")
+    def upsert(self, record: Dict[str, Any]) -> None:
+        self._ensure_loaded()
+        with self._writing():
+            record = self._insert(record)
+            self._persist_upsert(record)
+            self.version += 1
+            self.changes.record(self.version, normalize_nickname(record["nickname"]))
+
+    @metrics.timed("storage_op_seconds", op="update")
+    def update(self, nickname: str, field: str, value: Any) -> bool:
+        self._ensure_loaded()
+        key = normalize_nickname(nickname)
+        value = normalize_field(field, value)
+        with self._writing():
+            if not self._apply_update(key, field, value):
+                return False
+            self._persist_update(key, field, value)
+            self.version += 1
+            self.changes.record(self.version, key, *([normalize_nickname(value)] if field == "nickname" else []))
+            return True
+
+    @metrics.timed("storage_op_seconds", op="delete")
+    def delete(self, nickname: str) -> bool:
+        self._ensure_loaded()
+        key = normalize_nickname(nickname)
+        with self._writing():
+            if self._remove(key) is None:
+                return False
+            self._persist_delete(key)
+            self.version += 1
+            self.changes.record(self.version, key)
+            return True
+
+    @metrics.timed("storage_op_seconds", op="clear")
+    def clear(self) -> bool:
+        self._ensure_loaded()
+        with self._writing():
+            existed = bool(self._by_nick) or os.path.exists(self.path)
+            self._persist_clear()
+            self._reset_indexes()
+            self.version += 1
+            self.changes.reset(self.version)
+            return existed
+
+    @metrics.timed("storage_op_seconds", op="reload")
+    def reload(self) -> None:
+        with self._lock:
+            self._load()
+            self._loaded = True
+            self.version += 1
+            self.changes.reset(self.version)
+
+# Режим журнала: каждая операция дописывается строкой в data.json.journal,
+# а data.json служит снимком и переписывается только при сворачивании журнала
+class JournalRegistry(PlayerRegistry):
+    def __init__(self, path: str = FILE_PATH, compact_threshold: int = JOURNAL_COMPACT_THRESHOLD):
+        super().__init__(path)
+        self.journal_path = path + ".journal"
+        self.compact_threshold = compact_threshold
+        self._journal = None
+        self._journal_records = 0
+        self._compacting = False
+        self._pending: List[str] = []
+        # Номер последней записи журнала; снимок помнит, до какого номера он уже включает журнал
+        self._journal_seq = 0
+        self._snapshot_seq = 0
+        # Растёт при очистке: снимок, начатый до /reset, не должен её перезаписать
+        self._generation = 0
+
+    def _read_snapshot(self) -> List[Dict[str, Any]]:
+        data = read_json_file(self.path)
+        if isinstance(data, dict):
+            self._snapshot_seq = data.get("journal_seq", 0)
+            return data.get("players") or []
+        self._snapshot_seq = 0
+        return data or []
+
+    def _load(self) -> None:
+        super()._load()
+        self._journal_seq = self._snapshot_seq
+        self._journal_records = 0
+        # .old остаётся, если процесс упал во время сворачивания; записи, которые
+        # уже вошли в снимок, пропускаются по номеру (повторно применять их нельзя:
+        # например, переименование вернуло бы старый ник)
+        for path in (self.journal_path + ".old", self.journal_path):
+            self._journal_records += self._replay(path)
+
+    def _replay(self, path: str) -> int:
+        count = 0
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Недописанная последняя строка после падения
+                        logging.warning("Пропущена повреждённая запись журнала в %s", path)
+                        continue
+                    if entry["seq"] <= self._snapshot_seq:
+                        continue
+                    self._journal_seq = max(self._journal_seq, entry["seq"])
+                    self._apply_entry(entry)
+                    count += 1
+        except FileNotFoundError:
+            pass
+        return count
+
+    def _apply_entry(self, entry: Dict[str, Any]) -> None:
+        op = entry.get("op")
+        if op == "upsert":
+            self._insert(entry["record"])
+        elif op == "update":
+            self._apply_update(entry["nickname"], entry["field"], entry["value"])
+        elif op == "delete":
+            self._remove(entry["nickname"])
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        self._journal_seq += 1
+        entry["seq"] = self._journal_seq
+        self._pending.append(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    def _take_pending(self) -> Any:
+        lines, self._pending = self._pending, []
+        return lines or None
+
+    def _write_pending(self, lines: Any) -> None:
+        started = time.perf_counter()
+        if self._journal is None:
+            self._journal = open(self.journal_path, "a", encoding="utf-8")
+        payload = "".join(lines)
+        self._journal.write(payload)
+        self._journal.flush()
+        os.fsync(self._journal.fileno())
+        metrics.observe("storage_io_seconds", time.perf_counter() - started, op="journal")
+        metrics.inc("storage_io_bytes_total", len(payload.encode("utf-8")), op="journal")
+        self._journal_records += len(lines)
+        if self._journal_records >= self.compact_threshold and not self._compacting:
+            self._compacting = True
+            threading.Thread(target=self.compact, name="journal-compaction", daemon=True).start()
+
+    def _close_journal(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def _persist_upsert(self, record: Dict[str, Any]) -> None:
+        self._append({"op": "upsert", "record": record})
+
+    def _persist_update(self, key: str, field: str, value: Any) -> None:
+        self._append({"op": "update", "nickname": key, "field": field, "value": value})
+
+    def _persist_delete(self, key: str) -> None:
+        self._append({"op": "delete", "nickname": key})
+
+    def _persist_clear(self) -> None:
+        self._pending = []
+        self._generation += 1
+        self._close_journal()
+        for path in (self.path, self.path + ".compact", self.journal_path, self.journal_path + ".old"):
+            if os.path.exists(path):
+                os.remove(path)
+        self._journal_records = 0
+        self._snapshot_seq = 0
+
+    def compact(self) -> None:
+        self._ensure_loaded()
+        try:
+            with self._io_lock, self._lock:
+                self._compacting = True
+                old_path = self.journal_path + ".old"
+                if os.path.exists(old_path):
+                    # Предыдущее сворачивание не завершилось: дописываем его хвост к .old
+                    self._close_journal()
+                    if os.path.exists(self.journal_path):
+                        with open(self.journal_path, "r", encoding="utf-8") as src, \
+                                open(old_path, "a", encoding="utf-8") as dst:
+                            dst.write(src.read())
+                        os.remove(self.journal_path)
+                else:
+                    self._close_journal()
+                    if os.path.exists(self.journal_path):
+                        os.replace(self.journal_path, old_path)
+                snapshot = {"journal_seq": self._journal_seq, "players": list(self._by_nick.values())}
+                generation = self._generation
+                self._journal_records = 0
+
+            # Снимок пишется без блокировки (новые записи идут в свежий журнал),
+            # а подменяет data.json под блокировкой — если реестр за это время не очищали
+            compact_path = self.path + ".compact"
+            write_players_file(compact_path, snapshot)
+            with self._lock:
+                if generation != self._generation:
+                    if os.path.exists(compact_path):
+                        os.remove(compact_path)
+                    return
+                os.replace(compact_path, self.path)
+                self._snapshot_seq = snapshot["journal_seq"]
+                if os.path.exists(old_path):
+                    os.remove(old_path)
+        finally:
+            self._compacting = False
+
+def create_registry(backend: str = STORAGE_BACKEND, path: str = FILE_PATH) -> PlayerRegistry:
+    if backend == "json":
+        return PlayerRegistry(path)
+    if backend == "journal":
+        return JournalRegistry(path)
+    if backend == "sqlite":
+        from sqlite_storage import SqliteRegistry
+        return SqliteRegistry(SQLITE_PATH)
+    raise ValueError(f"Неизвестный тип хранилища: {backend}")
+
+registry = create_registry()
+
+def load_players(filename: str = FILE_PATH) -> List[Dict[str, Any]]:
+    if filename == FILE_PATH:
+        return registry.all()
+    return read_players_file(filename)
+
+def player_exists(nickname: str) -> bool:
+    return registry.exists(nickname)
+
+def make_record(chat_id: int, data: List[str]) -> Dict[str, Any]:
     if len(data) < 8:
         raise ValueError("Недостаточно данных для регистрации игрока.")
 
-    record = {
+    return normalize_record({
         "user_id": chat_id,
         "nickname": data[0].strip(),
         "alliance": data[1].strip(),
@@ -25,41 +565,59 @@ def save_to_json(chat_id: int, data: List[str]) -> bool:
         "shift": data[6].strip().lower(),
         "captain": data[7].strip().lower(),
         "true_power": data[8].strip() if len(data) > 8 else "0"
-    }
-
-    players = load_players()
-    players = [p for p in players if p.get("nickname", "").strip().lower() != record["nickname"].lower()]
-    players.append(record)
-
-    with open(FILE_PATH, "w", encoding="utf-8") as file:
-        json.dump(players, file, ensure_ascii=False, indent=2)
+    })
 
+def save_to_json(chat_id: int, data: List[str]) -> bool:
+    registry.upsert(make_record(chat_id, data))
     return True
 
-def update_player_by_nickname(nickname: str, field: str, new_value: Any) -> bool:
-    players = load_players()
-    updated = False
-    nickname = nickname.strip().lower()
-
-    for player in players:
-        if player.get("nickname", "").strip().lower() == nickname:
-            player[field] = new_value.strip() if isinstance(new_value, str) else new_value
-            updated = True
+def save_many(rows: List[Tuple[int, List[str]]], overwrite: bool = False) -> List[Tuple[str, str]]:
+    # Пакетная запись: все строки проверяются и сохраняются за одну запись на диск.
+    # Для каждой строки возвращается ("added" | "updated" | "skipped" | "error", ник или текст ошибки)
+    results = []
+    with registry.batch():
+        for chat_id, data in rows:
+            try:
+                record = make_record(chat_id, [str(value) for value in data])
+                if not record["nickname"]:
+                    raise ValueError("Пустой ник.")
+            except (ValueError, TypeError) as e:
+                results.append(("error", str(e)))
+                continue
 
-    if updated:
-        with open(FILE_PATH, "w", encoding="utf-8") as file:
-            json.dump(players, file, ensure_ascii=False, indent=2)
+            exists = registry.exists(record["nickname"])
+            if exists and not overwrite:
+                results.append(("skipped", record["nickname"]))
+                continue
+            registry.upsert(record)
+            results.append(("updated" if exists else "added", record["nickname"]))
+    return results
 
-    return updated
+def update_player_by_nickname(nickname: str, field: str, new_value: Any) -> bool:
+    value = new_value.strip() if isinstance(new_value, str) else new_value
+    return registry.update(nickname, field, value)
 
 def delete_player_by_nickname(nickname: str) -> bool:
-    players = load_players()
-    nickname = nickname.strip().lower()
-    new_players = [p for p in players if p.get("nickname", "").strip().lower() != nickname]
+    return registry.delete(nickname)
 
-    if len(new_players) < len(players):
-        with open(FILE_PATH, "w", encoding="utf-8") as file:
-            json.dump(new_players, file, ensure_ascii=False, indent=2)
-        return True
+def reset_players() -> bool:
+    return registry.clear()
+
+def migrate_file(filename: str = FILE_PATH) -> int:
+    # Переводит старые записи (числа строками, "Т11" кириллицей) в нормализованный вид
+    data = read_json_file(filename)
+    players = [normalize_record(p) for p in read_players_file(filename) if p.get("nickname")]
+    if isinstance(data, dict):
+        # Снимок режима журнала: journal_seq нужен, чтобы не применить журнал повторно
+        data = {**data, "players": players}
+    else:
+        data = players
+    write_players_file(filename, data)
+    return len(players)
 
-    return False
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Использование: python storage.py migrate [data.json]")
+        sys.exit(1)
+    target = sys.argv[2] if len(sys.argv) > 2 else FILE_PATH
+    print(f"✅ Нормализовано записей в {target}: {migrate_file(target)}")
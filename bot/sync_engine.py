@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import sys
+from typing import List, Dict, Any, Optional
+from metrics import metrics
+from storage import registry, make_record, save_many, delete_player_by_nickname
+from utils import normalize_nickname
+
+STATE_PATH = "sync_state.json"
+
+# Источник строк из Google Таблицы через gspread
+class GspreadSource:
+    def __init__(self, credentials_file: str, spreadsheet_id: str, scopes: List[str]):
+        self.credentials_file = credentials_file
+        self.spreadsheet_id = spreadsheet_id
+        self.scopes = scopes
+        self._spreadsheet = None
+
+    def _open(self):
+        if self._spreadsheet is None:
+            import gspread
+            from oauth2client.service_account import ServiceAccountCredentials
+            # Авторизация и открытие таблицы — отдельные сетевые запросы, меряем их отдельно
+            with metrics.timer("sheets_fetch_seconds", op="open", source=type(self).__name__):
+                creds = ServiceAccountCredentials.from_json_keyfile_name(self.credentials_file, self.scopes)
+                self._spreadsheet = gspread.authorize(creds).open_by_key(self.spreadsheet_id)
+        return self._spreadsheet
+
+    def modified_marker(self) -> Optional[str]:
+        spreadsheet = self._open()
+        try:
+            if hasattr(spreadsheet, "get_lastUpdateTime"):
+                return spreadsheet.get_lastUpdateTime()
+            return spreadsheet.lastUpdateTime
+        except Exception:
+            # Нет доступа к Drive API — синхронизируем без проверки метки
+            return None
+
+    def fetch_rows(self) -> List[Dict[str, Any]]:
+        return self._open().sheet1.get_all_records()
+
+# Локальная замена таблицы для проверок: JSON-файл со списком строк
+# или объектом {"modified": "...", "rows": [...]}
+class FixtureSource:
+    def __init__(self, path: str):
+        self.path = path
+
+    def _read(self) -> Dict[str, Any]:
+        with open(self.path, "r", encoding="utf-8") as file:
+            data = json.load(file)
+        if isinstance(data, list):
+            data = {"rows": data}
+        return data
+
+    def modified_marker(self) -> Optional[str]:
+        marker = self._read().get("modified")
+        return str(marker) if marker is not None else str(os.path.getmtime(self.path))
+
+    def fetch_rows(self) -> List[Dict[str, Any]]:
+        return self._read().get("rows", [])
+
+class SyncResult:
+    def __init__(self):
+        self.added = 0
+        self.updated = 0
+        self.removed = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.errors = 0
+        self.not_modified = False
+
+    @property
+    def changed(self) -> int:
+        return self.added + self.updated + self.removed
+
+    def summary(self) -> str:
+        if self.not_modified:
+            return "Таблица не менялась с прошлой синхронизации."
+        return (
+            f"добавлено {self.added}, обновлено {self.updated}, удалено {self.removed}, "
+            f"без изменений {self.unchanged}, пропущено {self.skipped}, ошибок {self.errors}"
+        )
+
+def load_state(path: str = STATE_PATH) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"marker": None, "rows": {}}
+
+def save_state(state: Dict[str, Any], path: str = STATE_PATH) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(state, file, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def clear_state(path: str = STATE_PATH) -> None:
+    # После /reset прежние отпечатки и метка таблицы не значат ничего: следующая синхронизация — полная
+    if os.path.exists(path):
+        os.remove(path)
+
+def fingerprint(record: Dict[str, Any]) -> str:
+    payload = json.dumps(record, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+# Инкрементальная синхронизация: по каждой строке хранится отпечаток нормализованных
+# полей, и применяются только новые, изменённые и исчезнувшие из таблицы строки
+class SheetSync:
+    def __init__(self, source, fields: List[str], strict: bool = False, state_path: str = STATE_PATH):
+        self.source = source
+        self.fields = fields
+        self.strict = strict
+        self.state_path = state_path
+
+    def _row_data(self, row: Dict[str, Any]) -> Optional[List[str]]:
+        if self.strict:
+            complete = all(field in row and str(row[field]).strip() for field in self.fields)
+        else:
+            complete = all(field in row for field in self.fields)
+        if not complete:
+            return None
+        return [str(row[field]) for field in self.fields]
+
+    def fetch(self, force: bool = False) -> Optional[tuple]:
+        # Сетевая часть: None, если таблица не менялась с прошлого раза
+        source = type(self.source).__name__
+        with metrics.timer("sheets_fetch_seconds", op="marker", source=source):
+            marker = self.source.modified_marker()
+        if not force and marker is not None and marker == load_state(self.state_path).get("marker"):
+            return None
+        with metrics.timer("sheets_fetch_seconds", op="rows", source=source):
+            rows = self.source.fetch_rows()
+        metrics.inc("sheets_rows_total", len(rows), source=source)
+        return marker, rows
+
+    def run(self, force: bool = False, progress=None) -> SyncResult:
+        fetched = self.fetch(force)
+        if fetched is None:
+            result = SyncResult()
+            result.not_modified = True
+            return result
+        return self.apply(*fetched, progress=progress)
+
+    def apply(self, marker: Optional[str], rows: List[Dict[str, Any]], progress=None) -> SyncResult:
+        result = SyncResult()
+        # Отпечатки сверяются с тем, что реально есть в реестре: удалённого из бота игрока
+        # таблица снова добавит, а не сочтёт "без изменений"
+        known: Dict[str, str] = {
+            key: fp for key, fp in load_state(self.state_path).get("rows", {}).items() if registry.exists(key)
+        }
+        if progress:
+            progress(f"Получено строк из таблицы: {len(rows)}")
+
+        current: Dict[str, tuple] = {}
+        # Ники строк с ошибками: игрок остаётся в составе как есть, пока строку не исправят
+        invalid = set()
+        for row in rows:
+            if not str(row.get("nickname", "")).strip():
+                continue
+            data = self._row_data(row)
+            if data is None:
+                print(f"⚠️ Пропущены обязательные поля в строке: {row}")
+                result.errors += 1
+                invalid.add(normalize_nickname(str(row["nickname"])))
+                continue
+            chat_id = row.get("user_id", 0)
+            try:
+                record = make_record(chat_id, data)
+            except ValueError as e:
+                print(f"❌ Ошибка импорта строки {row}: {e}")
+                result.errors += 1
+                invalid.add(normalize_nickname(str(row["nickname"])))
+                continue
+            current[normalize_nickname(record["nickname"])] = (fingerprint(record), chat_id, data)
+
+        inserted = [key for key in current if key not in known]
+        changed = [key for key in current if key in known and known[key] != current[key][0]]
+        removed = [key for key in known if key not in current and key not in invalid]
+        result.unchanged = len(current) - len(inserted) - len(changed)
+        if progress:
+            progress(f"Новых: {len(inserted)}, изменённых: {len(changed)}, удалённых: {len(removed)}")
+
+        new_known = {
+            key: fp for key, fp in known.items()
+            if (key in current and key not in changed) or (key in invalid and key not in current)
+        }
+        with registry.batch():
+            # Ники, уже зарегистрированные через бота, из таблицы не перезаписываем
+            for key, (status, _) in zip(inserted, save_many([current[key][1:] for key in inserted])):
+                if status == "added":
+                    result.added += 1
+                    new_known[key] = current[key][0]
+                elif status == "skipped":
+                    result.skipped += 1
+                else:
+                    result.errors += 1
+
+            for key, (status, _) in zip(changed, save_many([current[key][1:] for key in changed], overwrite=True)):
+                if status in ("added", "updated"):
+                    result.updated += 1
+                    new_known[key] = current[key][0]
+                else:
+                    result.errors += 1
+
+            # Удаляем только тех, кто ранее пришёл из таблицы
+            for key in removed:
+                if delete_player_by_nickname(key):
+                    result.removed += 1
+
+        save_state({"marker": marker, "rows": new_known}, self.state_path)
+        print(f"✅ Синхронизация завершена: {result.summary()}")
+        return result
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Использование: python sync_engine.py fixture.json [--force]")
+        sys.exit(1)
+    from sheets_importer import REQUIRED_FIELDS
+    SheetSync(FixtureSource(sys.argv[1]), REQUIRED_FIELDS).run(force="--force" in sys.argv)
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+from telegram.error import TelegramError
+from sheets_importer import get_sync
+from sync_engine import SyncResult
+from write_queue import write_queue
+
+# Интервал плановой синхронизации с Google Таблицей, секунды
+SYNC_INTERVAL = 60 * 60
+
+# Синхронизация как фоновая задача: загрузка таблицы идёт в рабочем потоке,
+# применение изменений — через очередь записи (т.е. последовательно с остальными
+# изменениями реестра), повторный запуск во время работы не создаёт второй задачи,
+# а прогресс выводится правкой одного сообщения о статусе
+class SyncJob:
+    def __init__(self, make_sync=get_sync):
+        self.make_sync = make_sync
+        self._task = None
+        self._watchers = []
+        self._report_lock = asyncio.Lock()
+        self.last_result = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, status_message=None, force: bool = False) -> bool:
+        if status_message is not None:
+            self._watchers.append(status_message)
+        if self.running:
+            return False
+        self._task = asyncio.get_running_loop().create_task(self._run(force))
+        return True
+
+    async def wait(self):
+        if self._task is not None:
+            return await asyncio.shield(self._task)
+
+    async def _report(self, text: str) -> None:
+        # Под замком, чтобы правки шли в том же порядке, в каком пришли
+        async with self._report_lock:
+            for message in list(self._watchers):
+                try:
+                    await message.edit_text(text)
+                except TelegramError:
+                    # Например, "message is not modified" — прогресс не важнее работы
+                    pass
+
+    async def _run(self, force: bool):
+        loop = asyncio.get_running_loop()
+
+        def progress(text):
+            # Вызывается из рабочего потока
+            asyncio.run_coroutine_threadsafe(self._report(f"🔄 {text}"), loop)
+
+        try:
+            engine = self.make_sync()
+            await self._report("🔄 Загружаю данные из Google Таблицы...")
+            fetched = await asyncio.to_thread(engine.fetch, force)
+            if fetched is None:
+                result = SyncResult()
+                result.not_modified = True
+            else:
+                marker, rows = fetched
+                result = await write_queue.submit(engine.apply, marker, rows, progress)
+            self.last_result = result
+            await self._report(f"✅ Синхронизация: {result.summary()}")
+            return result
+        except Exception as e:
+            logging.exception("Ошибка синхронизации с Google Таблицей")
+            await self._report(f"❌ Ошибка синхронизации: {e}")
+        finally:
+            self._watchers = []
+
+    async def run_periodically(self, interval: int = SYNC_INTERVAL) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.start()
+
+sync_job = SyncJob()
@@ -0,0 +1,37 @@
+import os
+import sys
+import pytest
+
+# Модули бота лежат плоско в bot/
+BOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BOT_DIR)
+
+import storage
+from bench.roster_gen import generate_players
+from sqlite_storage import SqliteRegistry
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch):
+    # Пустой реестр во временном каталоге вместо общего: подменяется во всех модулях бота,
+    # которые сделали from storage import registry
+    registry = storage.PlayerRegistry(str(tmp_path / "data.json"))
+    shared = storage.registry
+    for module in list(sys.modules.values()):
+        if os.path.dirname(getattr(module, "__file__", None) or "") == BOT_DIR and \
+                getattr(module, "registry", None) is shared:
+            monkeypatch.setattr(module, "registry", registry)
+    return registry
+
+@pytest.fixture
+def roster(registry):
+    # 400 сгенерированных игроков
+    with registry.batch():
+        for record in generate_players(400, seed=3):
+            registry.upsert(record)
+    return registry
+
+@pytest.fixture
+def sqlite_registry(tmp_path):
+    registry = SqliteRegistry(str(tmp_path / "data.db"))
+    registry.import_players(generate_players(200))
+    return registry
@@ -0,0 +1,36 @@
+import warnings
+from telegram.ext import ApplicationBuilder
+from fake_bot import FakeRequest
+from webhook import ChatOrderedProcessor
+
+def build(tmp_path, monkeypatch, **kwargs):
+    monkeypatch.chdir(tmp_path)
+    from bot import build_application
+    builder = ApplicationBuilder().token("0:fake").request(FakeRequest()).get_updates_request(FakeRequest())
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return build_application(builder, **kwargs)
+
+def test_updates_are_processed_concurrently_in_polling_mode(tmp_path, monkeypatch):
+    app = build(tmp_path, monkeypatch, concurrency=16)
+    assert isinstance(app.update_processor, ChatOrderedProcessor)
+    assert app.update_processor.max_concurrent_updates == 16
+    assert app.concurrent_updates == 16
+    # Очередь записи и исходящие сообщения дочищаются при остановке и в polling
+    import bot
+    assert app.post_stop is bot.stop_scheduler
+    commands = {command for handler in app.handlers[0] for command in getattr(handler, "commands", ())}
+    assert {"reset", "distribute", "redistribute", "sync", "stats"} <= commands
+
+def test_distribute_rejects_unknown_engine(tmp_path, monkeypatch):
+    import asyncio
+    from types import SimpleNamespace
+    monkeypatch.chdir(tmp_path)
+    import bot
+    replies = []
+    monkeypatch.setattr(bot, "ADMINS", [1])
+    monkeypatch.setattr(bot, "reply", lambda update, text, **kwargs: replies.append(text))
+    update = SimpleNamespace(effective_user=SimpleNamespace(id=1))
+    asyncio.run(bot.distribute(update, SimpleNamespace(args=["foo"])))
+    assert len(replies) == 1
+    assert "python, numpy, solver" in replies[0]
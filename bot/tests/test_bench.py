@@ -0,0 +1,53 @@
+import json
+from bench import run as bench_run
+from bench.roster_gen import generate_answers, generate_players, write_roster
+from storage import PlayerRegistry, read_players_file
+from utils import validate_power, validate_shift, validate_tier, validate_troop_input
+
+def test_generated_roster_is_deterministic_per_seed():
+    assert generate_players(50, seed=5) == generate_players(50, seed=5)
+    assert generate_players(50, seed=5) != generate_players(50, seed=6)
+    # Меньший состав — начало большего с тем же seed
+    assert generate_players(20, seed=5) == generate_players(50, seed=5)[:20]
+
+def test_generated_answers_pass_registration_checks():
+    rows = generate_answers(500, seed=2)
+    assert len({answers[0] for _, answers in rows}) == len({user_id for user_id, _ in rows}) == 500
+    for _, (_, _, _, troop_size, tier, group_capacity, shift, captain, power) in rows:
+        assert validate_troop_input(troop_size) and validate_troop_input(group_capacity)
+        assert validate_tier(tier) and validate_shift(shift)
+        assert captain in ("да", "нет")
+        assert validate_power(power) if captain == "да" else power == "0"
+
+def test_write_roster_loads_into_registry(tmp_path):
+    path = write_roster(str(tmp_path / "roster.json"), 30, seed=4)
+    assert read_players_file(path) == generate_players(30, seed=4)
+    registry = PlayerRegistry(path)
+    registry.reload()
+    assert len(registry) == 30
+
+def results(**medians):
+    return {"results": {name: {"median": median} for name, median in medians.items()}}
+
+def test_compare_respects_tolerance_and_noise_floor():
+    baseline = results(slow=0.010, noisy=0.0005, steady=0.010)
+    current = results(slow=0.020, noisy=0.0015, steady=0.014, new=1.0)
+    # noisy вырос втрое, но меньше чем на NOISE_FLOOR; new нет в эталоне
+    assert bench_run.compare(current, baseline) == [("slow", 0.010, 0.020)]
+    assert bench_run.compare(current, baseline, tolerance=3) == []
+
+def test_suite_runs_and_compares_with_saved_baseline(tmp_path, capsys):
+    output, baseline = str(tmp_path / "out.json"), str(tmp_path / "baseline.json")
+    args = ["--scales", "100", "--engines", "python", "--repeat", "1", "--output", output, "--baseline", baseline]
+    assert bench_run.main(args + ["--save-baseline"]) == 0
+    with open(baseline, encoding="utf-8") as file:
+        saved = json.load(file)
+    assert saved["meta"]["scales"] == [100]
+    assert {"n=100/distribution.python", "n=100/storage.upsert", "n=100/render.full"} <= set(saved["results"])
+    # Сравнение с заведомо медленным эталоном регрессий не находит
+    for entry in saved["results"].values():
+        entry["median"] += 1
+    with open(baseline, "w", encoding="utf-8") as file:
+        json.dump(saved, file)
+    assert bench_run.main(args) == 0
+    assert "Регрессий нет" in capsys.readouterr().out
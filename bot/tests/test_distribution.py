@@ -0,0 +1,83 @@
+import pytest
+from bench.roster_gen import generate_players
+from distribution import (
+    assign_captains, balance_shifts, group_by_shift, is_captain_candidate, plan_shift, sort_players, tower_slots
+)
+from models import Player
+from scenarios import split_by_headcount
+
+def shifts(count, seed):
+    return balance_shifts(group_by_shift([Player.from_dict(r) for r in generate_players(count, seed)]))
+
+def reference_plan(players):
+    # Прежний алгоритм: для каждой башни заново отфильтровать и отсортировать всех свободных
+    players = sort_players(players)
+    captains = assign_captains(players)
+    if len(captains) < 5:
+        return None
+    taken = {p.key for p in captains}
+    towers = []
+    for title, captain, allowed_type in tower_slots(captains):
+        remaining = sorted(
+            (p for p in players if p.key not in taken and (not allowed_type or p.troop_type == allowed_type)),
+            key=lambda p: (-p.tier_rank, -p.troop_size),
+        )
+        members, used = [], 0
+        for p in remaining:
+            if used >= captain.group_capacity:
+                break
+            fit = min(p.troop_size, captain.group_capacity - used)
+            members.append((p.key, fit))
+            taken.add(p.key)
+            used += fit
+        towers.append((title, captain.key, members))
+    return towers
+
+def layout(towers):
+    if towers is None:
+        return None
+    return [(title, captain.key, [(m.player.key, m.assigned) for m in members]) for title, captain, members in towers]
+
+@pytest.mark.parametrize("count", [8, 60, 400, 1500])
+@pytest.mark.parametrize("seed", [1, 5])
+def test_single_pass_matches_refiltering(count, seed):
+    for players in shifts(count, seed).values():
+        assert layout(plan_shift(players)) == reference_plan(players)
+
+def test_towers_respect_capacity_and_type():
+    for players in shifts(400, 2).values():
+        seen = set()
+        for title, captain, members in plan_shift(players):
+            assert sum(m.assigned for m in members) <= captain.group_capacity
+            if "микс" not in title and "Хаб" not in title:
+                assert {m.player.troop_type for m in members} <= {title.split()[-1]}
+            keys = [m.player.key for m in members]
+            assert not seen & set(keys) and captain.key not in seen
+            seen.update(keys, [captain.key])
+
+def troop_gap(split):
+    return abs(sum(p.troop_size for p in split["1"]) - sum(p.troop_size for p in split["2"]))
+
+@pytest.mark.parametrize("seed", [1, 2, 3, 4])
+def test_balance_shifts_by_troop_load(seed):
+    players = [Player.from_dict(r) for r in generate_players(400, seed)]
+    shifted = group_by_shift(players)
+    split = balance_shifts({shift: list(ps) for shift, ps in shifted.items()})
+    assert sorted(p.key for p in split["1"] + split["2"]) == sorted(p.key for p in players)
+    # Игроки с заданной сменой остаются в ней
+    assert {p.key for p in shifted["1"]} <= {p.key for p in split["1"]}
+    assert {p.key for p in shifted["2"]} <= {p.key for p in split["2"]}
+    # Перекос по войскам меньше, чем при делении "обе" по численности
+    headcount = split_by_headcount({shift: list(ps) for shift, ps in shifted.items()})
+    assert troop_gap(split) < troop_gap(headcount)
+    assert troop_gap(split) < 0.01 * sum(p.troop_size for p in players)
+
+def test_balance_shifts_splits_flexible_captains():
+    players = [Player.from_dict(r) for r in generate_players(400, 7)]
+    shifted = group_by_shift(players)
+    split = balance_shifts({shift: list(ps) for shift, ps in shifted.items()})
+    count = {shift: sum(map(is_captain_candidate, split[shift])) for shift in ("1", "2")}
+    fixed = {shift: sum(map(is_captain_candidate, shifted[shift])) for shift in ("1", "2")}
+    flexible = sum(map(is_captain_candidate, shifted["обе"]))
+    # Гибкие капитаны сначала выравнивают число капитанов в сменах
+    assert abs(count["1"] - count["2"]) <= max(1, abs(fixed["1"] - fixed["2"]) - flexible)
@@ -0,0 +1,62 @@
+import random
+import pytest
+from bench.roster_gen import generate_answers, generate_players
+from distribution import plan_shift, group_by_shift
+from models import Player
+from storage import make_record
+
+np_engine = pytest.importorskip("distribution_np")
+
+def layout(towers):
+    if towers is None:
+        return None
+    return [
+        (title, captain.key, [(m.player.key, m.assigned) for m in members])
+        for title, captain, members in towers
+    ]
+
+def assert_parity(players):
+    assert layout(np_engine.plan_shift_np(list(players))) == layout(plan_shift(list(players)))
+
+def players_from(rows):
+    return [Player.from_dict(make_record(user_id, answers)) for user_id, answers in rows]
+
+@pytest.mark.parametrize("count", [5, 12, 60, 400, 2000])
+@pytest.mark.parametrize("seed", [1, 7, 42])
+def test_generated_rosters(count, seed):
+    for players in group_by_shift([Player.from_dict(r) for r in generate_players(count, seed)]).values():
+        assert_parity(players)
+
+def test_empty_roster():
+    assert np_engine.plan_shift_np([]) is None
+    assert_parity([])
+
+def test_fewer_than_five_players():
+    assert_parity(players_from(generate_answers(4, seed=3)))
+
+def test_fewer_than_five_captain_candidates():
+    rows = generate_answers(40, seed=5)
+    for i, (_, answers) in enumerate(rows):
+        answers[7], answers[8] = ("да", "500000000") if i < 2 else ("нет", "0")
+    assert_parity(players_from(rows))
+
+def test_zero_capacity_captains():
+    rows = generate_answers(80, seed=11)
+    for i, (_, answers) in enumerate(rows):
+        if i < 6:
+            answers[5] = "0"
+            answers[7], answers[8] = "да", str(900_000_000 - i)
+    players = players_from(rows)
+    towers = plan_shift(list(players))
+    assert any(not members for _, captain, members in towers if captain.group_capacity == 0)
+    assert_parity(players)
+
+def test_ties():
+    # Одинаковые тир, отряд, вместимость и мощь: порядок решается только устойчивостью сортировки
+    rnd = random.Random(9)
+    rows = [
+        (i, [f"Tie{i:03d}", "VAR", rnd.choice(["байкер", "боец", "стрелок"]), "300000", "T11", "1000000",
+             "1", "да" if i % 3 == 0 else "нет", "400000000" if i % 3 == 0 else "0"])
+        for i in range(60)
+    ]
+    assert_parity(players_from(rows))
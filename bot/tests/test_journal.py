@@ -0,0 +1,87 @@
+import os
+import storage
+from storage import JournalRegistry, make_record
+
+def record(nickname, troop_size="300000"):
+    return make_record(1, [nickname, "VAR", "боец", troop_size, "T10", "900000", "1", "нет", "0"])
+
+def nicknames(path):
+    registry = JournalRegistry(path, compact_threshold=10 ** 9)
+    return sorted(r["nickname"] for r in registry.all())
+
+def test_journal_replays_after_restart(tmp_path):
+    path = str(tmp_path / "data.json")
+    registry = JournalRegistry(path, compact_threshold=10 ** 9)
+    registry.upsert(record("Alpha"))
+    registry.upsert(record("Gamma"))
+    registry.update("Alpha", "troop_size", "450000")
+    registry.delete("Gamma")
+    reopened = JournalRegistry(path, compact_threshold=10 ** 9)
+    assert [r["nickname"] for r in reopened.all()] == ["Alpha"]
+    assert reopened.get("Alpha")["troop_size"] == 450000
+
+def test_crash_after_compaction_does_not_replay_old_journal(tmp_path):
+    path = str(tmp_path / "data.json")
+    registry = JournalRegistry(path, compact_threshold=10 ** 9)
+    registry.upsert(record("Alpha"))
+    registry.update("Alpha", "nickname", "Beta")
+    with open(registry.journal_path, "r", encoding="utf-8") as file:
+        journal = file.read()
+    registry.compact()
+    # Падение между записью снимка и удалением .old: журнал остался рядом со снимком
+    with open(registry.journal_path + ".old", "w", encoding="utf-8") as file:
+        file.write(journal)
+    assert nicknames(path) == ["Beta"]
+
+def test_unfinished_compaction_replays_old_journal(tmp_path):
+    path = str(tmp_path / "data.json")
+    registry = JournalRegistry(path, compact_threshold=10 ** 9)
+    registry.upsert(record("Alpha"))
+    registry.compact()
+    registry.upsert(record("Delta"))
+    registry.update("Alpha", "nickname", "Beta")
+    registry._close_journal()
+    # Падение до записи снимка: журнал успели только переименовать в .old
+    os.replace(registry.journal_path, registry.journal_path + ".old")
+    assert nicknames(path) == ["Beta", "Delta"]
+
+def test_clear_during_compaction_wins(tmp_path, monkeypatch):
+    path = str(tmp_path / "data.json")
+    registry = JournalRegistry(path, compact_threshold=10 ** 9)
+    registry.upsert(record("Alpha"))
+    write = storage.write_players_file
+
+    def clear_then_write(filename, players):
+        # /reset приходит, пока снимок пишется без блокировки
+        registry.clear()
+        write(filename, players)
+
+    monkeypatch.setattr(storage, "write_players_file", clear_then_write)
+    registry.compact()
+    assert not os.path.exists(path)
+    assert nicknames(path) == []
+    registry.upsert(record("Omega"))
+    assert nicknames(path) == ["Omega"]
+
+def test_migrate_keeps_journal_seq(tmp_path):
+    path = str(tmp_path / "data.json")
+    registry = JournalRegistry(path, compact_threshold=10 ** 9)
+    registry.upsert(record("Alpha"))
+    registry.update("Alpha", "nickname", "Beta")
+    with open(registry.journal_path, "r", encoding="utf-8") as file:
+        journal = file.read()
+    registry.compact()
+    with open(registry.journal_path + ".old", "w", encoding="utf-8") as file:
+        file.write(journal)
+    assert storage.migrate_file(path) == 1
+    assert storage.read_json_file(path)["journal_seq"] == 2
+    assert nicknames(path) == ["Beta"]
+
+def test_migrate_normalizes_plain_file(tmp_path):
+    path = str(tmp_path / "data.json")
+    raw = dict(record("Alpha"), troop_size="300 000", tier="Т11")
+    storage.write_players_file(path, [raw])
+    assert storage.migrate_file(path) == 1
+    data = storage.read_json_file(path)
+    assert isinstance(data, list)
+    assert (data[0]["troop_size"], data[0]["tier"]) == (300000, "T11")
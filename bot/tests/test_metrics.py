@@ -0,0 +1,28 @@
+import json
+import pytest
+from bench.roster_gen import generate_players
+from distribution import generate_distribution
+from metrics import metrics
+
+def test_every_distribution_phase_has_engine_label(tmp_path):
+    path = tmp_path / "players.json"
+    path.write_text(json.dumps(generate_players(60, seed=1), ensure_ascii=False), encoding="utf-8")
+    generate_distribution(str(path), engine="python")
+    phases = {labels["phase"] for labels, _ in metrics.series("distribution_phase_seconds")
+              if labels.get("engine") == "python"}
+    assert phases == {"load", "balance", "plan", "format"}
+    assert all("engine" in labels for labels, _ in metrics.series("distribution_phase_seconds"))
+
+def test_unknown_engine_is_rejected_before_timing(tmp_path):
+    path = tmp_path / "players.json"
+    path.write_text(json.dumps(generate_players(10, seed=1), ensure_ascii=False), encoding="utf-8")
+    with pytest.raises(ValueError):
+        generate_distribution(str(path), engine="foo")
+    assert not any(labels.get("engine") == "foo" for labels, _ in metrics.series("distribution_phase_seconds"))
+
+def test_perf_without_measurements(monkeypatch):
+    import metrics as metrics_module
+    monkeypatch.setattr(metrics_module, "metrics", metrics_module.Metrics())
+    text = metrics_module.format_perf()
+    assert text.startswith("Замеров пока нет.")
+    assert "Профилирование" in text
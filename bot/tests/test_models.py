@@ -0,0 +1,32 @@
+import pytest
+from models import Player, normalize_record
+
+RAW = {
+    "user_id": 5, "nickname": " Alpha ", "alliance": "var", "troop_type": " Байкер ",
+    "troop_size": "300.000", "tier": "т11", "group_capacity": "1 200 000", "shift": " Обе ",
+    "captain": "Да", "true_power": "350.000.000",
+}
+
+def test_player_parses_fields_once():
+    player = Player.from_dict(RAW)
+    assert player.key == "alpha"
+    assert (player.troop_type, player.troop_size, player.group_capacity) == ("байкер", 300000, 1200000)
+    assert (player.tier, player.tier_rank, player.shift) == ("T11", 11, "обе")
+    assert player.true_power == 350000000 and player.wants_captain
+
+def test_player_round_trips_normalized_record():
+    raw = dict(RAW, nickname="Alpha")
+    parsed = Player.from_dict(raw).to_dict()
+    assert Player.from_dict(parsed).to_dict() == parsed
+    # Нормализованная запись хранилища и разобранный Player дают одни и те же числа
+    record = normalize_record(raw)
+    assert Player.from_dict(record).to_dict() == parsed
+    assert (record["troop_size"], record["tier"]) == (300000, "T11")
+
+@pytest.mark.parametrize("tier, rank", [("T10", 10), ("Т13", 13), ("t12", 12)])
+def test_tier_rank(tier, rank):
+    assert Player.from_dict(dict(RAW, tier=tier)).tier_rank == rank
+
+def test_player_has_no_instance_dict():
+    with pytest.raises(AttributeError):
+        Player.from_dict(RAW).extra = 1
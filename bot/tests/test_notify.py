@@ -0,0 +1,82 @@
+import asyncio
+import json
+import time
+import notify
+from telegram.error import Forbidden
+from fake_bot import FakeBot
+from notify import FanOut, digest
+from outbox import Outbox
+
+class BlockedBot(FakeBot):
+    # Пользователи из blocked заблокировали бота
+    def __init__(self, blocked=(), **kwargs):
+        super().__init__(**kwargs)
+        self.blocked = set(blocked)
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+        return await super().send_message(chat_id, text, reply_markup, **kwargs)
+
+def messages(count, text="место {}"):
+    return {f"p{i}": (100 + i, text.format(i)) for i in range(count)}
+
+def deliver(monkeypatch, bot, fan_out, messages, **rates):
+    async def main():
+        box = Outbox(bot, **{"chat_rate": 1000, **rates})
+        monkeypatch.setattr(notify, "outbox", box)
+        report = await fan_out.deliver(messages)
+        await box.stop()
+        return report
+    return asyncio.run(main())
+
+def test_every_player_gets_one_message(monkeypatch, tmp_path):
+    bot = FakeBot(latency=0.005)
+    fan_out = FanOut(str(tmp_path / "notify.json"), concurrency=5)
+    report = deliver(monkeypatch, bot, fan_out, messages(40), global_rate=1000)
+    assert (report.sent, report.failed, report.total) == (40, 0, 40)
+    for i in range(40):
+        assert bot.messages_to(100 + i) == [f"место {i}"]
+
+def test_global_rate_paces_fan_out(monkeypatch, tmp_path):
+    bot = FakeBot(global_rate=30)
+    fan_out = FanOut(str(tmp_path / "notify.json"))
+    started = time.monotonic()
+    report = deliver(monkeypatch, bot, fan_out, messages(10), global_rate=30)
+    # Первое сообщение уходит сразу, остальные — не чаще 30 в секунду, без флуд-ошибок
+    assert time.monotonic() - started >= 9 / 30 * 0.9
+    assert report.sent == 10
+    assert bot.flood_errors == 0
+
+def test_log_skips_delivered_and_resends_changed(monkeypatch, tmp_path):
+    path = str(tmp_path / "notify.json")
+    deliver(monkeypatch, FakeBot(), FanOut(path), messages(5), global_rate=1000)
+    with open(path, encoding="utf-8") as file:
+        log = json.load(file)
+    assert log["p3"] == {"attempts": 1, "status": "sent", "error": None, "digest": digest("место 3"), "user_id": 103}
+
+    changed = {**messages(5), "p2": (102, "новое место")}
+    bot = FakeBot()
+    report = deliver(monkeypatch, bot, FanOut(path), changed, global_rate=1000)
+    assert (report.sent, report.already) == (1, 4)
+    assert [m.text for m in bot.sent] == ["новое место"]
+
+def test_failed_and_missing_user_id_are_retried_next_time(monkeypatch, tmp_path):
+    path = str(tmp_path / "notify.json")
+    todo = {**messages(3), "ghost": (None, "🪑 В этот раз вы в запасе.")}
+    report = deliver(monkeypatch, BlockedBot(blocked={101}), FanOut(path), todo, global_rate=1000)
+    assert (report.sent, report.failed, report.skipped, report.total) == (2, 1, 1, 3)
+    log = FanOut(path).load_log()
+    assert log["p1"]["status"] == "failed"
+    assert log["ghost"]["error"] == "нет user_id"
+
+    bot = BlockedBot()
+    report = deliver(monkeypatch, bot, FanOut(path), todo, global_rate=1000)
+    assert (report.sent, report.already) == (1, 2)
+    assert bot.messages_to(101) == ["место 1"]
+    assert FanOut(path).load_log()["p1"]["attempts"] == 2
+
+def test_corrupt_log_is_treated_as_empty(tmp_path):
+    path = tmp_path / "notify.json"
+    path.write_text("{oops", encoding="utf-8")
+    assert FanOut(str(path)).load_log() == {}
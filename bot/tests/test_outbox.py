@@ -0,0 +1,93 @@
+import asyncio
+import time
+import pytest
+import outbox as outbox_module
+from telegram.error import BadRequest, NetworkError, TimedOut
+from fake_bot import FakeBot
+from outbox import Outbox
+
+class FlakyBot(FakeBot):
+    # Первые несколько отправок падают с заданной ошибкой
+    def __init__(self, error, failures):
+        super().__init__()
+        self.error = error
+        self.failures = failures
+        self.calls = 0
+
+    async def send_message(self, chat_id, text, reply_markup=None, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return await super().send_message(chat_id, text, reply_markup, **kwargs)
+
+def run(bot, send, **kwargs):
+    async def main():
+        box = Outbox(bot, **kwargs)
+        futures = send(box)
+        await box.drain()
+        await box.stop()
+        return box, futures
+    return asyncio.run(main())
+
+def test_network_error_is_retried(monkeypatch):
+    monkeypatch.setattr(outbox_module, "RETRY_BACKOFF", 0)
+    bot = FlakyBot(NetworkError("connection reset"), failures=2)
+    box, futures = run(bot, lambda box: [box.enqueue(1, "привет")], chat_rate=1000)
+    assert bot.messages_to(1) == ["привет"]
+    assert (box.sent, box.retries, box.failed) == (1, 2, 0)
+    assert futures[0].result().text == "привет"
+
+def test_network_error_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(outbox_module, "RETRY_BACKOFF", 0)
+    bot = FlakyBot(NetworkError("connection reset"), failures=100)
+    box, futures = run(bot, lambda box: [box.enqueue(1, "привет")], chat_rate=1000)
+    assert bot.calls == outbox_module.MAX_ATTEMPTS
+    assert box.failed == 1
+    assert isinstance(futures[0].exception(), NetworkError)
+
+@pytest.mark.parametrize("error", [BadRequest("Chat not found"), TimedOut()])
+def test_bad_request_and_timeout_are_not_retried(error):
+    bot = FlakyBot(error, failures=1)
+    box, futures = run(bot, lambda box: [box.enqueue(1, "первое"), box.enqueue(1, "второе", parse_mode="HTML")])
+    assert bot.calls == 2
+    assert (box.sent, box.retries, box.failed) == (1, 0, 1)
+    assert futures[0].exception() is error
+    assert bot.messages_to(1) == ["второе"]
+
+def test_retry_after_keeps_order():
+    bot = FakeBot(chat_rate=20, retry_after=0.05)
+    box, _ = run(bot, lambda box: [box.enqueue(1, str(i), parse_mode="HTML") for i in range(5)], chat_rate=1000,
+                 chat_burst=5)
+    assert bot.flood_errors > 0
+    assert bot.messages_to(1) == [str(i) for i in range(5)]
+    assert box.failed == 0
+
+def test_chat_rate_limit():
+    bot = FakeBot()
+    started = time.monotonic()
+    run(bot, lambda box: [box.enqueue(1, str(i), parse_mode="HTML") for i in range(4)], chat_rate=20, chat_burst=1)
+    # Первое сообщение уходит сразу, остальные — не чаще 20 в секунду
+    assert time.monotonic() - started >= 3 / 20 * 0.9
+    assert bot.messages_to(1) == ["0", "1", "2", "3"]
+
+def test_short_messages_are_merged():
+    bot = FakeBot()
+    box, futures = run(bot, lambda box: [box.enqueue(1, "а"), box.enqueue(1, "б"), box.enqueue(2, "в")])
+    assert sorted(m.text for m in bot.sent) == ["а\n\nб", "в"]
+    assert box.coalesced == 1
+    assert futures[0] is futures[1]
+
+def test_close_sends_queued_messages():
+    from types import SimpleNamespace
+    bot = FakeBot(latency=0.01)
+
+    async def main():
+        box = Outbox(bot, chat_rate=1000, chat_burst=10)
+        update = SimpleNamespace(effective_chat=SimpleNamespace(id=7))
+        last = box.reply(update, "x" * 5000)
+        box.reply(update, "ещё", parse_mode="HTML")
+        await box.close(timeout=5)
+        return last
+    last = asyncio.run(main())
+    assert len(bot.messages_to(7)) == 3
+    assert last.result().text == bot.messages_to(7)[1]
@@ -0,0 +1,80 @@
+import asyncio
+import time
+import persistence
+from persistence import SqlitePersistence, drop_expired_answers, expire_registrations
+
+def reopen(path):
+    return SqlitePersistence(str(path))
+
+def test_updates_of_one_pass_are_committed_together(tmp_path):
+    path = tmp_path / "state.db"
+
+    async def main():
+        store = reopen(path)
+        await store.update_chat_data(1, {"lang": "ru", "answers": ["Alpha"], "answers_at": time.time()})
+        await store.update_user_data(7, {"edit_query": "al"})
+        await store.update_conversation("registration", (1, 7), 3)
+        await store.update_conversation("edit", (1, 7), 9)
+        await asyncio.sleep(0)
+        assert store.commits == 1
+        await store.update_conversation("edit", (1, 7), None)
+        await store.flush()
+        return store.commits
+
+    assert asyncio.run(main()) == 2
+    store = reopen(path)
+    chats = asyncio.run(store.get_chat_data())
+    assert chats[1]["lang"] == "ru" and chats[1]["answers"] == ["Alpha"]
+    assert asyncio.run(store.get_user_data()) == {7: {"edit_query": "al"}}
+    assert asyncio.run(store.get_conversations("registration")) == {(1, 7): 3}
+    assert asyncio.run(store.get_conversations("edit")) == {}
+
+def test_expired_registration_is_not_restored(tmp_path, monkeypatch):
+    path = tmp_path / "state.db"
+    started = time.time() - persistence.REGISTRATION_TTL - 10
+
+    async def main():
+        store = reopen(path)
+        await store.update_chat_data(1, {"lang": "en", "answers": ["Alpha"], "answers_at": started})
+        await store.update_conversation("registration", (1, 1), 3)
+        await store.update_conversation("edit", (1, 1), 9)
+        await store.flush()
+
+    asyncio.run(main())
+    monkeypatch.setattr(persistence, "REGISTRATION_TTL", -1)
+    store = reopen(path)
+    # Язык остаётся, анкета и шаг регистрации — нет; прочие разговоры не истекают
+    assert asyncio.run(store.get_chat_data()) == {1: {"lang": "en"}}
+    assert asyncio.run(store.get_conversations("registration")) == {}
+    assert asyncio.run(store.get_conversations("edit")) == {(1, 1): 9}
+
+def test_drop_expired_answers():
+    now = time.time()
+    fresh = {"answers": ["Alpha"], "answers_at": now}
+    stale = {"lang": "ru", "answers": ["Beta"], "answers_at": now - persistence.REGISTRATION_TTL - 1}
+    assert not drop_expired_answers(fresh, now)
+    assert not drop_expired_answers({"lang": "ru"}, now)
+    assert drop_expired_answers(stale, now)
+    assert stale == {"lang": "ru"}
+
+def test_expire_registrations_marks_dropped_chats():
+    class FakeApp:
+        def __init__(self):
+            self.chat_data = {
+                1: {"answers": ["Alpha"], "answers_at": time.time()},
+                2: {"answers": ["Beta"], "answers_at": time.time() - persistence.REGISTRATION_TTL - 1},
+            }
+            self.marked = []
+
+        def mark_data_for_update_persistence(self, chat_ids=None):
+            self.marked.append(chat_ids)
+
+    async def main(app):
+        task = asyncio.get_running_loop().create_task(expire_registrations(app, interval=0.01))
+        await asyncio.sleep(0.05)
+        task.cancel()
+
+    app = FakeApp()
+    asyncio.run(main(app))
+    assert set(app.marked) == {2}
+    assert "answers" in app.chat_data[1] and "answers" not in app.chat_data[2]
@@ -0,0 +1,67 @@
+import random
+import pytest
+from handlers import picker_markup
+from player_search import PAGE_SIZE, NicknameIndex, page_of
+from storage import make_record
+from utils import normalize_nickname
+
+NICKNAMES = ["Alpha", "alphabet", "Beta", "Gamma", "ALPHONSO", "delta_a", "Ральф", "Альфа-2"]
+
+def record(i, nickname):
+    return make_record(i, [nickname, "VAR", "боец", "300000", "T10", "900000", "1", "нет", "0"])
+
+def fill(registry, nicknames):
+    with registry.batch():
+        for i, nickname in enumerate(nicknames):
+            registry.upsert(record(i, nickname))
+
+def linear_search(nicknames, query):
+    query = normalize_nickname(query)
+    found = [n for n in nicknames if query in normalize_nickname(n)]
+    return [n for n in found if normalize_nickname(n).startswith(query)] + \
+        [n for n in found if not normalize_nickname(n).startswith(query)]
+
+@pytest.mark.parametrize("query", ["al", "ALPH", "a", "ta", "альф", "ф", "_", "zzz", "  Beta "])
+def test_search_matches_linear_scan(registry, query):
+    fill(registry, NICKNAMES)
+    assert NicknameIndex(registry).search(query) == linear_search(NICKNAMES, query)
+
+def test_random_queries_match_linear_scan(registry):
+    rng = random.Random(7)
+    nicknames = ["".join(rng.choice("abcab_") for _ in range(rng.randint(1, 8))) + str(i) for i in range(120)]
+    fill(registry, nicknames)
+    index = NicknameIndex(registry)
+    for _ in range(200):
+        nickname = rng.choice(nicknames)
+        start = rng.randrange(len(nickname))
+        query = nickname[start:start + rng.randint(1, 3)]
+        assert index.search(query) == linear_search(nicknames, query)
+
+def test_empty_query_returns_everyone_in_registration_order(registry):
+    fill(registry, NICKNAMES)
+    assert NicknameIndex(registry).search("") == NICKNAMES
+
+def test_index_follows_roster_changes(registry):
+    fill(registry, NICKNAMES)
+    index = NicknameIndex(registry)
+    assert index.search("omega") == []
+    registry.upsert(record(99, "Omega"))
+    assert index.search("omega") == ["Omega"]
+    registry.delete("Omega")
+    assert index.search("omega") == []
+
+@pytest.mark.parametrize("count, number, expected", [
+    (0, 0, (0, 1)), (8, 0, (0, 1)), (9, 1, (1, 2)), (9, 5, (1, 2)), (17, -3, (0, 3)),
+])
+def test_page_of_clamps_page_number(count, number, expected):
+    matches = [f"n{i}" for i in range(count)]
+    page, number, total = page_of(matches, number)
+    assert (number, total) == expected
+    assert page == matches[number * PAGE_SIZE:(number + 1) * PAGE_SIZE]
+
+def test_picker_navigation_buttons():
+    matches = [f"n{i}" for i in range(PAGE_SIZE * 2 + 1)]
+    rows = picker_markup(matches, 1).inline_keyboard
+    assert [b.callback_data for b in rows[0]] == [f"edit_nick|n{PAGE_SIZE}"]
+    assert [b.callback_data for b in rows[-1]] == ["edit_page|0", "edit_page|1", "edit_page|2"]
+    assert len(picker_markup(matches[:PAGE_SIZE], 0).inline_keyboard) == PAGE_SIZE
@@ -0,0 +1,49 @@
+import pytest
+import redistribution
+from distribution import balance_shifts, group_by_shift, plan_shift
+from redistribution import load_state, publish, redistribute
+
+@pytest.fixture
+def state_path(tmp_path, roster):
+    path = str(tmp_path / "distribution_state.json")
+    shifts = balance_shifts(group_by_shift(roster.roster()))
+    publish([(shift, plan_shift(players), None) for shift, players in shifts.items()], path)
+    return path
+
+def towers(path):
+    return [t for ts in load_state(path).shifts.values() for t in ts or []]
+
+def test_new_captain_tower_fits_capacity(roster, state_path):
+    for tower in towers(state_path):
+        if tower.captain is not None:
+            roster.delete(tower.captain)
+    redistribute(state_path)
+    players = {p.key: p for p in roster.roster()}
+    for tower in towers(state_path):
+        if tower.captain is not None and tower.captain in players:
+            assert sum(tower.members.values()) <= players[tower.captain].group_capacity, tower.title
+
+def test_cosmetic_edit_is_not_a_move(roster, state_path):
+    member = next(key for tower in towers(state_path) for key in tower.members)
+    roster.update(member, "alliance", "ZZZ")
+    moves, _ = redistribute(state_path)
+    assert moves == []
+
+def test_only_changed_players_are_compared(roster, state_path, monkeypatch):
+    member = next(key for tower in towers(state_path) for key in tower.members)
+    roster.update(member, "troop_size", "200000")
+    compared = []
+    is_changed = redistribution.DeltaPlanner.is_changed
+
+    def spy(self, key):
+        compared.append(key)
+        return is_changed(self, key)
+
+    monkeypatch.setattr(redistribution.DeltaPlanner, "is_changed", spy)
+    moves, _ = redistribute(state_path)
+    assert compared == [member]
+    assert moves
+    # Повторный запуск без изменений ничего не сравнивает и ничего не двигает
+    compared.clear()
+    assert redistribute(state_path)[0] == []
+    assert compared == []
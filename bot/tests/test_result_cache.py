@@ -0,0 +1,58 @@
+import asyncio
+import threading
+from result_cache import ResultCache
+from storage import make_record
+
+def record(nickname):
+    return make_record(1, [nickname, "VAR", "боец", "300000", "T10", "900000", "1", "нет", "0"])
+
+def test_cached_until_roster_version_changes(registry):
+    calls = []
+
+    def compute(arg):
+        calls.append(arg)
+        return len(registry)
+
+    async def main():
+        cache = ResultCache(registry)
+        assert await cache.get("count", compute, "x") == 0
+        assert await cache.get("count", compute, "x") == 0
+        # Другие параметры — другой ключ
+        await cache.get("count", compute, "y")
+        registry.upsert(record("Alpha"))
+        assert await cache.get("count", compute, "x") == 1
+        return cache
+    cache = asyncio.run(main())
+    assert calls == ["x", "y", "x"]
+    assert (cache.hits, cache.misses) == (1, 3)
+    # Результаты старой версии вытеснены
+    assert {key[0] for key in cache._results} == {registry.version}
+
+def test_concurrent_requests_share_one_computation(registry):
+    calls = []
+    release = threading.Event()
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return "plan"
+
+    async def main():
+        cache = ResultCache(registry)
+        waiters = [asyncio.ensure_future(cache.get("plan", compute)) for _ in range(5)]
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(*waiters)
+    assert asyncio.run(main()) == ["plan"] * 5
+    assert len(calls) == 1
+
+def test_result_computed_during_a_write_is_not_cached(registry):
+    def compute():
+        registry.upsert(record("Alpha"))
+        return "stale"
+
+    async def main():
+        cache = ResultCache(registry)
+        assert await cache.get("plan", compute) == "stale"
+        return cache
+    assert asyncio.run(main())._results == {}
@@ -0,0 +1,51 @@
+import pytest
+from roster_pages import RosterPages, page_markup, render_pages
+from storage import make_record
+
+def record(i, alliance="VAR"):
+    return make_record(i, [f"P{i:03d}", alliance, "боец", "300000", "T10", "900000", "1", "нет", "0"])
+
+def fill(registry, count):
+    with registry.batch():
+        for i in range(count):
+            registry.upsert(record(i, "VAR" if i % 3 else "RIP"))
+
+def buttons(markup):
+    return [(b.text, b.callback_data) for b in markup.inline_keyboard[0]] if markup else None
+
+@pytest.mark.parametrize("count, pages", [(0, 1), (1, 1), (10, 1), (11, 2), (20, 2), (21, 3)])
+def test_page_count_boundaries(registry, count, pages):
+    fill(registry, count)
+    assert len(RosterPages(registry, page_size=10).pages("public")) == pages
+
+def test_pages_cover_every_player_once(registry):
+    fill(registry, 25)
+    pages = RosterPages(registry, page_size=10).pages("full")
+    lines = [line for page in pages for line in page.split("\n")[1:]]
+    assert [line.split(" | ")[0] for line in lines] == [f"P{i:03d}" for i in range(25)]
+    assert pages[0].startswith("Участники, стр. 1/3:")
+
+def test_short_view_has_alliance_summary_on_last_page():
+    players = [record(i, "VAR" if i % 3 else "RIP") for i in range(15)]
+    pages = render_pages("short", players, {"VAR": 10, "RIP": 5}, page_size=10)
+    assert "По альянсам" not in pages[0]
+    assert pages[-1].endswith("По альянсам:\nVAR: 10\nRIP: 5")
+    assert pages[0].startswith("Участники (15), стр. 1/2:")
+
+def test_page_number_is_clamped_and_buttons_point_to_neighbours(registry):
+    fill(registry, 25)
+    pages = RosterPages(registry, page_size=10)
+    text, markup = pages.page("public", 99)
+    assert text.startswith("Участники, стр. 3/3:")
+    assert buttons(markup) == [("◀", "roster|public|1"), ("3/3", "roster|public|2")]
+    text, markup = pages.page("public", -5)
+    assert buttons(markup) == [("1/3", "roster|public|0"), ("▶", "roster|public|1")]
+    assert page_markup("public", 0, 1) is None
+
+def test_pages_are_rendered_once_per_version(registry):
+    fill(registry, 5)
+    pages = RosterPages(registry, page_size=10)
+    first = pages.pages("public")
+    assert pages.pages("public") is first
+    registry.update("P000", "nickname", "Zeta")
+    assert "Zeta" in pages.pages("public")[0]
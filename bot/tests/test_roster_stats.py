@@ -0,0 +1,51 @@
+import random
+import pytest
+from bench.roster_gen import generate_players
+from models import Player, RosterStats
+
+def recomputed(registry):
+    stats = RosterStats()
+    for player in registry.roster():
+        stats.add(player)
+    return stats.snapshot()
+
+def mutate(registry, seed):
+    rnd = random.Random(seed)
+    fields = {
+        "alliance": ["VAR", "rip", "KEK"], "shift": ["1", "2", "обе"], "troop_type": ["байкер", "боец", "стрелок"],
+        "tier": ["T10", "Т12", "t13"], "troop_size": ["250000", "600 000"], "group_capacity": ["1.000.000"],
+    }
+    with registry.batch():
+        for step in range(300):
+            nicknames = [p.nickname for p in registry.roster()]
+            action = rnd.random()
+            if action < 0.5:
+                field = rnd.choice(list(fields))
+                registry.update(rnd.choice(nicknames), field, rnd.choice(fields[field]))
+            elif action < 0.7:
+                registry.delete(rnd.choice(nicknames))
+            elif action < 0.9:
+                registry.upsert(generate_players(1, seed=step)[0] | {"nickname": f"New{step}"})
+            else:
+                registry.update(rnd.choice(nicknames), "nickname", f"Renamed{step}")
+
+@pytest.mark.parametrize("backend", ["json", "sqlite"])
+def test_incremental_stats_match_full_recount(roster, sqlite_registry, backend):
+    registry = roster if backend == "json" else sqlite_registry
+    mutate(registry, seed=1)
+    assert registry.stats() == recomputed(registry)
+    assert registry.alliance_counts() == registry.stats()["alliance"]
+    assert registry.stats()["count"] == len(registry)
+
+def test_stats_survive_reload(roster):
+    mutate(roster, seed=2)
+    before = roster.stats()
+    roster.reload()
+    assert roster.stats() == before
+
+def test_remove_drops_empty_groups():
+    stats = RosterStats()
+    player = Player.from_dict(generate_players(1)[0])
+    stats.add(player)
+    stats.remove(player)
+    assert stats.snapshot() == RosterStats().snapshot()
@@ -0,0 +1,24 @@
+from bench.roster_gen import generate_players, write_roster
+from distribution import group_by_shift
+from models import Player
+from scenarios import Scenario, build_plan, explore, score_plans
+
+def players(count=400, seed=1):
+    return [Player.from_dict(r) for r in generate_players(count, seed)]
+
+def test_scores_do_not_saturate_on_large_roster():
+    roster = players()
+    shifted = group_by_shift(roster)
+    default = score_plans(build_plan(shifted, Scenario()), roster)
+    # Слабый запасной капитан вместо лучшего: меньше места в башнях — меньше оценка
+    swapped = score_plans(build_plan(shifted, Scenario(captain_swap=(0, 7))), roster)
+    assert 0 < default["fill"] < 1 and 0 < default["strength"] < 1
+    assert swapped["fill"] != default["fill"]
+    assert swapped["total"] != default["total"]
+
+def test_explorer_ranks_scenarios(tmp_path):
+    path = write_roster(str(tmp_path / "players.json"), 400)
+    best = explore(path, top=1000, workers=1)
+    totals = [breakdown["total"] for _, breakdown in best]
+    assert totals == sorted(totals, reverse=True)
+    assert len({round(total, 3) for total in totals}) > 5
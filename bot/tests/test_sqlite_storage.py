@@ -0,0 +1,27 @@
+import pytest
+
+def test_roster_is_cached_per_version(sqlite_registry):
+    first = sqlite_registry.roster()
+    assert sqlite_registry.roster()[0] is first[0]
+    sqlite_registry.update(first[0].nickname, "troop_size", "500000")
+    assert sqlite_registry.roster()[0].troop_size == 500000
+    first_shift = [p.key for p in sqlite_registry.roster() if p.shift == "1"]
+    assert [p.key for p in sqlite_registry.roster("1")] == first_shift
+
+def test_rolled_back_batch_does_not_leave_stale_roster(sqlite_registry):
+    victim = sqlite_registry.roster()[0].nickname
+    with pytest.raises(RuntimeError):
+        with sqlite_registry.batch():
+            sqlite_registry.delete(victim)
+            assert len(sqlite_registry.roster()) == 199
+            raise RuntimeError
+    assert len(sqlite_registry.roster()) == 200
+    assert sqlite_registry.exists(victim)
+
+def test_troop_type_lookup_uses_index(sqlite_registry):
+    expected = [r["nickname"] for r in sqlite_registry.all() if r["troop_type"] == "байкер" and r["shift"] == "2"]
+    assert [r["nickname"] for r in sqlite_registry.by_troop_type(" Байкер ", "2")] == expected
+    plan = sqlite_registry._conn.execute(
+        "EXPLAIN QUERY PLAN SELECT data FROM players WHERE troop_type = ?", ("байкер",)
+    ).fetchall()
+    assert "idx_players_troop_type" in str(plan)
@@ -0,0 +1,51 @@
+import storage
+from storage import make_record
+
+def record(nickname, alliance="VAR", shift="1"):
+    return make_record(1, [nickname, alliance, "боец", "300000", "T10", "900000", shift, "нет", "0"])
+
+def test_reads_return_copies(registry):
+    registry.upsert(record("Alpha"))
+    registry.upsert(record("Beta", alliance="RIP", shift="2"))
+    registry.get("Alpha")["nickname"] = "Gamma"
+    registry.all()[1]["alliance"] = "VAR"
+    registry.by_shift("1")[0]["shift"] = "2"
+    assert registry.get("Alpha")["nickname"] == "Alpha"
+    assert [r["nickname"] for r in registry.by_alliance("VAR")] == ["Alpha"]
+    assert [r["nickname"] for r in registry.by_shift("1")] == ["Alpha"]
+    assert registry.alliance_counts() == {"VAR": 1, "RIP": 1}
+
+def test_indexes_follow_updates(registry):
+    registry.upsert(record("Alpha"))
+    registry.upsert(record("Beta"))
+    registry.update("Alpha", "alliance", "rip")
+    registry.update("Beta", "nickname", "Gamma")
+    assert [r["nickname"] for r in registry.by_alliance("RIP")] == ["Alpha"]
+    assert [r["nickname"] for r in registry.all()] == ["Alpha", "Gamma"]
+    assert not registry.exists("Beta")
+    registry.delete("Alpha")
+    assert registry.by_alliance("RIP") == []
+
+def answers(nickname, troop_size="300000"):
+    return [nickname, "VAR", "боец", troop_size, "T10", "900000", "1", "нет", "0"]
+
+def test_save_many_reports_each_row(registry):
+    registry.upsert(record("Alpha"))
+    results = storage.save_many([
+        (1, answers("alpha", "400000")),
+        (2, answers("Beta")),
+        (3, answers("", "300000")),
+        (5, ["Short"]),
+    ])
+    assert [status for status, _ in results] == ["skipped", "added", "error", "error"]
+    assert registry.get("Alpha")["troop_size"] == 300000
+    assert storage.save_many([(1, answers("alpha", "400000"))], overwrite=True) == [("updated", "alpha")]
+    assert registry.get("Alpha")["troop_size"] == 400000
+
+def test_save_many_writes_once(registry, monkeypatch):
+    writes = []
+    write = storage.write_players_file
+    monkeypatch.setattr(storage, "write_players_file", lambda *args: writes.append(args) or write(*args))
+    storage.save_many([(i, answers(f"P{i}")) for i in range(50)])
+    assert len(writes) == 1
+    assert len(storage.read_players_file(registry.path)) == 50
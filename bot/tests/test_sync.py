@@ -0,0 +1,52 @@
+import json
+import pytest
+from sheets_importer import REQUIRED_FIELDS
+from sync_engine import FixtureSource, SheetSync, clear_state
+
+def row(nickname, troop_size=300000, **changes):
+    data = {
+        "nickname": nickname, "alliance": "VAR", "troop_type": "боец", "troop_size": troop_size,
+        "tier": "T10", "group_capacity": 900000, "shift": "1", "captain": "нет", "true_power": 0,
+    }
+    data.update(changes)
+    return data
+
+@pytest.fixture
+def sheet(tmp_path):
+    path = tmp_path / "sheet.json"
+    state_path = str(tmp_path / "sync_state.json")
+
+    def sync(rows, force=True):
+        path.write_text(json.dumps(rows, ensure_ascii=False), encoding="utf-8")
+        return SheetSync(FixtureSource(str(path)), REQUIRED_FIELDS, strict=True, state_path=state_path).run(force)
+
+    sync.state_path = state_path
+    return sync
+
+def test_incremental_sync(registry, sheet):
+    result = sheet([row("Alpha"), row("Beta")])
+    assert (result.added, result.updated, result.removed) == (2, 0, 0)
+    result = sheet([row("Alpha", 450000), row("Gamma")])
+    assert (result.added, result.updated, result.removed, result.unchanged) == (1, 1, 1, 0)
+    assert sorted(r["nickname"] for r in registry.all()) == ["Alpha", "Gamma"]
+    assert registry.get("Alpha")["troop_size"] == 450000
+
+def test_invalid_row_does_not_remove_player(registry, sheet):
+    sheet([row("Alpha"), row("Beta")])
+    result = sheet([row("Alpha"), row("Beta", tier="")])
+    assert result.removed == 0
+    assert result.errors == 1
+    assert registry.exists("Beta")
+    # Пока строка с ошибкой, игрок остаётся; исправленная строка применяется как изменение
+    result = sheet([row("Alpha"), row("Beta", 500000)])
+    assert (result.updated, result.removed) == (1, 0)
+    assert registry.get("Beta")["troop_size"] == 500000
+
+def test_sync_after_reset_reimports_everyone(registry, sheet):
+    rows = [row("Alpha"), row("Beta")]
+    sheet(rows)
+    registry.clear()
+    assert sheet(rows).added == 2
+    registry.clear()
+    clear_state(sheet.state_path)
+    assert sheet(rows, force=False).added == 2
@@ -0,0 +1,58 @@
+import asyncio
+import json
+from sheets_importer import REQUIRED_FIELDS
+from sync_engine import FixtureSource, SheetSync
+from sync_job import SyncJob
+
+class StatusMessage:
+    def __init__(self):
+        self.texts = []
+
+    async def edit_text(self, text):
+        self.texts.append(text)
+
+def rows(count):
+    return [{
+        "nickname": f"P{i}", "alliance": "VAR", "troop_type": "боец", "troop_size": 300000,
+        "tier": "T10", "group_capacity": 900000, "shift": "1", "captain": "нет", "true_power": 0,
+    } for i in range(count)]
+
+def make_job(tmp_path, data):
+    path = tmp_path / "sheet.json"
+    path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+    calls = []
+
+    def make_sync():
+        calls.append(1)
+        return SheetSync(FixtureSource(str(path)), REQUIRED_FIELDS, strict=True,
+                         state_path=str(tmp_path / "sync_state.json"))
+    return SyncJob(make_sync), calls
+
+def test_second_start_joins_running_sync(registry, tmp_path):
+    job, calls = make_job(tmp_path, rows(30))
+    first, second = StatusMessage(), StatusMessage()
+
+    async def main():
+        assert job.start(first, force=True)
+        assert not job.start(second, force=True)
+        return await job.wait()
+    result = asyncio.run(main())
+    assert len(calls) == 1
+    assert result.added == 30 and len(registry) == 30
+    # Оба статуса получили итог одной и той же синхронизации
+    assert first.texts[-1] == second.texts[-1] == f"✅ Синхронизация: {result.summary()}"
+
+def test_sync_error_is_reported(registry):
+    class BrokenSync:
+        def fetch(self, force):
+            raise RuntimeError("таблица недоступна")
+
+    job = SyncJob(BrokenSync)
+    status = StatusMessage()
+
+    async def main():
+        job.start(status, force=True)
+        return await job.wait()
+    assert asyncio.run(main()) is None
+    assert status.texts == ["🔄 Загружаю данные из Google Таблицы...", "❌ Ошибка синхронизации: таблица недоступна"]
+    assert not job.running
@@ -0,0 +1,50 @@
+import time
+import pytest
+import tower_solver
+from bench.roster_gen import generate_players
+from distribution import balance_shifts, group_by_shift, plan_shift
+from models import Player
+from tower_solver import score, solve_shift
+
+def shifts(count, seed):
+    return balance_shifts(group_by_shift([Player.from_dict(r) for r in generate_players(count, seed)]))
+
+def check_towers(towers):
+    seen = set()
+    for title, captain, members in towers:
+        assert sum(m.assigned for m in members) <= captain.group_capacity
+        assert all(0 < m.assigned <= m.player.troop_size for m in members)
+        keys = {m.player.key for m in members} | {captain.key}
+        assert not seen & keys
+        seen |= keys
+
+@pytest.mark.parametrize("count", [30, 60, 400])
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_solver_is_never_worse_than_greedy(count, seed):
+    for players in shifts(count, seed).values():
+        towers, report = solve_shift(players, budget=0.2)
+        check_towers(towers)
+        assert score(towers) >= score(plan_shift(players))
+        assert report.solver_score == score(towers)
+
+def test_solver_improves_small_roster():
+    # На малом составе жадное заполнение оставляет ценных игроков без места, солвер их размещает
+    towers, report = solve_shift(shifts(60, 1)["1"], budget=0.2)
+    assert not report.kept_baseline
+    assert report.improvement > 0
+    assert "📈 Солвер" in report.summary()
+
+def test_solver_respects_time_budget(monkeypatch):
+    # Локальный поиск прерывается по бюджету, даже если каждый шаг что-то улучшает
+    def slow_relocate(bins, player):
+        time.sleep(0.01)
+        return False
+    monkeypatch.setattr(tower_solver, "_relocate", slow_relocate)
+    started = time.monotonic()
+    towers, report = solve_shift(shifts(400, 1)["1"], budget=0.1)
+    assert time.monotonic() - started < 0.5
+    check_towers(towers)
+
+def test_not_enough_captains():
+    players = shifts(40, 1)["1"][:3]
+    assert solve_shift(players) == (None, None)
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import pytest
+import webhook
+from telegram import Update
+from webhook import ChatOrderedProcessor, WebhookServer, run_webhook
+
+SECRET = "s3cret"
+
+class StubApp:
+    def __init__(self):
+        self.bot = None
+        self.update_queue = asyncio.Queue()
+
+def make_update(update_id, chat_id):
+    return Update.de_json({"update_id": update_id, "message": {
+        "message_id": update_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": "x",
+    }}, None)
+
+async def post(port, body: bytes, headers=None, path="/telegram"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    headers = {"Content-Length": str(len(body)), "Connection": "close", **(headers or {})}
+    head = "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+    writer.write(f"POST {path} HTTP/1.1\r\nHost: x\r\n{head}\r\n".encode() + body)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    writer.close()
+    return status
+
+def serve(*requests):
+    async def main():
+        app = StubApp()
+        server = WebhookServer(app, listen="127.0.0.1", port=0, secret=SECRET)
+        await server.start()
+        port = server._server.sockets[0].getsockname()[1]
+        try:
+            statuses = [await post(port, *request) for request in requests]
+        finally:
+            await server.stop()
+        return statuses, app.update_queue.qsize()
+    return asyncio.run(main())
+
+def test_update_with_secret_is_accepted():
+    body = json.dumps(make_update(1, 5).to_dict()).encode()
+    assert serve((body, {webhook.SECRET_HEADER: SECRET})) == ([200], 1)
+
+@pytest.mark.parametrize("headers", [{}, {webhook.SECRET_HEADER: "wrong"}])
+def test_wrong_secret_is_forbidden(headers):
+    body = json.dumps(make_update(1, 5).to_dict()).encode()
+    assert serve((body, headers)) == ([403], 0)
+
+@pytest.mark.parametrize("body", [
+    b"[]", b"42", b'"text"', b"null", b"{not json",
+    b'{"update_id": 1, "message": "x"}', b'{"update_id": 1, "callback_query": [1]}',
+])
+def test_malformed_body_is_bad_request(body):
+    assert serve((body, {webhook.SECRET_HEADER: SECRET})) == ([400], 0)
+
+@pytest.mark.parametrize("length", ["abc", "-5"])
+def test_malformed_content_length_is_bad_request(length):
+    assert serve((b"{}", {webhook.SECRET_HEADER: SECRET, "Content-Length": length})) == ([400], 0)
+
+def test_public_listen_requires_secret(monkeypatch):
+    monkeypatch.setattr(webhook, "WebhookServer", lambda app: WebhookServer(app, listen="0.0.0.0", secret=""))
+    with pytest.raises(ValueError):
+        asyncio.run(run_webhook(StubApp(), url=""))
+
+def test_waiting_chat_does_not_hold_a_slot():
+    async def main():
+        processor = ChatOrderedProcessor(2)
+        release = asyncio.Event()
+        done = []
+
+        async def handle(name, wait=False):
+            if wait:
+                await release.wait()
+            done.append(name)
+
+        busy = asyncio.create_task(processor.process_update(make_update(1, 1), handle("a1", wait=True)))
+        queued = asyncio.create_task(processor.process_update(make_update(2, 1), handle("a2")))
+        await asyncio.sleep(0)
+        # Второе обновление чата 1 ждёт очереди, но слот остаётся свободным для чата 2
+        await asyncio.wait_for(processor.process_update(make_update(3, 2), handle("b1")), 1)
+        release.set()
+        await asyncio.gather(busy, queued)
+        assert done == ["b1", "a1", "a2"]
+        assert not processor._locks
+    asyncio.run(main())
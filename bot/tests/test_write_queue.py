@@ -0,0 +1,74 @@
+import asyncio
+import threading
+import pytest
+import storage
+from storage import JournalRegistry, make_record, reset_players, save_to_json
+from write_queue import WriteQueue
+
+def answers(nickname):
+    return [nickname, "VAR", "боец", "300000", "T10", "900000", "1", "нет", "0"]
+
+def test_concurrent_saves_share_one_commit(registry):
+    async def main():
+        queue = WriteQueue(window=0.01)
+        results = await asyncio.gather(*(queue.submit(save_to_json, i, answers(f"P{i}")) for i in range(20)))
+        return queue, results
+    queue, results = asyncio.run(main())
+    assert all(results)
+    assert (queue.commits, queue.mutations) == (1, 20)
+    assert len(storage.read_players_file(registry.path)) == 20
+
+def test_reset_goes_through_queue(registry):
+    registry.upsert(make_record(1, answers("Alpha")))
+
+    async def main():
+        queue = WriteQueue(window=0.01)
+        return await queue.submit(reset_players), queue
+    existed, queue = asyncio.run(main())
+    assert existed and queue.commits == 1
+    assert len(registry) == 0
+
+@pytest.mark.parametrize("journal", [False, True])
+def test_reads_do_not_wait_for_disk(registry, tmp_path, monkeypatch, journal):
+    if journal:
+        registry = JournalRegistry(str(tmp_path / "journal.json"))
+        monkeypatch.setattr(JournalRegistry, "_write_pending", lambda self, lines: slow_write())
+    else:
+        monkeypatch.setattr(storage, "write_players_file", lambda path, players: slow_write())
+    writing, release = threading.Event(), threading.Event()
+
+    def slow_write():
+        writing.set()
+        release.wait(5)
+
+    writer = threading.Thread(target=registry.upsert, args=(make_record(1, answers("Alpha")),))
+    writer.start()
+    try:
+        assert writing.wait(5)
+        reader = threading.Thread(target=lambda: (registry.all(), registry.stats(), registry.roster()))
+        reader.start()
+        reader.join(1)
+        # Запись ещё висит на диске, а чтение уже видит изменение и не ждёт её
+        assert not reader.is_alive()
+        assert registry.exists("Alpha")
+    finally:
+        release.set()
+        writer.join()
+
+def test_journal_keeps_order_with_concurrent_writers(tmp_path):
+    path = str(tmp_path / "data.json")
+    registry = JournalRegistry(path, compact_threshold=10 ** 9)
+
+    def writer(i):
+        # Каждое переименование опирается на предыдущее: в журнале они должны идти в том же порядке
+        registry.upsert(make_record(i, answers(f"W{i}-0")))
+        for j in range(1, 30):
+            registry.update(f"W{i}-{j - 1}", "nickname", f"W{i}-{j}")
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    restored = JournalRegistry(path, compact_threshold=10 ** 9)
+    assert sorted(r["nickname"] for r in restored.all()) == [f"W{i}-29" for i in range(8)]
@@ -0,0 +1,185 @@
+import sys
+import time
+from config import SOLVER_TIME_BUDGET
+from distribution import FILE_PATH, sort_players, assign_captains, tower_slots, plan_shift, generate_distribution
+from models import Assignment
+
+def tier_weight(player):
+    # T10 = 1.0, T11 = 1.1, ... — войска старших тиров ценнее
+    return max(player.tier_rank, 10) / 10
+
+def value(player):
+    return tier_weight(player) * player.troop_size
+
+def score(towers):
+    return sum(tier_weight(m.player) * m.assigned for _, _, members in towers for m in members)
+
+def troops(towers):
+    return sum(m.assigned for _, _, members in towers for m in members)
+
+class Bin:
+    __slots__ = ("title", "captain", "allowed_type", "free", "members")
+
+    def __init__(self, title, captain, allowed_type):
+        self.title = title
+        self.captain = captain
+        self.allowed_type = allowed_type
+        self.free = captain.group_capacity
+        self.members = []
+
+    def allows(self, player):
+        return not self.allowed_type or player.troop_type == self.allowed_type
+
+    def add(self, player):
+        self.members.append(player)
+        self.free -= player.troop_size
+
+    def remove(self, player):
+        self.members.remove(player)
+        self.free += player.troop_size
+
+class SolverReport:
+    def __init__(self, baseline_score, solver_score, baseline_troops, solver_troops, elapsed, kept_baseline):
+        self.baseline_score = baseline_score
+        self.solver_score = solver_score
+        self.baseline_troops = baseline_troops
+        self.solver_troops = solver_troops
+        self.elapsed = elapsed
+        self.kept_baseline = kept_baseline
+
+    @property
+    def improvement(self):
+        if not self.baseline_score:
+            return 0.0
+        return (self.solver_score - self.baseline_score) / self.baseline_score * 100
+
+    def summary(self):
+        if self.kept_baseline:
+            return f"📈 Солвер ({self.elapsed:.1f} с): жадное распределение не улучшено."
+        solver_troops = f"{self.solver_troops:,}".replace(",", " ")
+        baseline_troops = f"{self.baseline_troops:,}".replace(",", " ")
+        return (
+            f"📈 Солвер ({self.elapsed:.1f} с): войск {solver_troops} вместо {baseline_troops}, "
+            f"сила с учётом тира {self.improvement:+.1f}%"
+        )
+
+def _best_fit(bins, player, exclude=None):
+    best = None
+    for b in bins:
+        if b is not exclude and b.allows(player) and b.free >= player.troop_size:
+            if best is None or b.free < best.free:
+                best = b
+    return best
+
+def _relocate(bins, player):
+    # Освобождаем место: переносим одного участника в другую башню, где он помещается
+    for a in bins:
+        if not a.allows(player):
+            continue
+        need = player.troop_size - a.free
+        for m in sorted(a.members, key=lambda p: p.troop_size):
+            if m.troop_size < need:
+                continue
+            b = _best_fit(bins, m, exclude=a)
+            if b is not None:
+                a.remove(m)
+                b.add(m)
+                a.add(player)
+                return True
+    return False
+
+def _swap(bins, player, unassigned):
+    # Меняем слабейшего подходящего участника на более ценного игрока со скамейки
+    best = None
+    for a in bins:
+        if not a.allows(player):
+            continue
+        for m in a.members:
+            if a.free + m.troop_size >= player.troop_size and value(m) < value(player):
+                if best is None or value(m) < value(best[1]):
+                    best = (a, m)
+    if best is None:
+        return False
+    a, m = best
+    a.remove(m)
+    a.add(player)
+    target = _best_fit(bins, m)
+    if target is not None:
+        target.add(m)
+    else:
+        unassigned.append(m)
+    return True
+
+def _local_search(bins, unassigned, deadline):
+    improved = True
+    while improved and time.monotonic() < deadline:
+        improved = False
+        unassigned.sort(key=lambda p: -value(p))
+        for player in list(unassigned):
+            if time.monotonic() >= deadline:
+                return
+            target = _best_fit(bins, player)
+            if target is not None:
+                target.add(player)
+            elif not (_relocate(bins, player) or _swap(bins, player, unassigned)):
+                continue
+            unassigned.remove(player)
+            improved = True
+
+def _finish(bins, unassigned):
+    # Остаток вместимости каждой башни добирается одним игроком частично, как и в жадном алгоритме
+    towers = []
+    for b in bins:
+        members = [Assignment(p, p.troop_size) for p in b.members]
+        if b.free > 0:
+            candidates = [p for p in unassigned if b.allows(p)]
+            if candidates:
+                partial = max(candidates, key=lambda p: tier_weight(p) * min(p.troop_size, b.free))
+                unassigned.remove(partial)
+                members.append(Assignment(partial, min(partial.troop_size, b.free)))
+        members.sort(key=lambda m: (-m.player.tier_rank, -m.assigned))
+        towers.append((b.title, b.captain, members))
+    return towers
+
+def solve_shift(shift_players, budget=SOLVER_TIME_BUDGET):
+    # Совместная упаковка всех пяти башен смены: best-fit по убыванию ценности,
+    # затем локальный поиск (перенос и замена) в пределах бюджета времени.
+    # Результат никогда не хуже жадного: если солвер проиграл, возвращается жадный план
+    started = time.monotonic()
+    baseline = plan_shift(shift_players)
+    if baseline is None:
+        return None, None
+
+    shift_players = sort_players(shift_players)
+    captains = assign_captains(shift_players)
+    captain_keys = {p.key for p in captains}
+    bins = [Bin(title, captain, allowed_type) for title, captain, allowed_type in tower_slots(captains)]
+
+    pool = [p for p in shift_players if p.key not in captain_keys and p.troop_size > 0]
+    pool.sort(key=lambda p: (-tier_weight(p), -p.troop_size))
+    unassigned = []
+    for player in pool:
+        target = _best_fit(bins, player)
+        if target is not None:
+            target.add(player)
+        else:
+            unassigned.append(player)
+
+    _local_search(bins, unassigned, started + budget)
+    towers = _finish(bins, unassigned)
+
+    kept_baseline = score(towers) <= score(baseline)
+    if kept_baseline:
+        towers = baseline
+    report = SolverReport(
+        score(baseline), score(towers), troops(baseline), troops(towers),
+        time.monotonic() - started, kept_baseline
+    )
+    return towers, report
+
+def plan_shift_solver(shift_players):
+    return solve_shift(shift_players)[0]
+
+if __name__ == "__main__":
+    filename = sys.argv[1] if len(sys.argv) > 1 else FILE_PATH
+    print(generate_distribution(filename, engine="solver"))
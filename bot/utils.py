@@ -1,17 +1,28 @@
 import re
 
+SHIFT_ALIASES = {"both": "обе", "beide": "обе"}
+
 def parse_capacity(value):
     try:
-        value = str(value).replace(".", "").replace(",", "")
+        value = str(value).replace(" ", "").replace(".", "").replace(",", "")
         return int(value)
-    except (ValueError, AttributeError):
+    except (ValueError, TypeError):
         return 0
 
+def normalize_tier(tier):
+    return str(tier).strip().upper().replace("Т", "T")
+
 def tier_priority(tier):
-    tier = str(tier).upper().replace("Т", "T")
-    match = re.search(r"T(\d+)", tier)
+    match = re.search(r"T(\d+)", normalize_tier(tier))
     return int(match.group(1)) if match else 0
 
+def normalize_nickname(nickname):
+    return str(nickname).strip().lower()
+
+def shift_key(shift):
+    shift = str(shift).strip().lower()
+    return SHIFT_ALIASES.get(shift, shift)
+
 def validate_troop_input(value):
     try:
         number = int(re.sub(r"\D", "", str(value)))
@@ -33,3 +44,17 @@ def validate_power(value):
         return number >= 300_000_000
     except (ValueError, TypeError):
         return False
+
+def split_text(text, limit=4000):
+    lines = text.split('\n')
+    chunks = []
+    current = ""
+    for line in lines:
+        if len(current) + len(line) + 1 < limit:
+            current += line + "\n"
+        else:
+            chunks.append(current.strip())
+            current = line + "\n"
+    if current:
+        chunks.append(current.strip())
+    return chunks
@@ -0,0 +1,222 @@
+import asyncio
+import hmac
+import json
+import logging
+import signal
+import sys
+from typing import Dict, Optional
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from config import (
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET
+)
+
+# Больше Telegram не присылает; всё крупнее отклоняется, не читая
+MAX_BODY = 1024 * 1024
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+LOOPBACK = {"127.0.0.1", "::1", "localhost"}
+
+def update_chat_key(update) -> Optional[int]:
+    if isinstance(update, Update):
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+        if update.effective_user is not None:
+            return update.effective_user.id
+    return None
+
+# Обновления разных чатов обрабатываются параллельно, одного чата — строго по очереди:
+# ConversationHandler и анкета в chat_data рассчитаны на последовательные сообщения пользователя
+class ChatOrderedProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiting: Dict[int, int] = {}
+
+    async def process_update(self, update, coroutine) -> None:
+        # Сначала очередь чата, потом слот семафора: обновления, ждущие своей очереди
+        # в занятом чате, не занимают слоты, нужные другим чатам
+        key = update_chat_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        self._waiting[key] = self._waiting.get(key, 0) + 1
+        try:
+            async with lock:
+                await super().process_update(update, coroutine)
+        finally:
+            self._waiting[key] -= 1
+            if not self._waiting[key]:
+                del self._waiting[key]
+                del self._locks[key]
+
+    async def do_process_update(self, update, coroutine) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+# Минимальный HTTP/1.1-сервер на asyncio: принимает POST от Telegram на WEBHOOK_PATH,
+# проверяет секрет и кладёт обновление в очередь приложения. Отвечает сразу,
+# не дожидаясь обработки, — обработка идёт в Application
+class WebhookServer:
+    def __init__(self, app, listen=WEBHOOK_LISTEN, port=WEBHOOK_PORT, path=WEBHOOK_PATH, secret=WEBHOOK_SECRET):
+        self.app = app
+        self.listen = listen
+        self.port = port
+        self.path = path
+        self.secret = secret
+        self._server = None
+        self._connections = set()
+        self.accepted = 0
+        self.rejected = 0
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, self.listen, self.port)
+        logging.info("🌐 Webhook слушает %s:%s%s", self.listen, self.port, self.path)
+
+    async def stop(self) -> None:
+        # Новые соединения не принимаются; открытые дочитываются до конца запроса
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._connections:
+            await asyncio.wait(self._connections, timeout=5)
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while await self._serve_request(reader, writer):
+                pass
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _serve_request(self, reader, writer) -> bool:
+        request_line = await reader.readline()
+        if not request_line:
+            return False
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            await self._respond(writer, 400, "Bad Request", close=True)
+            return False
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        keep_alive = headers.get("connection", "").lower() != "close"
+
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            await self._respond(writer, 400, "Bad Request", close=True)
+            return False
+        if length > MAX_BODY:
+            await self._respond(writer, 413, "Payload Too Large", close=True)
+            return False
+        body = await reader.readexactly(length) if length else b""
+
+        if method == "GET" and target == "/health":
+            await self._respond(writer, 200, "OK", keep_alive=keep_alive)
+            return keep_alive
+        if method != "POST" or target.split("?", 1)[0] != self.path:
+            await self._respond(writer, 404, "Not Found", keep_alive=keep_alive)
+            return keep_alive
+        if self.secret and not hmac.compare_digest(headers.get(SECRET_HEADER, ""), self.secret):
+            self.rejected += 1
+            await self._respond(writer, 403, "Forbidden", keep_alive=keep_alive)
+            return keep_alive
+
+        try:
+            data = json.loads(body)
+            if not isinstance(data, dict):
+                raise ValueError("not an object")
+            update = Update.de_json(data, self.app.bot)
+        except Exception:
+            # de_json на объекте неверной формы падает чем угодно (например, AttributeError
+            # для {"message": "x"}); клиенту в любом случае отвечаем, а не рвём соединение
+            await self._respond(writer, 400, "Bad Request", keep_alive=keep_alive)
+            return keep_alive
+        await self.app.update_queue.put(update)
+        self.accepted += 1
+        await self._respond(writer, 200, "OK", keep_alive=keep_alive)
+        return keep_alive
+
+    async def _respond(self, writer, status: int, reason: str, keep_alive=True, close=False) -> None:
+        body = reason.encode()
+        connection = "keep-alive" if keep_alive and not close else "close"
+        writer.write(
+            f"HTTP/1.1 {status} {reason}\r\nContent-Type: text/plain\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: {connection}\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+
+async def run_webhook(app, url=WEBHOOK_URL) -> None:
+    # Аналог run_polling для режима webhook: до сигнала остановки принимаем обновления,
+    # затем дожидаемся обработчиков, записи в хранилище и отправки сообщений
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:
+            pass
+
+    server = WebhookServer(app)
+    if not server.secret and server.listen not in LOOPBACK:
+        # Без секрета любой, кто найдёт адрес, сможет слать боту поддельные обновления
+        raise ValueError(f"WEBHOOK_SECRET обязателен, если webhook слушает {server.listen}")
+    await app.initialize()
+    try:
+        if app.post_init:
+            await app.post_init(app)
+        if url:
+            await app.bot.set_webhook(
+                url=url.rstrip("/") + server.path, secret_token=server.secret or None,
+                allowed_updates=Update.ALL_TYPES
+            )
+        await app.start()
+        await server.start()
+        await stop.wait()
+
+        logging.info("⏹ Остановка: дожидаюсь обработки принятых обновлений...")
+        await server.stop()
+        # Application.stop() ждёт, пока очередь обновлений разобрана и обработчики завершились;
+        # post_stop дописывает изменения и отправляет оставшиеся сообщения, как в run_polling
+        await app.stop()
+        if app.post_stop:
+            await app.post_stop(app)
+    finally:
+        await app.shutdown()
+
+def post_recorded(path: str, url: str = None, secret: str = WEBHOOK_SECRET) -> None:
+    # Локальная проверка: отправить записанные обновления (по одному JSON в строке) на свой webhook
+    import httpx
+    url = url or f"http://127.0.0.1:{WEBHOOK_PORT}{WEBHOOK_PATH}"
+    headers = {SECRET_HEADER: secret} if secret else {}
+    with open(path, "r", encoding="utf-8") as file, httpx.Client() as client:
+        for line in file:
+            if line.strip():
+                response = client.post(url, content=line.encode("utf-8"), headers={
+                    **headers, "Content-Type": "application/json"
+                })
+                print(response.status_code, line[:60].strip())
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] != "post":
+        print("Использование: python webhook.py post updates.jsonl [url]")
+        sys.exit(1)
+    post_recorded(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import Any, Callable, List, Tuple
+from storage import registry, save_to_json, update_player_by_nickname, delete_player_by_nickname
+
+# Окно, в течение которого изменения от разных обработчиков собираются в одну запись
+COMMIT_WINDOW = 0.05
+
+# Очередь групповой записи: изменения, пришедшие в одном окне, применяются
+# в одном registry.batch() и сохраняются на диск одной записью. Обработчик
+# ждёт, пока его изменение действительно окажется на диске.
+class WriteQueue:
+    def __init__(self, window: float = COMMIT_WINDOW):
+        self.window = window
+        self._pending: List[Tuple[Callable, tuple, asyncio.Future]] = []
+        self._task = None
+        self.commits = 0
+        self.mutations = 0
+
+    async def submit(self, func: Callable, *args) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((func, args, future))
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run())
+        return await future
+
+    async def _run(self) -> None:
+        await asyncio.sleep(self.window)
+        # Пока пишется одна пачка, следующие изменения копятся для следующей
+        while self._pending:
+            batch, self._pending = self._pending, []
+            results = await asyncio.to_thread(self._commit, batch)
+            for (_, _, future), (ok, value) in zip(batch, results):
+                if future.done():
+                    continue
+                if ok:
+                    future.set_result(value)
+                else:
+                    future.set_exception(value)
+
+    def _commit(self, batch) -> List[Tuple[bool, Any]]:
+        results = []
+        try:
+            with registry.batch():
+                for func, args, _ in batch:
+                    try:
+                        results.append((True, func(*args)))
+                    except Exception as e:
+                        results.append((False, e))
+        except Exception as e:
+            logging.exception("Не удалось сохранить пачку изменений")
+            return [(False, e)] * len(batch)
+        self.commits += 1
+        self.mutations += len(batch)
+        return results
+
+    async def drain(self) -> None:
+        while self._task is not None and not self._task.done():
+            await self._task
+
+write_queue = WriteQueue()
+
+async def save_player(chat_id: int, data: List[str]) -> bool:
+    return await write_queue.submit(save_to_json, chat_id, list(data))
+
+async def update_player(nickname: str, field: str, new_value: Any) -> bool:
+    return await write_queue.submit(update_player_by_nickname, nickname, field, new_value)
+
+async def delete_player(nickname: str) -> bool:
+    return await write_queue.submit(delete_player_by_nickname, nickname)